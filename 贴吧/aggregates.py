@@ -0,0 +1,292 @@
+# 可合并的聚合结构：分批/增量分析时，每批数据得到的部分结果可以直接合并
+# 所有结构都支持 sign=-1 撤销之前加入的数据（记录被新版本替换时使用），
+# 近似统计用的 FrequentItems 和 HyperLogLog 除外：二者内存固定，但不能撤销
+
+import hashlib
+import heapq
+import math
+from collections import Counter
+
+import numpy as np
+
+# 分位数草图：小的整数值精确计数，其余值按对数分桶（DDSketch）
+# 任意分位数的相对误差不超过 relative_accuracy；数据全部是小于 exact_limit 的
+# 非负整数时（例如回复数）结果与精确计算一致
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01, exact_limit=4096):
+        self.relative_accuracy = relative_accuracy
+        self.exact_limit = exact_limit
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.exact = Counter()
+        self.buckets = Counter()
+        self.count = 0
+
+    def add(self, values, sign=1):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        is_exact = (values >= 0) & (values < self.exact_limit) & (values == np.floor(values))
+        exact_values, exact_counts = np.unique(values[is_exact].astype(np.int64), return_counts=True)
+        for value, count in zip(exact_values.tolist(), exact_counts.tolist()):
+            self.exact[value] += sign * count
+
+        # 负数按0处理（草图只用于非负的计数类数据）
+        rest = np.maximum(values[~is_exact], 1e-9)
+        keys = np.ceil(np.log(rest) / self._log_gamma).astype(np.int64)
+        bucket_keys, bucket_counts = np.unique(keys, return_counts=True)
+        for key, count in zip(bucket_keys.tolist(), bucket_counts.tolist()):
+            self.buckets[key] += sign * count
+
+        self.count += sign * len(values)
+
+    def merge(self, other):
+        self.exact.update(other.exact)
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        return self
+
+    # 按值从小到大产出 (代表值, 数量)；精确计数的值为 int，与一次性加载时的最值类型相同
+    def iter_values(self):
+        values = [(value, count) for value, count in self.exact.items() if count > 0]
+        values += [(2 * self.gamma ** key / (self.gamma + 1), count)
+                   for key, count in self.buckets.items() if count > 0]
+        values.sort()
+        return values
+
+    # 与 pandas.Series.quantile 相同的线性插值
+    def quantile(self, q):
+        if self.count <= 0:
+            return float('nan')
+        rank = q * (self.count - 1)
+        lower_rank = math.floor(rank)
+        upper_rank = math.ceil(rank)
+        lower = upper = None
+        seen = 0
+        for value, count in self.iter_values():
+            seen += count
+            if lower is None and seen > lower_rank:
+                lower = value
+            if seen > upper_rank:
+                upper = value
+                break
+        if upper is None:
+            upper = lower
+        return lower + (upper - lower) * (rank - lower_rank)
+
+    # 落在 [lower, upper] 区间内的数据：数量、均值、最小值、最大值
+    def range_stats(self, lower, upper):
+        count = 0
+        total = 0.0
+        minimum = maximum = None
+        for value, value_count in self.iter_values():
+            if lower <= value <= upper:
+                count += value_count
+                total += value * value_count
+                minimum = value if minimum is None else minimum
+                maximum = value
+        mean = total / count if count else float('nan')
+        return count, mean, minimum, maximum
+
+# 两个变量的累计矩，用于计算均值和皮尔逊相关系数
+class RunningMoments:
+    def __init__(self):
+        self.n = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_yy = 0.0
+        self.sum_xy = 0.0
+
+    def add(self, x, y, sign=1):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.n += sign * len(x)
+        self.sum_x += sign * x.sum()
+        self.sum_y += sign * y.sum()
+        self.sum_xx += sign * (x * x).sum()
+        self.sum_yy += sign * (y * y).sum()
+        self.sum_xy += sign * (x * y).sum()
+
+    def merge(self, other):
+        self.n += other.n
+        self.sum_x += other.sum_x
+        self.sum_y += other.sum_y
+        self.sum_xx += other.sum_xx
+        self.sum_yy += other.sum_yy
+        self.sum_xy += other.sum_xy
+        return self
+
+    def correlation(self):
+        if self.n < 2:
+            return float('nan')
+        cov = self.sum_xy - self.sum_x * self.sum_y / self.n
+        var_x = self.sum_xx - self.sum_x ** 2 / self.n
+        var_y = self.sum_yy - self.sum_y ** 2 / self.n
+        if var_x <= 0 or var_y <= 0:
+            return float('nan')
+        return cov / math.sqrt(var_x * var_y)
+
+# 分组求和与计数，用于分组均值（如按小时的平均回复数）
+class GroupedMean:
+    def __init__(self):
+        self.sums = Counter()
+        self.counts = Counter()
+
+    def add(self, keys, values, sign=1):
+        grouped = {}
+        for key, value in zip(keys, values):
+            if value != value:  # NaN
+                continue
+            total, count = grouped.get(key, (0.0, 0))
+            grouped[key] = (total + value, count + 1)
+        for key, (total, count) in grouped.items():
+            self.sums[key] += sign * total
+            self.counts[key] += sign * count
+
+    def merge(self, other):
+        self.sums.update(other.sums)
+        self.counts.update(other.counts)
+        return self
+
+    # 按键排序后的均值
+    def means(self):
+        return {key: self.sums[key] / self.counts[key]
+                for key in sorted(self.counts) if self.counts[key] > 0}
+
+# 键的64位哈希（blake2b），与 Python 的 hash() 不同，不随进程变化，保存后的草图可以在其他进程中合并
+def _hash64(keys, salt=b''):
+    return np.fromiter((int.from_bytes(hashlib.blake2b(str(key).encode('utf-8'), digest_size=8, salt=salt).digest(),
+                                       'little') for key in keys), dtype=np.uint64)
+
+def _bit_length(values):
+    length = np.zeros(len(values), dtype=np.int64)
+    values = values.copy()
+    for shift in [32, 16, 8, 4, 2, 1]:
+        high = values >= np.uint64(1 << shift)
+        length[high] += shift
+        values[high] >>= np.uint64(shift)
+    return length + (values > 0)
+
+# 频繁项草图（Misra-Gries，Space-Saving 的可合并形式）：最多保存 capacity 个计数，内存固定
+# 每批先精确计数再合并，超出 capacity 时所有计数减去第 capacity+1 大的计数，减去的总量累计在 error 中
+# 保存的计数 count 满足 count <= 真实值 <= count + error，且 error <= 总数 / (capacity + 1)；
+# 真实值大于 error 的项一定被保留。接口与 Counter 相同的部分：update、most_common、len
+class FrequentItems:
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.error = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, key):
+        return key in self.counts
+
+    # counts 为 {键: 次数}、键的序列或另一个 FrequentItems
+    def update(self, counts):
+        if isinstance(counts, FrequentItems):
+            return self.merge(counts)
+        counts = counts if isinstance(counts, dict) else Counter(counts)
+        if any(count < 0 for count in counts.values()):
+            raise ValueError('FrequentItems 不支持撤销数据')
+        self.counts.update(counts)
+        self.total += sum(counts.values())
+        self._prune()
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.error += other.error
+        self.total += other.total
+        self._prune()
+        return self
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        cut = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.counts = Counter({key: count - cut for key, count in self.counts.items() if count > cut})
+        self.error += cut
+
+    def most_common(self, n=None):
+        return self.counts.most_common(n)
+
+# Count-Min 草图：depth 行 × width 列计数，内存固定，可合并，支持撤销
+# 估计值不小于真实值，以 1 - e^-depth 的概率超出不超过 e / width × 总数
+class CountMinSketch:
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    # 双重哈希：第 i 行的列为 (h1 + i × h2) mod width
+    def _columns(self, keys):
+        h1 = _hash64(keys, b'cm1')
+        h2 = _hash64(keys, b'cm2') | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    # counts 为 {键: 次数} 或另一个 CountMinSketch
+    def update(self, counts):
+        if isinstance(counts, CountMinSketch):
+            return self.merge(counts)
+        keys = list(counts)
+        if not keys:
+            return
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+        columns = self._columns(keys)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], values)
+        self.total += int(values.sum())
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def estimate(self, keys):
+        keys = list(keys)
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def error_bound(self):
+        return math.e / self.width * self.total, 1 - math.exp(-self.depth)
+
+# HyperLogLog 基数估计：2^precision 个寄存器（uint8），内存固定（precision=12 时 4KB），可合并，不能撤销
+# 相对标准误差约 1.04 / sqrt(2^precision)（precision=12 时约 1.6%）
+class HyperLogLog:
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        hashes = _hash64(values)
+        if len(hashes) == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # 基数较小时用线性计数
+        return int(round(estimate))
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
@@ -1,184 +1,1035 @@
 import os
 import json
-import pandas as pd
-import re
-from collections import Counter
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pickle
+import hashlib
+import sys
+import argparse
+import fnmatch
+import tempfile
+from collections import Counter, deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from lazy_module import LazyModule
+from keyword_matcher import KeywordMatcher, NATIVE_AVAILABLE
+from hit_matrix import HitMatrix
+from dedup_store import MemoryDedupIndex, DedupStore
+from jsonl_store import JsonlWriter, find_output, iter_jsonl
+from typed_decoder import iter_json_array
+from tokenizer import Tokenizer
+from metrics import MetricsRecorder, measure_work
 
 # 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+def _setup_pyplot(plt):
+    plt.rcParams['font.sans-serif'] = ['SimHei']
+    plt.rcParams['axes.unicode_minus'] = False
+
+# 第三方库在第一次使用时才导入，各阶段只加载自己用到的库；
+# report 子命令只读取统计摘要，不会加载 pandas 和 matplotlib
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+plt = LazyModule('matplotlib.pyplot', _setup_pyplot)
 
 # 1. 读取所有数据文件
-def load_all_data():
-    data_dir = 'c:\\Users\\23120\\Desktop\\贴吧'
-    all_contents = []
-    all_comments = []
-    
-    # 遍历所有子目录
-    for root, dirs, files in os.walk(data_dir):
-        for file in files:
-            if file.endswith('.json'):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 数据目录（爬虫结果按关键词存放在不同子目录中）
+DATA_ROOTS = [os.path.join(BASE_DIR, name) for name in ['游戏', '游戏推荐', 'game']]
+
+# 按文件名模式区分帖子和评论文件
+FILE_PATTERNS = {
+    'contents': ['search_contents_*.json'],
+    'comments': ['search_comments_*.json'],
+}
+
+# 输出目录
+OUTPUT_DIR = os.path.join(BASE_DIR, 'processed_data')
+VIS_DIR = os.path.join(BASE_DIR, 'visualizations')
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')  # 运行指标和采样分析结果
+STATE_DIR = os.path.join(OUTPUT_DIR, 'incremental')  # 增量分析的文件清单和聚合状态
+TOKEN_CACHE_PATH = os.path.join(OUTPUT_DIR, 'token_cache.sqlite')  # 按记录ID缓存的分词结果
+
+# 去重后的记录（JSONL，可压缩，见 jsonl_store.py；后缀由压缩方式决定）
+PROCESSED_DATA_PATHS = {
+    'contents': os.path.join(OUTPUT_DIR, 'filtered_contents'),
+    'comments': os.path.join(OUTPUT_DIR, 'filtered_comments'),
+}
+
+# 处理后数据的列式缓存（见 columnar_cache.py）
+CACHE_PATHS = {
+    'contents': os.path.join(OUTPUT_DIR, 'contents.npz'),
+    'comments': os.path.join(OUTPUT_DIR, 'comments.npz'),
+}
+PUBLISH_TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+# 各字段的列类型：ID为整数，回复数为int32，时间预先解析，贴吧名/IP属地/搜索关键词字典编码
+CACHE_SCHEMAS = {
+    'contents': {
+        'note_id': 'int64', 'publish_time': 'datetime', 'tieba_name': 'category',
+        'total_replay_num': 'int32', 'total_replay_page': 'int32', 'ip_location': 'category',
+        'source_keyword': 'category', 'last_modify_ts': 'int64', 'user_nickname': 'category',
+        'near_duplicate_of': 'int64',
+    },
+    'comments': {
+        'comment_id': 'int64', 'parent_comment_id': 'int64', 'publish_time': 'datetime',
+        'ip_location': 'category', 'sub_comment_count': 'int32', 'note_id': 'int64',
+        'tieba_id': 'int64', 'tieba_name': 'category', 'last_modify_ts': 'int64', 'user_nickname': 'category',
+        'near_duplicate_of': 'int64',
+    },
+}
+
+# 各阶段之间传递的结果：analyze 写入，plot / report 读取
+SUMMARY_PATH = os.path.join(OUTPUT_DIR, 'analysis_summary.json')  # 统计摘要（只含基本类型）
+CHART_INPUTS_PATH = os.path.join(OUTPUT_DIR, 'chart_inputs.pkl')  # 各图表的绘图数据
+THREADS_PATH = os.path.join(OUTPUT_DIR, 'comment_threads.npz')  # 评论回复树（见 comment_threads.py）
+CUBE_PATH = os.path.join(OUTPUT_DIR, 'rollup_cube.npz')  # 时间 × 维度汇总立方体（见 rollup_cube.py）
+
+# analyze_data 用到的列，从缓存读取时只加载这些列
+ANALYSIS_COLUMNS = {
+    'contents': ['note_id', 'title', 'desc', 'tieba_name', 'publish_time', 'total_replay_num', 'ip_location',
+                 'user_nickname'],
+    'comments': ['comment_id', 'parent_comment_id', 'note_id', 'content', 'publish_time', 'sub_comment_count',
+                 'tieba_name', 'user_nickname'],
+}
+
+BATCH_SIZE = 1000  # 流式处理时每批的记录数，决定峰值内存
+CHUNK_SIZE = 100000  # 分块分析时每块的记录数
+SKETCH_CAPACITY = 2000  # 近似分析时每个频繁项草图保存的计数数（见 aggregates.FrequentItems）
+NEAR_DUPLICATE_THRESHOLD = 0.8  # 近似重复的相似度阈值（字符3-gram 的 Jaccard 相似度，见 near_duplicates.py）
+SCHEMA_VIOLATIONS_PATH = os.path.join(OUTPUT_DIR, 'schema_violations.jsonl')  # ingest --typed 时违反模式的值
+
+# 解析时丢弃的字段（头像、用户主页、帖子和贴吧链接）：任何分析都不使用，不进入去重索引、处理后数据和 DataFrame
+DROPPED_FIELDS = ['user_avatar', 'user_link', 'note_url', 'tieba_link']
+
+# 各阶段和各分析小节的耗时、内存与记录数（见 metrics.py），main 结束时写入 METRICS_DIR
+metrics = MetricsRecorder()
+
+# 逐条解析顶层JSON数组，不把整个文件读入内存（见 typed_decoder.iter_json_array）
+# stats[file_path] 记录该文件的有效记录数、跳过的异常记录数；drop_fields 中的字段解析后立即丢弃
+def iter_json_records(file_path, stats=None, chunk_size=65536, max_record_size=1 << 20, drop_fields=DROPPED_FIELDS):
+    file_stats = {'records': 0, 'skipped': 0, 'error': None}
+    if stats is not None:
+        stats[file_path] = file_stats
+    
+    for _, record in iter_json_array(file_path, file_stats, chunk_size=chunk_size, max_record_size=max_record_size):
+        if not isinstance(record, dict):
+            file_stats['skipped'] += 1
+            continue
+        for field in drop_fields:
+            record.pop(field, None)
+        file_stats['records'] += 1
+        yield record
+
+# 遍历所有数据目录，按文件名模式返回 (文件路径, 数据类型)
+def iter_data_files(roots=None, patterns=None):
+    roots = DATA_ROOTS if roots is None else roots
+    patterns = FILE_PATTERNS if patterns is None else patterns
+    seen_paths = set()
+    
+    for data_root in roots:
+        for root, dirs, files in os.walk(data_root):
+            dirs.sort()
+            for file in sorted(files):
                 file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if 'content' in file or 'contents' in file:
-                            all_contents.extend(data)
-                        elif 'comment' in file or 'comments' in file:
-                            all_comments.extend(data)
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
-    
+                real_path = os.path.realpath(file_path)
+                if real_path in seen_paths:
+                    continue
+                for kind, kind_patterns in patterns.items():
+                    if any(fnmatch.fnmatch(file, pattern) for pattern in kind_patterns):
+                        seen_paths.add(real_path)
+                        yield file_path, kind
+                        break
+
+# 按数据类型流式产出所有文件中的记录
+def iter_all_data(kind, stats=None, roots=None, patterns=None):
+    for file_path, file_kind in iter_data_files(roots, patterns):
+        if file_kind == kind:
+            yield from iter_json_records(file_path, stats)
+
+def iter_batches(records, batch_size=BATCH_SIZE):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load_all_data(stats=None, roots=None, patterns=None):
+    all_contents = list(iter_all_data('contents', stats, roots, patterns))
+    all_comments = list(iter_all_data('comments', stats, roots, patterns))
     return all_contents, all_comments
 
+# 单个文件的读取与筛选，在进程池/线程池中执行
+# 筛选结果按批写入临时文件，不在内存中保留整个文件的记录；返回临时文件的路径，由 _iter_spool 读取并删除
+def _ingest_file(file_path, batch_size=BATCH_SIZE):
+    stats = {}
+    raw_count = 0
+    filtered_count = 0
+    fd, spool_path = tempfile.mkstemp(prefix='ingest-', suffix='.pkl')
+    with os.fdopen(fd, 'wb') as f:
+        for batch in iter_batches(iter_json_records(file_path, stats), batch_size):
+            raw_count += len(batch)
+            filtered = filter_game_related(batch)
+            filtered_count += len(filtered)
+            pickle.dump(filtered, f, protocol=4)
+    return stats[file_path], raw_count, filtered_count, spool_path
+
+# 逐批读取 _ingest_file 写出的记录，读完（或中途停止）后删除临时文件
+def _iter_spool(spool_path):
+    try:
+        with open(spool_path, 'rb') as f:
+            while True:
+                try:
+                    yield from pickle.load(f)
+                except EOFError:
+                    return
+    finally:
+        os.remove(spool_path)
+
+# 按输入顺序产出 pool 中 fn 的结果，同时最多有 window 个任务未取走结果，
+# 已完成的结果不会在主进程中堆积；提前停止时未取走的结果交给 discard 清理
+def _bounded_map(pool, fn, iterables, window, discard=None):
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(pool.submit(fn, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            if not future.cancel() and discard is not None and future.exception() is None:
+                discard(future.result())
+
+# 按批产出筛选后的记录（读取 -> 筛选），files 指定只读取这些文件
+# workers > 1 时各文件在进程池（executor='thread' 时为线程池）中并行读取和筛选，
+# 结果仍按文件顺序产出，与串行读取一致；同时最多处理 workers 个文件，筛选结果经临时文件按批传回
+def iter_filtered_batches(kind, stats=None, counts=None, batch_size=BATCH_SIZE,
+                          roots=None, patterns=None, workers=None, executor='process', files=None):
+    if stats is None:
+        stats = {}
+    if counts is None:
+        counts = {}
+    counts.update({'raw': 0, 'filtered': 0})
+    
+    if files is None:
+        files = [file_path for file_path, file_kind in iter_data_files(roots, patterns) if file_kind == kind]
+    if workers is None:
+        workers = min(len(files), os.cpu_count() or 1)
+    
+    if workers <= 1:
+        records = (record for file_path in files for record in iter_json_records(file_path, stats))
+        for batch in iter_batches(records, batch_size):
+            counts['raw'] += len(batch)
+            filtered = filter_game_related(batch)
+            counts['filtered'] += len(filtered)
+            yield filtered
+        return
+    
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with pool_class(max_workers=workers) as pool:
+        results = _bounded_map(pool, _ingest_file, (files, repeat(batch_size)), workers,
+                               discard=lambda result: os.remove(result[3]))
+        for file_path, (file_stats, raw_count, filtered_count, spool_path) in zip(files, results):
+            stats[file_path] = file_stats
+            counts['raw'] += raw_count
+            counts['filtered'] += filtered_count
+            yield from iter_batches(_iter_spool(spool_path), batch_size)
+
+# 流式完成 读取 -> 筛选 -> 去重，产出每个ID的最新版本
+# counts 用于回传各阶段的记录数；dedup_index 可传入 DedupStore 使用磁盘去重索引
+# 默认的 MemoryDedupIndex 在内存中保存每个ID的最新记录，内存占用与去重后的数据量成正比，
+# 只有传入 DedupStore（ingest --dedup-store）时内存占用与数据量无关
+def stream_game_data(kind, stats=None, counts=None, batch_size=BATCH_SIZE,
+                     roots=None, patterns=None, workers=None, executor='process',
+                     files=None, dedup_index=None, near_duplicates=None, similarity=NEAR_DUPLICATE_THRESHOLD):
+    if counts is None:
+        counts = {}
+    if dedup_index is None:
+        dedup_index = MemoryDedupIndex()
+    
+    for batch in iter_filtered_batches(kind, stats, counts, batch_size, roots, patterns, workers, executor, files):
+        dedup_index.add_batch(kind, dedup_items(batch))
+    
+    counts['unique'] = dedup_index.count(kind)
+    if near_duplicates:
+        yield from mark_near_duplicates(dedup_index, kind, near_duplicates, similarity, counts, batch_size)
+    else:
+        yield from dedup_index.iter_records(kind)
+
+# 单个文件的类型化解码与筛选，在进程池中执行；返回 (读取情况, 原始记录数, 筛选后的 DataFrame, 违反模式的列表)
+def _typed_ingest_file(file_path, kind):
+    from typed_decoder import TypedDecoder
+    
+    file_stats = {}
+    decoder = TypedDecoder(CACHE_SCHEMAS[kind], PUBLISH_TIME_FORMAT, DROPPED_FIELDS)
+    df, violations = decoder.decode_file(file_path, file_stats)
+    file_stats['violations'] = len(violations)
+    return file_stats, len(df), df[game_related_mask(df)].reset_index(drop=True), violations
+
+# 类型化读取（ingest --typed）：每个文件按 CACHE_SCHEMAS 直接解码为类型化的列（见 typed_decoder.py），
+# 筛选、去重、近似重复都在列上完成，不为每条记录生成字典；结果与 stream_game_data 的记录顺序相同
+# violations 用于回传违反模式的值（SchemaViolation）
+def typed_game_frame(kind, stats=None, counts=None, violations=None, roots=None, patterns=None, workers=None,
+                     near_duplicates=None, similarity=NEAR_DUPLICATE_THRESHOLD):
+    stats = {} if stats is None else stats
+    counts = {} if counts is None else counts
+    counts.update({'raw': 0, 'filtered': 0})
+    
+    files = [file_path for file_path, file_kind in iter_data_files(roots, patterns) if file_kind == kind]
+    if workers is None:
+        workers = min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        results = map(_typed_ingest_file, files, repeat(kind))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_typed_ingest_file, files, repeat(kind))
+    
+    frames = []
+    try:
+        for file_path, (file_stats, raw_count, df, file_violations) in zip(files, results):
+            stats[file_path] = file_stats
+            counts['raw'] += raw_count
+            counts['filtered'] += len(df)
+            frames.append(df)
+            if violations is not None:
+                violations.extend(file_violations)
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    
+    df = concat_frames(frames, kind)
+    df = remove_duplicate_rows(df)
+    counts['unique'] = len(df)
+    if near_duplicates:
+        df = mark_near_duplicate_rows(df, near_duplicates, similarity, counts)
+    return df
+
+# 输出每个文件的读取情况
+def print_load_report(stats):
+    print("\n=== 数据文件读取报告 ===")
+    total_skipped = 0
+    for file_path, file_stats in stats.items():
+        line = f"{os.path.basename(file_path)}: {file_stats['records']}条记录，跳过异常记录{file_stats['skipped']}条"
+        if file_stats.get('violations'):
+            line += f"，违反模式的值{file_stats['violations']}个"
+        if file_stats['error']:
+            line += f"（读取错误: {file_stats['error']}）"
+        print(line)
+        total_skipped += file_stats['skipped']
+    print(f"共跳过异常记录: {total_skipped}条")
+
+# 输出违反模式的值（文件:字符偏移 字段=值：原因），只列出前 limit 个，全部写入 path（JSONL）
+def report_schema_violations(violations, path=None, limit=10):
+    path = SCHEMA_VIOLATIONS_PATH if path is None else path
+    if not violations:
+        # 删除上次运行留下的记录
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    print(f"\n违反模式的值: {len(violations)}个（已记为缺失）")
+    for violation in violations[:limit]:
+        print(f"  {violation}")
+    with open(path, 'w', encoding='utf-8') as f:
+        for violation in violations:
+            f.write(json.dumps(violation._asdict(), ensure_ascii=False, default=str) + '\n')
+    print(f"全部违反模式的值已保存到 {path}")
+
 # 2. 筛选与游戏相关的内容
+# 游戏相关关键词（更广泛的游戏术语）
+GAME_KEYWORDS = ['游戏', '网游', '手游', '端游', '电竞', 'steam', 'ps5', 'xbox', 'switch',
+                 '主机', '掌机', 'pc', '单机', '在线', '多人', '竞技', '副本', '剧情',
+                 '装备', '角色', '升级', '任务', '成就', '皮肤', '道具', '攻略', '测评',
+                 'mod', '补丁', 'DLC', '画质', '帧率', '卡顿', '流畅', '操作', '手感',
+                 '存档', '加载', '闪退', 'bug', '更新', '版本', '发售', '预售', '折扣',
+                 '推荐', '对比', '选择', '配置', '需求', '安装', '下载', '账号', '登录']
+
+# 明确的游戏相关贴吧名称
+GAMING_TIEBAS = ['游戏', '主机游戏', 'steam', 'ps5', 'xbox', 'switch', '手游', '电竞',
+                 '网络游戏', '单机游戏', '图拉丁', '电脑吧', '显卡', '游戏推荐', '英雄联盟',
+                 '游戏王', '原神', '塞尔达', '战神', '地平线', '宝可梦', '马里奥', '最终幻想',
+                 '王者荣耀', '和平精英', 'pubg', 'csgo', 'dota', 'lol', '守望先锋', 'apex',
+                 'valorant', 'gta', '赛博朋克', '巫师', '刺客信条', '荒野大镖客']
+
+# 关键词自动机每个进程只构建一次，帖子和评论共用
+@lru_cache(maxsize=None)
+def get_game_matchers():
+    return KeywordMatcher(GAME_KEYWORDS), KeywordMatcher(GAMING_TIEBAS)
+
+# 拼接用于关键词匹配的文本（帖子：标题+描述+贴吧名；评论：内容）
+def _record_text(item):
+    text = ''
+    
+    # 处理帖子数据
+    if 'title' in item:
+        text += item['title'] + ' '
+    if 'desc' in item and item['desc']:
+        text += item['desc'] + ' '
+    if 'tieba_name' in item:
+        text += item['tieba_name'] + ' '
+    
+    # 处理评论数据
+    if 'content' in item:
+        text += item['content'] + ' '
+    
+    return text
+
 def filter_game_related(data):
-    # 游戏相关关键词（更广泛的游戏术语）
-    game_keywords = ['游戏', '网游', '手游', '端游', '电竞', 'steam', 'ps5', 'xbox', 'switch',
-                    '主机', '掌机', 'pc', '单机', '在线', '多人', '竞技', '副本', '剧情',
-                    '装备', '角色', '升级', '任务', '成就', '皮肤', '道具', '攻略', '测评',
-                    'mod', '补丁', 'DLC', '画质', '帧率', '卡顿', '流畅', '操作', '手感',
-                    '存档', '加载', '闪退', 'bug', '更新', '版本', '发售', '预售', '折扣',
-                    '推荐', '对比', '选择', '配置', '需求', '安装', '下载', '账号', '登录']
-    
-    # 明确的游戏相关贴吧名称
-    gaming_tiebas = ['游戏', '主机游戏', 'steam', 'ps5', 'xbox', 'switch', '手游', '电竞',
-                     '网络游戏', '单机游戏', '图拉丁', '电脑吧', '显卡', '游戏推荐', '英雄联盟',
-                     '游戏王', '原神', '塞尔达', '战神', '地平线', '宝可梦', '马里奥', '最终幻想',
-                     '王者荣耀', '和平精英', 'pubg', 'csgo', 'dota', 'lol', '守望先锋', 'apex',
-                     'valorant', 'gta', '赛博朋克', '巫师', '刺客信条', '荒野大镖客']
+    keyword_matcher, tieba_matcher = get_game_matchers()
     
     filtered_data = []
     for item in data:
-        # 检查内容是否包含游戏相关关键词
-        text = ''
-        
-        # 处理帖子数据
-        if 'title' in item:
-            text += item['title'] + ' '
-        if 'desc' in item and item['desc']:
-            text += item['desc'] + ' '
-        if 'tieba_name' in item:
-            text += item['tieba_name'] + ' '
-        
-        # 处理评论数据
-        if 'content' in item:
-            text += item['content'] + ' '
-        
         # 1. 优先检查是否来自游戏相关贴吧
-        if 'tieba_name' in item:
-            tieba_name = item['tieba_name']
-            if any(gaming_tieba in tieba_name for gaming_tieba in gaming_tiebas):
-                filtered_data.append(item)
-                continue
+        if 'tieba_name' in item and tieba_matcher.search(item['tieba_name']):
+            filtered_data.append(item)
+            continue
         
         # 2. 检查是否包含广泛的游戏相关术语
-        if any(keyword in text for keyword in game_keywords):
+        if keyword_matcher.search(_record_text(item)):
             filtered_data.append(item)
             continue
     
     return filtered_data
 
+# filter_game_related 的列式版本：返回表示是否与游戏相关的布尔数组，规则相同
+# 贴吧名按类别各匹配一次，文本（拼接方式同 _record_text）整列扫描一遍
+def game_related_mask(df):
+    keyword_matcher, tieba_matcher = get_game_matchers()
+    related = np.zeros(len(df), dtype=bool)
+    if 'tieba_name' in df.columns:
+        names = df['tieba_name'].astype('category')
+        hits = np.array([tieba_matcher.search(name) for name in names.cat.categories] + [False], dtype=bool)
+        related |= hits[names.cat.codes.to_numpy()]  # 缺失值的编码为 -1，对应末尾的 False
+    
+    texts = np.full(len(df), '', dtype=object)
+    for name in ('title', 'desc', 'tieba_name', 'content'):
+        if name not in df.columns:
+            continue
+        present = df[name].notna().to_numpy()
+        if name == 'desc':
+            present = present & (df[name].astype(object) != '').to_numpy()
+        texts[present] = texts[present] + df[name].astype(object).to_numpy()[present] + ' '
+    
+    candidates = np.flatnonzero(~related)
+    rows, _, _ = keyword_matcher.match_arrays(texts[candidates].tolist())
+    related[candidates[rows]] = True
+    return related
+
+# 批量返回每条记录命中的贴吧名和关键词，用于核查筛选结果
+def audit_game_related(data):
+    data = list(data)
+    keyword_matcher, tieba_matcher = get_game_matchers()
+    tieba_hits = tieba_matcher.match_batch(item.get('tieba_name') or '' for item in data)
+    keyword_hits = keyword_matcher.match_batch(_record_text(item) for item in data)
+    
+    return [{'tieba_hits': tiebas, 'keyword_hits': keywords, 'is_game_related': bool(tiebas or keywords)}
+            for tiebas, keywords in zip(tieba_hits, keyword_hits)]
+
 # 3. 去重
+# 评论按comment_id、帖子按note_id去重（评论也带有note_id，必须先判断comment_id）
+def record_key(item):
+    if 'comment_id' in item:
+        return item['comment_id']
+    if 'note_id' in item:
+        return item['note_id']
+    # 对于没有明确ID的，使用标题+描述+发布时间作为唯一标识
+    return f"{item.get('title', '')}-{item.get('desc', '')}-{item.get('publish_time', '')}"
+
+# 去重索引的输入：(ID, 更新时间, 记录)
+def dedup_items(data):
+    return [(record_key(item), item.get('last_modify_ts') or 0, item) for item in data]
+
+# 同一ID只保留 last_modify_ts 最新的版本（保持ID首次出现的位置）
 def remove_duplicates(data):
-    # 根据note_id或唯一标识符去重
-    seen = set()
-    unique_data = []
-    for item in data:
-        if 'note_id' in item:
-            key = item['note_id']
-        elif 'comment_id' in item:
-            key = item['comment_id']
-        else:
-            # 对于没有明确ID的，使用标题+描述+发布时间作为唯一标识
-            key = f"{item.get('title', '')}-{item.get('desc', '')}-{item.get('publish_time', '')}"
-        
-        if key not in seen:
-            seen.add(key)
-            unique_data.append(item)
+    dedup_index = MemoryDedupIndex()
+    dedup_index.add_batch('records', dedup_items(data))
+    return list(dedup_index.iter_records('records'))
+
+# remove_duplicates 的列式版本：ID相同的行只保留 last_modify_ts 最新的一行（相同时保留先出现的），
+# 结果按ID首次出现的顺序排列
+def remove_duplicate_rows(df):
+    if df.empty:
+        return df
+    id_column = 'comment_id' if 'comment_id' in df.columns else 'note_id' if 'note_id' in df.columns else None
+    keys = df[id_column].astype(object) if id_column else pd.Series(pd.NA, index=df.index, dtype=object)
+    missing = keys.isna().to_numpy()
+    if missing.any():
+        # 没有ID的行使用 标题-描述-发布时间 作为唯一标识（同 record_key）
+        fallback = [f"{item.get('title', '')}-{item.get('desc', '')}-{item.get('publish_time', '')}"
+                    for item in frame_records(df[missing])]
+        keys = keys.where(~missing, pd.Series(fallback, index=df.index[missing], dtype=object))
+    
+    codes, _ = pd.factorize(keys)  # 编号按首次出现的顺序
+    ts = df['last_modify_ts'].fillna(0).to_numpy(dtype=np.int64) if 'last_modify_ts' in df.columns \
+        else np.zeros(len(df), dtype=np.int64)
+    order = np.lexsort((np.arange(len(df)), -ts, codes))
+    first = np.r_[True, codes[order][1:] != codes[order][:-1]]
+    return df.iloc[order[first]].reset_index(drop=True)
+
+# 近似重复比较的文本（帖子：标题+描述；评论：内容），不含贴吧名，跨贴吧刷屏的广告也能归为一簇
+def _similarity_text(item):
+    if 'content' in item:
+        return item['content'] or ''
+    return f"{item.get('title') or ''} {item.get('desc') or ''}"
+
+# 近似重复（见 near_duplicates.py）：第一遍计算去重后记录的签名并聚类，第二遍按去重顺序产出记录，
+# 簇中除最早出现的记录外，mode='tag' 时加上 near_duplicate_of（最早出现的记录的ID），mode='drop' 时丢弃
+# 分析不读取 near_duplicate_of：tag 只供检查处理后数据，被标记的记录照常参与分析
+def mark_near_duplicates(dedup_index, kind, mode, similarity=NEAR_DUPLICATE_THRESHOLD, counts=None,
+                         batch_size=BATCH_SIZE):
+    from near_duplicates import NearDuplicateDetector
+    
+    detector = NearDuplicateDetector(similarity)
+    for batch in iter_batches(dedup_index.iter_records(kind), batch_size):
+        detector.add_batch([_similarity_text(item) for item in batch])
+    parents = detector.clusters()
+    duplicated = parents != np.arange(len(parents))
+    if counts is not None:
+        counts['near_duplicates'] = int(duplicated.sum())
+    
+    representatives = set(parents[duplicated].tolist())
+    keys = {}
+    for i, item in enumerate(dedup_index.iter_records(kind)):
+        if i in representatives:
+            keys[i] = record_key(item)
+        if not duplicated[i]:
+            yield item
+        elif mode == 'tag':
+            yield dict(item, near_duplicate_of=keys[parents[i]])
+
+# mark_near_duplicates 的列式版本：mode='tag' 时加上 near_duplicate_of 列，mode='drop' 时删除这些行
+def mark_near_duplicate_rows(df, mode, similarity=NEAR_DUPLICATE_THRESHOLD, counts=None, batch_size=BATCH_SIZE):
+    from near_duplicates import NearDuplicateDetector
     
-    return unique_data
+    if 'content' in df.columns:
+        texts = df['content'].fillna('').astype(str).tolist()
+    else:
+        title = df['title'].fillna('').astype(str) if 'title' in df.columns else ''
+        desc = df['desc'].fillna('').astype(str) if 'desc' in df.columns else ''
+        texts = (pd.Series(title, index=df.index) + ' ' + desc).tolist()
+    detector = NearDuplicateDetector(similarity)
+    for start in range(0, len(texts), batch_size):
+        detector.add_batch(texts[start:start + batch_size])
+    parents = detector.clusters()
+    duplicated = parents != np.arange(len(parents))
+    if counts is not None:
+        counts['near_duplicates'] = int(duplicated.sum())
+    
+    if mode == 'drop':
+        return df[~duplicated].reset_index(drop=True)
+    id_column = 'comment_id' if 'comment_id' in df.columns else 'note_id'
+    df = df.copy()
+    df['near_duplicate_of'] = df[id_column].to_numpy()[parents]
+    df.loc[~duplicated, 'near_duplicate_of'] = pd.NA
+    df['near_duplicate_of'] = df['near_duplicate_of'].astype('Int64')
+    return df
 
 # 4. 分析数据
+# 平台相关关键词（用于分类）
+PLATFORM_KEYWORDS = {
+    '主机': ['ps5', 'xbox', 'switch', '主机', 'playstation', 'ps4', 'ps3', 'xbox series', 'xbox one'],
+    '手游': ['手机', '手游', '移动端', '安卓', 'ios', 'app', '手游推荐', '手机游戏']
+}
+
+# 创建游戏分类列表（去重）
+GAME_CATEGORIES = {
+    '主机游戏': list(dict.fromkeys(['塞尔达', '赛博朋克2077', '巫师3', '刺客信条', '荒野大镖客2',
+                   'gta5', '原神', '最终幻想', '战神', '地平线', '漫威蜘蛛侠',
+                   '马里奥', '宝可梦', '暗黑破坏神', '星际争霸', '红警'])),
+    '手游': list(dict.fromkeys(['王者荣耀', '和平精英', 'lol', 'csgo', 'pubg', '原神', '三国杀',
+               '饥荒', '我的世界', '泰拉瑞亚', 'among us', '糖豆人', 'apex', 'valorant']))
+}
+
+# 游戏别名：匹配到别名时计为对应的游戏
+GAME_ALIASES = {'塞尔达传说': '塞尔达', '吃鸡': 'pubg', '绝地求生': 'pubg', '赛博朋克': '赛博朋克2077',
+                '荒野大镖客': '荒野大镖客2', '英雄联盟': 'lol'}
+
+# 合并所有游戏
+COMMON_GAMES = list(dict.fromkeys(GAME_CATEGORIES['主机游戏'] + GAME_CATEGORIES['手游']))
+
+# 好评率分析（简单版）关键词
+POSITIVE_KEYWORDS = ['好玩', '不错', '喜欢', '推荐', '好评', '优秀', '神作', '给力', '良心', '精彩']
+NEGATIVE_KEYWORDS = ['垃圾', '不好玩', '失望', '差评', '坑', '骗钱', '垃圾', '卸载', '后悔', '无聊']
+
+# 细化情感关键词（增强版）
+SENTIMENT_KEYWORDS = {
+    '非常正面': ['神作', '惊艳', '完美', '极致', '必玩', '经典', '史诗', '震撼', '爽到', '无敌'],
+    '正面': ['好玩', '不错', '喜欢', '推荐', '优秀', '给力', '良心', '精彩', '流畅', '满意'],
+    '中性': ['一般', '普通', '还行', '中规中矩', '过得去', '没感觉'],
+    '负面': ['失望', '差评', '垃圾', '坑', '骗钱', '卡顿', '闪退', '无聊', '后悔', '卸载'],
+    '非常负面': ['垃圾中的垃圾', '完全失望', '骗钱游戏', '根本没法玩', '史上最差', '烂作']
+}
+
+GAME_TYPES = ['主机', '手游', '双平台', '其他']
+
+# 帖子长度区间
+LENGTH_BINS = [0, 50, 100, 200, 300, 500, float('inf')]
+LENGTH_LABELS = ['0-50字', '51-100字', '101-200字', '201-300字', '301-500字', '500字以上']
+
+DAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 关键词提取的停用词
+STOPWORDS = {'的', '了', '是', '在', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这', '们', '来', '给', '之', '得', '以'}
+SENTIMENT_LABELS = ['好评', '差评', '中性']
+SENTIMENT_LEVELS = ['非常正面', '正面', '中性', '负面', '非常负面']
+SENTIMENT_SCORES = {'非常正面': 2, '正面': 1, '中性': 0, '负面': -1, '非常负面': -2}  # 评论情感得分
+
+# 关键词角色位：平台/游戏关键词在 标题+描述+贴吧名 中匹配，情感关键词只在 标题+描述 中匹配
+_HOST_BIT = 1 << 0
+_MOBILE_BIT = 1 << 1
+_POSITIVE_BIT = 1 << 2
+_NEGATIVE_BIT = 1 << 3
+_LEVEL_BITS = {level: 1 << (4 + i) for i, level in enumerate(SENTIMENT_LEVELS)}
+_FULL_TEXT_BITS = _HOST_BIT | _MOBILE_BIT
+
+# 所有特征关键词编译进同一个自动机（统一转为小写匹配），每个进程只构建一次
+# 返回自动机和按关键词序号排列的三个数组：角色位、游戏编号（COMMON_GAMES 中的序号，别名为对应游戏的序号，
+# 不是游戏为 -1）、是否为实体（游戏名和平台关键词，按最长匹配计，见 scan_features）
+@lru_cache(maxsize=None)
+def get_feature_matcher():
+    roles = {}
+    
+    def add(words, bit):
+        for word in words:
+            roles[word.lower()] = roles.get(word.lower(), 0) | bit
+    
+    add(PLATFORM_KEYWORDS['主机'], _HOST_BIT)
+    add(PLATFORM_KEYWORDS['手游'], _MOBILE_BIT)
+    add(POSITIVE_KEYWORDS, _POSITIVE_BIT)
+    add(NEGATIVE_KEYWORDS, _NEGATIVE_BIT)
+    for level, words in SENTIMENT_KEYWORDS.items():
+        add(words, _LEVEL_BITS[level])
+    add(COMMON_GAMES, 0)
+    add(GAME_ALIASES, 0)
+    
+    matcher = KeywordMatcher(list(roles))
+    role_masks = np.array([roles[keyword] for keyword in matcher.keywords], dtype=np.int64)
+    game_positions = {game.lower(): i for i, game in enumerate(COMMON_GAMES)}
+    game_positions.update({alias.lower(): game_positions[game.lower()] for alias, game in GAME_ALIASES.items()})
+    game_ids = np.array([game_positions.get(keyword, -1) for keyword in matcher.keywords], dtype=np.int64)
+    entities = {word.lower() for words in PLATFORM_KEYWORDS.values() for word in words}
+    is_entity = np.array([keyword in entities or keyword in game_positions for keyword in matcher.keywords], dtype=bool)
+    return matcher, role_masks, game_ids, is_entity
+
+# 在特征自动机上扫描一遍全部文本（见 KeywordMatcher.match_arrays），大量文本按块处理以控制内存
+# 游戏名和平台关键词按最长匹配计：被更长的游戏名或平台关键词覆盖的命中不计（“塞尔达传说”不再同时计为“塞尔达”），
+# 情感关键词仍按全部命中计
+# 返回每条文本命中的关键词角色位，以及 文本 × 游戏 的稀疏命中矩阵（HitMatrix，别名已归到对应的游戏）
+# 给出 text_lengths 时，第 i 条文本中终点不在前 text_lengths[i] 个字符内的命中只计 _FULL_TEXT_BITS
+def scan_features(texts, text_lengths=None, lower=True, chunk_size=200000):
+    matcher, role_masks, game_ids, is_entity = get_feature_matcher()
+    masks = np.zeros(len(texts), dtype=np.int64)
+    game_rows = []
+    game_codes = []
+    for start in range(0, len(texts), chunk_size):
+        rows, keyword_indexes, ends = matcher.match_arrays(texts[start:start + chunk_size], lower=lower)
+        keep = matcher.longest_matches(rows, keyword_indexes, ends, is_entity[keyword_indexes])
+        rows, keyword_indexes, ends = rows[keep] + start, keyword_indexes[keep], ends[keep]
+        bits = role_masks[keyword_indexes]
+        if text_lengths is not None:
+            bits = np.where(ends < text_lengths[rows], bits, bits & _FULL_TEXT_BITS)
+        np.bitwise_or.at(masks, rows, bits)
+        is_game = game_ids[keyword_indexes] >= 0
+        game_rows.append(rows[is_game])
+        game_codes.append(game_ids[keyword_indexes[is_game]])
+    
+    if not game_rows:
+        game_rows = game_codes = [np.zeros(0, dtype=np.int64)]
+    return masks, HitMatrix.from_pairs(np.concatenate(game_rows), np.concatenate(game_codes), len(texts), COMMON_GAMES)
+
+# 增强版情感按 非常负面 > 非常正面 > 负面 > 正面 的优先级判断，masks 为每条文本命中的关键词角色位
+def _sentiment_levels(masks):
+    def has(level):
+        return (masks & _LEVEL_BITS[level]) != 0
+    
+    return np.select([has('非常负面'), has('非常正面'), has('负面'), has('正面')],
+                     ['非常负面', '非常正面', '负面', '正面'], '中性')
+
+# 4.0 特征提取：一次遍历提取帖子的全部特征，后续各分析环节都从特征表和游戏命中矩阵读取
+# 返回 (特征表, 游戏命中矩阵)；游戏命中矩阵为 帖子 × COMMON_GAMES 的 HitMatrix（行号与 df_contents 的行对应）
+# 特征表与 df_contents 索引一致：
+#   text            标题+描述
+#   normalized_text 标题+描述+贴吧名（小写）
+#   is_host / is_mobile  是否命中主机/手游平台关键词
+#   game_type       主机 / 手游 / 双平台 / 其他
+#   sentiment       简单版情感：好评 / 差评 / 中性
+#   sentiment_level 增强版情感：非常正面 / 正面 / 中性 / 负面 / 非常负面
+#   post_length     标题+描述的字符数
+def extract_features(df_contents):
+    index = df_contents.index
+    
+    def text_column(name):
+        if name not in df_contents.columns:
+            return pd.Series('', index=index, dtype=object)
+        return df_contents[name].fillna('').astype(str)
+    
+    title = text_column('title')
+    desc = text_column('desc')
+    tieba_name = text_column('tieba_name')
+    
+    text = title + ' ' + desc
+    normalized_text = (text + ' ' + tieba_name).str.lower()
+    
+    # 单次扫描：全部文本在自动机上只走一遍；贴吧名部分只用于判断平台
+    masks, game_matrix = scan_features(normalized_text.tolist(), text.str.len().to_numpy(dtype=np.int64), lower=False)
+    
+    def has(bit):
+        return (masks & bit) != 0
+    
+    is_host = has(_HOST_BIT)
+    is_mobile = has(_MOBILE_BIT)
+    game_type = np.select([is_host & is_mobile, is_host, is_mobile], ['双平台', '主机', '手游'], '其他')
+    
+    has_positive = has(_POSITIVE_BIT)
+    has_negative = has(_NEGATIVE_BIT)
+    sentiment = np.select([has_positive & ~has_negative, has_negative & ~has_positive], ['好评', '差评'], '中性')
+    
+    sentiment_level = _sentiment_levels(masks)
+    
+    features = pd.DataFrame({
+        'text': text,
+        'normalized_text': normalized_text,
+        'is_host': is_host,
+        'is_mobile': is_mobile,
+        'game_type': pd.Categorical(game_type, categories=GAME_TYPES),
+        'sentiment': pd.Categorical(sentiment, categories=SENTIMENT_LABELS),
+        'sentiment_level': pd.Categorical(sentiment_level, categories=SENTIMENT_LEVELS),
+        'post_length': (title.str.len() + desc.str.len()).astype(np.int32),
+    }, index=index)
+    return features, game_matrix
+
+# 4.0.1 帖子⇄评论关联表：每个 note_id 一行，索引即 note_id，按 note_id 查询为 O(1)
+#   row               帖子在 df_contents 中的行号（只有评论、没有帖子时为 -1）
+#   title / total_replay_num  帖子标题和回复数
+#   comment_count     评论数
+#   sub_comment_total 楼中楼回复总数
+#   first_comment_time / last_comment_time  首条/最新评论时间
+def build_post_comment_join(df_contents, df_comments):
+    note_ids = df_contents['note_id'] if 'note_id' in df_contents.columns else pd.Series([], dtype=object)
+    posts = pd.DataFrame({
+        'row': np.arange(len(note_ids)),
+        'title': df_contents['title'].values if 'title' in df_contents.columns else None,
+        'total_replay_num': df_contents['total_replay_num'].values if 'total_replay_num' in df_contents.columns else np.nan,
+    }, index=pd.Index(note_ids.values, name='note_id'))
+    posts = posts[~posts.index.duplicated()]
+    
+    stat_columns = ['comment_count', 'sub_comment_total', 'first_comment_time', 'last_comment_time']
+    if df_comments.empty or 'note_id' not in df_comments.columns:
+        comment_stats = pd.DataFrame(columns=stat_columns, index=pd.Index([], name='note_id'))
+    else:
+        comment_time = pd.to_datetime(df_comments['publish_time'], format='%Y-%m-%d %H:%M', errors='coerce') \
+            if 'publish_time' in df_comments.columns else pd.Series(pd.NaT, index=df_comments.index)
+        sub_comments = df_comments['sub_comment_count'] if 'sub_comment_count' in df_comments.columns else 0
+        comment_stats = pd.DataFrame({
+            'note_id': df_comments['note_id'],
+            'sub_comment_count': pd.to_numeric(sub_comments, errors='coerce'),
+            'comment_time': comment_time,
+        }).groupby('note_id', sort=False).agg(
+            comment_count=('note_id', 'size'),
+            sub_comment_total=('sub_comment_count', 'sum'),
+            first_comment_time=('comment_time', 'min'),
+            last_comment_time=('comment_time', 'max'),
+        )
+    
+    # 帖子在前（保持原顺序），只有评论的 note_id 追加在后
+    extra_ids = comment_stats.index[~comment_stats.index.isin(posts.index)]
+    post_join = posts.reindex(posts.index.append(extra_ids)).join(comment_stats)
+    post_join['row'] = post_join['row'].fillna(-1).astype(np.int64)
+    post_join['comment_count'] = post_join['comment_count'].fillna(0).astype(np.int64)
+    post_join['sub_comment_total'] = post_join['sub_comment_total'].fillna(0).astype(np.int64)
+    return post_join
+
+# 按 note_id 取帖子标题（O(1)）
+def lookup_post_title(post_join, note_id, default='未知标题'):
+    if note_id in post_join.index:
+        title = post_join.at[note_id, 'title']
+        if isinstance(title, str):
+            return title
+    return default
+
+# 4.0.2 关键词提取：逐条分词（游戏名称作为自定义词），过滤停用词和非中文词汇后统计词频
+# 分词器每个进程只创建一次，分词结果按记录ID缓存，未变化的记录不会重复分词；自定义词或停用词变化时缓存失效
+@lru_cache(maxsize=None)
+def get_tokenizer():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    user_words = list(dict.fromkeys([game for games in GAME_CATEGORIES.values() for game in games] + list(GAME_ALIASES)))
+    return Tokenizer(user_words, STOPWORDS, cache_path=TOKEN_CACHE_PATH)
+
+# keys 为记录ID（帖子 'note:<note_id>'，评论 'comment:<comment_id>'），用于分词缓存
+def extract_keywords(texts, keys=None):
+    return get_tokenizer().count_keywords(list(texts), keys)
+
+def _cache_keys(df, id_column, prefix):
+    if id_column not in df.columns:
+        return None
+    return [f'{prefix}:{record_id}' for record_id in df[id_column]]
+
+# 评论关键词词频
+def extract_comment_keywords(df_comments):
+    if 'content' not in df_comments.columns:
+        return Counter()
+    return extract_keywords(df_comments['content'].fillna('').astype(str), _cache_keys(df_comments, 'comment_id', 'comment'))
+
+# 4.0.3 紧凑的 DataFrame 与列式缓存的读写
+# 记录转为 DataFrame 时按 CACHE_SCHEMAS 转换列类型（ID为整数，时间预先解析，贴吧名/IP属地/搜索关键词为分类），
+# 与从列式缓存读出的类型相同；columns 只保留这些字段（记录中都没有的字段不生成列）
+# 记录可以是任意可迭代对象，每 chunk_size 条转换一次，不会同时保留全部记录的字符串对象
+def records_frame(records, kind, columns=None, chunk_size=50000):
+    from columnar_cache import coerce_frame
+    
+    chunks = []
+    for batch in iter_batches(records, chunk_size):
+        present = set().union(*batch)
+        chunk = pd.DataFrame(batch, columns=[name for name in columns if name in present] if columns is not None else None)
+        chunk, _ = coerce_frame(chunk, CACHE_SCHEMAS[kind], PUBLISH_TIME_FORMAT)
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=columns or [])
+    return concat_frames(chunks, kind)
+
+# 拼接多个 records_frame / TypedDecoder 的结果；各块的类别不同时拼接结果为字符串列，重新编码
+def concat_frames(frames, kind):
+    frames = [df for df in frames if len(df.columns)]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    for name, column_kind in CACHE_SCHEMAS[kind].items():
+        if column_kind == 'category' and name in df.columns and not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype('category')
+    return df
+
+# DataFrame 转回记录（写出 JSONL 用）：时间按 PUBLISH_TIME_FORMAT 格式化，缺失值不写出
+def frame_records(df, chunk_size=50000):
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        columns = []
+        for name in chunk.columns:
+            column = chunk[name]
+            if pd.api.types.is_datetime64_any_dtype(column):
+                column = column.dt.strftime(PUBLISH_TIME_FORMAT)
+            columns.append(column.astype(object).where(column.notna(), None).tolist())
+        for row in zip(*columns):
+            yield {name: value for name, value in zip(chunk.columns, row) if value is not None}
+
+# analyze_data 的输入：只保留 ANALYSIS_COLUMNS 中的列
+def analysis_frame(data, kind):
+    columns = ANALYSIS_COLUMNS[kind]
+    if isinstance(data, pd.DataFrame):
+        return data[[name for name in columns if name in data.columns]].copy()
+    return records_frame(data, kind, columns)
+
+# unique_contents / unique_comments 可以是记录列表，也可以是 records_frame 的结果
+def save_processed_cache(unique_contents, unique_comments):
+    from columnar_cache import save_frame
+    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for kind, records in [('contents', unique_contents), ('comments', unique_comments)]:
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        save_frame(df, CACHE_PATHS[kind], CACHE_SCHEMAS[kind], PUBLISH_TIME_FORMAT)
+
+# columns 为 None 时只读取 analyze_data 用到的列
+def load_processed_cache(columns=None):
+    from columnar_cache import load_frame
+    
+    columns = ANALYSIS_COLUMNS if columns is None else columns
+    return (load_frame(CACHE_PATHS['contents'], columns.get('contents')),
+            load_frame(CACHE_PATHS['comments'], columns.get('comments')))
+
+# 4.0.4 评论情感：全部评论在特征自动机上扫描一遍（见 scan_features），
+# 按命中的情感关键词给每条评论定级，规则与帖子的增强版情感相同
+# 返回 (情感等级和得分, 评论 × 游戏 的命中矩阵)
+def score_comment_sentiment(df_comments, chunk_size=200000):
+    if 'content' in df_comments.columns:
+        texts = df_comments['content'].fillna('').astype(str).tolist()
+    else:
+        texts = [''] * len(df_comments)
+    masks, comment_games = scan_features(texts, chunk_size=chunk_size)
+    
+    sentiment_level = pd.Categorical(_sentiment_levels(masks), categories=SENTIMENT_LEVELS)
+    level_scores = np.array([SENTIMENT_SCORES[level] for level in SENTIMENT_LEVELS], dtype=np.int8)
+    scores = pd.DataFrame({
+        'sentiment_level': sentiment_level,
+        'sentiment_score': level_scores[sentiment_level.codes],
+    }, index=df_comments.index)
+    return scores, comment_games
+
+# 按 keys 分组的情感分布：各等级的评论数、评论总数、平均情感得分（按评论数降序）
+def sentiment_distribution(keys, level_codes, scores):
+    codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+    valid = codes >= 0
+    codes = codes[valid]
+    counts = np.bincount(codes * len(SENTIMENT_LEVELS) + level_codes[valid],
+                         minlength=len(uniques) * len(SENTIMENT_LEVELS)).reshape(-1, len(SENTIMENT_LEVELS))
+    distribution = pd.DataFrame(counts, index=pd.Index(uniques), columns=SENTIMENT_LEVELS)
+    distribution['count'] = counts.sum(axis=1)
+    distribution['mean_score'] = np.bincount(codes, weights=scores[valid], minlength=len(uniques)) / distribution['count']
+    return distribution.sort_values('count', ascending=False, kind='stable')
+
+# 由 {(键, 情感等级): 评论数} 得到与 sentiment_distribution 相同结构的表（分批聚合时使用）
+def sentiment_table(level_counts):
+    positions = {}
+    for (key, level), count in level_counts.items():
+        if count > 0:
+            positions.setdefault(key, len(positions))
+    counts = np.zeros((len(positions), len(SENTIMENT_LEVELS)), dtype=np.int64)
+    for (key, level), count in level_counts.items():
+        if count > 0:
+            counts[positions[key], SENTIMENT_LEVELS.index(level)] = count
+    level_scores = np.array([SENTIMENT_SCORES[level] for level in SENTIMENT_LEVELS], dtype=float)
+    distribution = pd.DataFrame(counts, index=pd.Index(list(positions)), columns=SENTIMENT_LEVELS)
+    distribution['count'] = counts.sum(axis=1)
+    distribution['mean_score'] = counts @ level_scores / distribution['count']
+    return distribution.sort_values('count', ascending=False, kind='stable')
+
+# 评论情感按帖子、贴吧、游戏聚合；评论归属的游戏为评论中提到的游戏（comment_games）和所在帖子提到的游戏
+# （game_matrix，帖子的游戏命中矩阵）
+def aggregate_comment_sentiment(df_comments, scores, comment_games, df_contents=None, game_matrix=None):
+    level_codes = scores['sentiment_level'].cat.codes.to_numpy().astype(np.int64)
+    score_values = scores['sentiment_score'].to_numpy(dtype=float)
+    result = {}
+    
+    if 'note_id' in df_comments.columns:
+        result['by_note'] = sentiment_distribution(df_comments['note_id'], level_codes, score_values)
+    if 'tieba_name' in df_comments.columns:
+        result['by_tieba'] = sentiment_distribution(df_comments['tieba_name'], level_codes, score_values)
+    
+    rows, codes = comment_games.pairs()
+    game_pairs = [pd.DataFrame({'row': rows, 'game': codes})]
+    if game_matrix is not None and 'note_id' in df_comments.columns and 'note_id' in df_contents.columns:
+        post_rows, post_codes = game_matrix.pairs()
+        post_games = pd.DataFrame({'note_id': df_contents['note_id'].to_numpy()[post_rows], 'game': post_codes})
+        comment_posts = pd.DataFrame({'row': np.arange(len(df_comments)), 'note_id': df_comments['note_id'].to_numpy()})
+        game_pairs.append(comment_posts.merge(post_games, on='note_id')[['row', 'game']])
+    game_pairs = pd.concat(game_pairs, ignore_index=True).drop_duplicates()
+    rows = game_pairs['row'].to_numpy(dtype=np.int64)
+    games = np.asarray(COMMON_GAMES, dtype=object)[game_pairs['game'].to_numpy(dtype=np.int64)]
+    result['by_game'] = sentiment_distribution(games, level_codes[rows], score_values[rows])
+    return result
+
+# 4.0.5 评论回复树：按 parent_comment_id 一次性还原全部楼中楼回复树
+def build_comment_threads(df_comments):
+    from comment_threads import CommentThreads
+    
+    def column(name):
+        return df_comments[name] if name in df_comments.columns else None
+    
+    parent_ids = column('parent_comment_id')
+    if parent_ids is None:
+        parent_ids = pd.Series(pd.NA, index=df_comments.index)
+    return CommentThreads.build(df_comments['comment_id'], parent_ids, df_comments['note_id'],
+                                column('publish_time'), column('sub_comment_count'))
+
+# 4.0.7 用户：(贴吧, 用户昵称) 和 (游戏, 用户昵称) 对，不去重；按所在贴吧和提到的游戏（game_matrix，
+# 帖子为 extract_features、评论为 score_comment_sentiment 得到的游戏命中矩阵）
+def user_pairs(df, game_matrix=None):
+    columns = ['key', 'user']
+    tieba_pairs = pd.DataFrame(columns=columns)
+    game_pairs = pd.DataFrame(columns=columns)
+    if 'user_nickname' not in df.columns:
+        return tieba_pairs, game_pairs
+    
+    users = df['user_nickname'].to_numpy(dtype=object)
+    if 'tieba_name' in df.columns:
+        tieba_pairs = pd.DataFrame({'key': df['tieba_name'].to_numpy(dtype=object), 'user': users})
+    if game_matrix is not None:
+        rows, codes = game_matrix.pairs()
+        game_pairs = pd.DataFrame({'key': np.asarray(game_matrix.labels, dtype=object)[codes], 'user': users[rows]})
+    return [pairs.dropna().loc[lambda pairs: pairs['user'] != ''].reset_index(drop=True)
+            for pairs in (tieba_pairs, game_pairs)]
+
+# 4.0.6 时间 × 维度汇总立方体：发布时间只解析一次，按日/月/小时/星期/游戏类型的统计都从立方体汇总
+def add_posts_to_cube(cube, df_contents, features, sign=1):
+    def column(name):
+        return df_contents[name] if name in df_contents.columns else pd.Series(np.nan, index=df_contents.index)
+    
+    cube.add(column('publish_time'), column('total_replay_num'),
+             {'game_type': features['game_type'].astype(object), 'tieba_name': column('tieba_name'),
+              'ip_location': column('ip_location')}, sign, datetime_format=PUBLISH_TIME_FORMAT)
+
+def build_rollup_cube(df_contents, features):
+    from rollup_cube import RollupCube
+    
+    cube = RollupCube()
+    add_posts_to_cube(cube, df_contents, features)
+    return cube
+
+# 时间趋势类的分析结果（analyze_data 和增量分析共用）
+def cube_results(cube):
+    results = {}
+    daily = cube.rollup(['date'])['count']
+    results['daily_posts'] = pd.Series(daily.to_numpy(), index=pd.Index(pd.DatetimeIndex(daily.index).date, name='publish_time'),
+                                       name='count', dtype='int64')
+    monthly = cube.rollup(['month', 'game_type'])['count']
+    if not monthly.empty:
+        results['monthly_type_counts'] = monthly.unstack(fill_value=0)
+    
+    def means(dimensions):
+        grouped = cube.rollup(dimensions)
+        return grouped.loc[grouped['reply_count'] > 0, 'mean']
+    
+    results['avg_replies_by_hour'] = means(['hour']).to_dict()
+    results['avg_replies_by_day'] = {DAY_NAMES[day]: mean for day, mean in means(['dayofweek']).items()}
+    results['avg_replies_by_type'] = means(['game_type']).to_dict()
+    return results
+
+# contents / comments 可以是记录列表，也可以是已经加载好的 DataFrame（如列式缓存）
 def analyze_data(contents, comments):
     analysis_results = {}
     
-    # 转换为DataFrame便于分析
-    df_contents = pd.DataFrame(contents)
-    df_comments = pd.DataFrame(comments)
+    # 转换为紧凑的DataFrame便于分析（只保留分析用到的列）
+    df_contents = analysis_frame(contents, 'contents')
+    df_comments = analysis_frame(comments, 'comments')
     
     print("=== 数据基本信息 ===")
     print(f"总帖子数: {len(df_contents)}")
     print(f"总评论数: {len(df_comments)}")
     
+    sections = metrics.sections('analyze')
+    
+    # 一次性提取帖子特征，建立帖子⇄评论关联表
+    sections.next('4.0 特征提取', len(df_contents))
+    features, game_matrix = extract_features(df_contents)
+    post_join = build_post_comment_join(df_contents, df_comments)
+    analysis_results['post_comment_join'] = post_join
+    
     # 4.1 游戏热度分析（按贴吧）
+    sections.next('4.1 游戏热度分析', len(df_contents))
     print("\n=== 游戏热度分析（按贴吧） ===")
     tieba_counts = df_contents['tieba_name'].value_counts().head(10)
     analysis_results['tieba_counts'] = tieba_counts
     print(tieba_counts)
     
     # 4.2 热门游戏分析（从标题和描述中提取游戏名称）
+    sections.next('4.2 热门游戏分析', len(df_contents))
     print("\n=== 热门游戏分析 ===")
     
-    # 平台相关关键词（用于分类）
-    platform_keywords = {
-        '主机': ['ps5', 'xbox', 'switch', '主机', 'playstation', 'ps4', 'ps3', 'xbox series', 'xbox one'],
-        '手游': ['手机', '手游', '移动端', '安卓', 'ios', 'app', '手游推荐', '手机游戏']
-    }
-    
-    # 创建游戏分类列表（去重）
-    game_categories = {
-        '主机游戏': list(set(['塞尔达', '赛博朋克2077', '巫师3', '刺客信条', '荒野大镖客2',
-                   'gta5', '原神', '最终幻想', '战神', '地平线', '漫威蜘蛛侠',
-                   '塞尔达传说', '马里奥', '宝可梦', '暗黑破坏神', '星际争霸', '红警'])),
-        '手游': list(set(['王者荣耀', '和平精英', 'lol', 'csgo', 'pubg', '原神', '三国杀',
-               '饥荒', '我的世界', '泰拉瑞亚', 'among us', '糖豆人', 'apex', 'valorant',
-               '吃鸡']))
-    }
-    
-    # 合并所有游戏
-    common_games = list(set(game_categories['主机游戏'] + game_categories['手游']))
-    
     # 统计各游戏出现次数
     game_counts = Counter()
     host_game_counts = Counter()
     mobile_game_counts = Counter()
-    platform_only_host = 0  # 仅通过平台关键词判断为主机的内容数
-    platform_only_mobile = 0  # 仅通过平台关键词判断为手游的内容数
-    
-    for index, row in df_contents.iterrows():
-        text = f"{row.get('title', '')} {row.get('desc', '')} {row.get('tieba_name', '')}"
-        game_detected = False
-        platform_detected = False
-        
-        # 1. 检测明确的游戏名称
-        for game in common_games:
-            if game in text:
-                game_counts[game] += 1
-                game_detected = True
-                # 根据分类更新对应计数器
-                if game in game_categories['主机游戏']:
-                    host_game_counts[game] += 1
-                if game in game_categories['手游']:
-                    mobile_game_counts[game] += 1
-        
-        # 2. 如果没有检测到明确的游戏名称，基于平台关键词分类
-        if not game_detected:
-            # 检测主机平台关键词
-            if any(platform in text.lower() for platform in platform_keywords['主机']):
-                platform_only_host += 1
-                # 可以增加一个通用的主机游戏计数器
-                host_game_counts['[主机平台内容]'] += 1
-                platform_detected = True
-            
-            # 检测手游平台关键词
-            if any(platform in text.lower() for platform in platform_keywords['手游']):
-                platform_only_mobile += 1
-                # 可以增加一个通用的手游计数器
-                mobile_game_counts['[手游平台内容]'] += 1
-                platform_detected = True
+    host_games = set(GAME_CATEGORIES['主机游戏'])
+    mobile_games = set(GAME_CATEGORIES['手游'])
+    
+    # 1. 明确的游戏名称（从游戏命中矩阵按游戏计数）
+    for game, count in game_matrix.label_counts().items():
+        game_counts[game] += count
+        # 根据分类更新对应计数器
+        if game in host_games:
+            host_game_counts[game] += count
+        if game in mobile_games:
+            mobile_game_counts[game] += count
+    
+    # 2. 没有检测到明确游戏名称的内容，基于平台关键词分类
+    no_game = game_matrix.row_counts() == 0
+    platform_only_host = int((no_game & features['is_host'].to_numpy()).sum())  # 仅通过平台关键词判断为主机的内容数
+    platform_only_mobile = int((no_game & features['is_mobile'].to_numpy()).sum())  # 仅通过平台关键词判断为手游的内容数
+    if platform_only_host:
+        host_game_counts['[主机平台内容]'] += platform_only_host
+    if platform_only_mobile:
+        mobile_game_counts['[手游平台内容]'] += platform_only_mobile
     
     print(f"\n平台分类补充信息:")
     print(f"仅通过主机平台关键词判断的内容数: {platform_only_host}")
@@ -224,6 +1075,7 @@ def analyze_data(contents, comments):
         analysis_results['cross_platform_games'] = []
     
     # 4.3 帖子回复数分析
+    sections.next('4.3 帖子回复数分析', len(df_contents))
     print("\n=== 帖子回复数分析 ===")
     if 'total_replay_num' in df_contents.columns:
         # 检测并处理回复数异常值
@@ -261,57 +1113,41 @@ def analyze_data(contents, comments):
         print(f"有效数据占比: {len(filtered_replies)/len(replies)*100:.2f}%")
     
     # 4.4 发布时间分析与游戏类型关系
+    sections.next('4.4 发布时间分析', len(df_contents))
     print("\n=== 发布时间分析 ===")
+    # 按 日期 × 小时 × 游戏类型 × 贴吧 × IP属地 汇总一次，4.4、4.9、4.10 都从立方体读取
+    cube = build_rollup_cube(df_contents, features)
+    analysis_results['rollup_cube'] = cube
+    time_results = cube_results(cube)
     if 'publish_time' in df_contents.columns:
-        # 转换发布时间为datetime
-        df_contents['publish_time'] = pd.to_datetime(df_contents['publish_time'], errors='coerce')
         # 按日期统计帖子数量
-        daily_posts = df_contents['publish_time'].dt.date.value_counts().sort_index()
+        daily_posts = time_results['daily_posts']
         analysis_results['daily_posts'] = daily_posts
         print(daily_posts)
         
         # 4.4.1 按游戏类型分析时间趋势
         print("\n=== 游戏类型时间趋势分析 ===")
         
-        # 为每个帖子分类游戏类型
-        def classify_game_type(text):
-            text_lower = text.lower()
-            is_host = any(platform in text_lower for platform in platform_keywords['主机'])
-            is_mobile = any(platform in text_lower for platform in platform_keywords['手游'])
-            
-            if is_host and is_mobile:
-                return '双平台'
-            elif is_host:
-                return '主机'
-            elif is_mobile:
-                return '手游'
-            else:
-                return '其他'
-        
-        # 添加游戏类型列
-        df_contents['game_type'] = df_contents.apply(lambda row: classify_game_type(f"{row.get('title', '')} {row.get('desc', '')} {row.get('tieba_name', '')}"), axis=1)
-        analysis_results['game_type_distribution'] = df_contents['game_type'].value_counts().to_dict()
+        game_types = features['game_type'].astype(object).value_counts()
+        analysis_results['game_type_distribution'] = game_types.to_dict()
         
         print("游戏类型分布:")
-        print(df_contents['game_type'].value_counts())
-        
-        # 分析不同游戏类型的时间趋势
-        df_time_type = df_contents[['publish_time', 'game_type']].copy()
-        df_time_type = df_time_type.dropna()
+        print(game_types)
         
-        if not df_time_type.empty:
-            # 按月统计不同游戏类型的帖子数量
-            df_time_type['month'] = df_time_type['publish_time'].dt.to_period('M')
-            monthly_type_counts = df_time_type.groupby(['month', 'game_type']).size().unstack(fill_value=0)
+        # 按月统计不同游戏类型的帖子数量
+        if 'monthly_type_counts' in time_results:
+            monthly_type_counts = time_results['monthly_type_counts']
             analysis_results['monthly_type_counts'] = monthly_type_counts
             print("\n不同游戏类型的月度分布:")
             print(monthly_type_counts)
     
     # 4.5 评论与帖子关系分析
+    sections.next('4.5 评论与帖子关系分析', len(df_comments))
     print("\n=== 评论与帖子关系分析 ===")
     if not df_comments.empty:
         # 计算每个帖子的评论数
-        comments_per_post = df_comments['note_id'].value_counts()
+        comment_counts = post_join['comment_count']
+        comments_per_post = comment_counts[comment_counts > 0].sort_values(ascending=False, kind='stable')
         analysis_results['comments_per_post'] = comments_per_post.to_dict()
         
         print(f"评论覆盖的帖子数: {len(comments_per_post)}")
@@ -320,15 +1156,13 @@ def analyze_data(contents, comments):
         top_commented_posts = comments_per_post.head(5)
         for note_id, count in top_commented_posts.items():
             # 查找对应的帖子标题
-            post_title = df_contents[df_contents['note_id'] == note_id]['title'].values[0] if len(df_contents[df_contents['note_id'] == note_id]) > 0 else '未知标题'
+            post_title = lookup_post_title(post_join, note_id)
             print(f"{post_title[:20]}...: {count}条评论")
         
         # 4.5.1 分析评论数与回复数的关系
         if 'total_replay_num' in df_contents.columns:
-            # 合并评论数和回复数
-            df_comments_merge = pd.DataFrame({'note_id': comments_per_post.index, 'comment_count': comments_per_post.values})
-            df_combined = pd.merge(df_contents, df_comments_merge, on='note_id', how='left')
-            df_combined['comment_count'] = df_combined['comment_count'].fillna(0)
+            # 关联表中已合并评论数和回复数，只取有帖子的行
+            df_combined = post_join[post_join['row'] >= 0]
             
             # 计算相关性
             if len(df_combined) > 1:
@@ -337,30 +1171,13 @@ def analyze_data(contents, comments):
                 analysis_results['reply_comment_correlation'] = correlation
     
     # 4.6 好评率分析（简单版：根据关键词判断正面评价）
+    sections.next('4.6 好评率分析', len(df_contents))
     print("\n=== 好评率分析 ===")
-    positive_keywords = ['好玩', '不错', '喜欢', '推荐', '好评', '优秀', '神作', '给力', '良心', '精彩']
-    negative_keywords = ['垃圾', '不好玩', '失望', '差评', '坑', '骗钱', '垃圾', '卸载', '后悔', '无聊']
-    
-    positive_count = 0
-    negative_count = 0
-    neutral_count = 0
-    total_count = 0
-    
-    for index, row in df_contents.iterrows():
-        text = f"{row.get('title', '')} {row.get('desc', '')}"
-        has_positive = any(keyword in text for keyword in positive_keywords)
-        has_negative = any(keyword in text for keyword in negative_keywords)
-        
-        total_count += 1
-        if has_positive and not has_negative:
-            positive_count += 1
-        elif has_negative and not has_positive:
-            negative_count += 1
-        elif has_positive and has_negative:
-            # 同时包含正面和负面关键词，计入中性
-            neutral_count += 1
-        else:
-            neutral_count += 1
+    sentiment_value_counts = features['sentiment'].value_counts()
+    positive_count = int(sentiment_value_counts['好评'])
+    negative_count = int(sentiment_value_counts['差评'])
+    neutral_count = int(sentiment_value_counts['中性'])
+    total_count = len(features)
     
     if total_count > 0:
         positive_rate = (positive_count / total_count) * 100
@@ -378,10 +1195,11 @@ def analyze_data(contents, comments):
         print(f"中性数: {neutral_count}, 中性率: {neutral_rate:.2f}%")
     
     # 4.7 帖子长度与回复数相关性分析
+    sections.next('4.7 帖子长度与回复数相关性分析', len(df_contents))
     print("\n=== 帖子长度与回复数相关性分析 ===")
     if 'total_replay_num' in df_contents.columns:
         # 计算帖子总长度（标题+描述字符数）
-        df_contents['post_length'] = df_contents.apply(lambda row: len(str(row.get('title', ''))) + len(str(row.get('desc', ''))), axis=1)
+        df_contents['post_length'] = features['post_length']
         
         # 只分析有回复的帖子
         df_with_replies = df_contents[df_contents['total_replay_num'] > 0]
@@ -393,9 +1211,7 @@ def analyze_data(contents, comments):
             analysis_results['length_reply_correlation'] = correlation
             
             # 分析不同长度区间的平均回复数
-            bins = [0, 50, 100, 200, 300, 500, float('inf')]
-            labels = ['0-50字', '51-100字', '101-200字', '201-300字', '301-500字', '500字以上']
-            df_with_replies['length_range'] = pd.cut(df_with_replies['post_length'], bins=bins, labels=labels, right=False)
+            df_with_replies['length_range'] = pd.cut(df_with_replies['post_length'], bins=LENGTH_BINS, labels=LENGTH_LABELS, right=False)
             
             avg_replies_by_length = df_with_replies.groupby('length_range')['total_replay_num'].mean()
             print(f"\n不同长度区间的平均回复数:")
@@ -403,24 +1219,9 @@ def analyze_data(contents, comments):
             analysis_results['avg_replies_by_length'] = avg_replies_by_length.to_dict()
     
     # 4.8 热门游戏讨论关键词提取
+    sections.next('4.8 热门游戏讨论关键词提取', len(df_contents))
     print("\n=== 热门游戏讨论关键词分析 ===")
-    import jieba
-    
-    # 合并所有帖子标题和描述
-    all_text = ' '.join(df_contents.apply(lambda row: f"{row.get('title', '')} {row.get('desc', '')}", axis=1))
-    
-    # 分词
-    words = jieba.cut(all_text)
-    
-    # 过滤停用词和非中文词汇
-    stopwords = ['的', '了', '是', '在', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这', '们', '来', '给', '之', '得', '以']
-    filtered_words = []
-    for word in words:
-        if len(word) > 1 and word not in stopwords and all('\u4e00' <= char <= '\u9fff' for char in word):
-            filtered_words.append(word)
-    
-    # 统计词频
-    word_counts = Counter(filtered_words)
+    word_counts = extract_keywords(features['text'], _cache_keys(df_contents, 'note_id', 'note'))
     top_words = word_counts.most_common(20)
     print("\n热门游戏讨论关键词TOP20：")
     for word, count in top_words:
@@ -428,72 +1229,48 @@ def analyze_data(contents, comments):
     
     analysis_results['top_game_keywords'] = top_words
     
+    # 4.8.1 评论关键词
+    sections.next('4.8.1 评论关键词', len(df_comments))
+    if not df_comments.empty:
+        top_comment_words = extract_comment_keywords(df_comments).most_common(20)
+        print("\n评论关键词TOP20：")
+        for word, count in top_comment_words:
+            print(f"{word}: {count}次")
+        analysis_results['top_comment_keywords'] = top_comment_words
+    
     # 4.9 发布时间与回复数量关系分析
+    sections.next('4.9 发布时间与回复数量关系分析', len(df_contents))
     print("\n=== 发布时间与回复数量关系分析 ===")
     if 'total_replay_num' in df_contents.columns and 'publish_time' in df_contents.columns:
-        # 按小时和星期几分析
-        df_time_replies = df_contents[['publish_time', 'total_replay_num']].dropna()
-        df_time_replies['publish_hour'] = df_time_replies['publish_time'].dt.hour
-        df_time_replies['publish_dayofweek'] = df_time_replies['publish_time'].dt.dayofweek
-        
         # 按小时统计平均回复数
-        avg_replies_by_hour = df_time_replies.groupby('publish_hour')['total_replay_num'].mean()
+        avg_replies_by_hour = time_results['avg_replies_by_hour']
         print("\n不同发布小时的平均回复数：")
-        print(avg_replies_by_hour.round(2))
+        print(pd.Series(avg_replies_by_hour, dtype=float).round(2))
         
         # 按星期几统计平均回复数
-        avg_replies_by_day = df_time_replies.groupby('publish_dayofweek')['total_replay_num'].mean()
-        day_names = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
-        avg_replies_by_day.index = day_names
+        avg_replies_by_day = time_results['avg_replies_by_day']
         print("\n不同星期几的平均回复数：")
-        print(avg_replies_by_day.round(2))
+        print(pd.Series(avg_replies_by_day, dtype=float).round(2))
         
-        analysis_results['avg_replies_by_hour'] = avg_replies_by_hour.to_dict()
-        analysis_results['avg_replies_by_day'] = avg_replies_by_day.to_dict()
+        analysis_results['avg_replies_by_hour'] = avg_replies_by_hour
+        analysis_results['avg_replies_by_day'] = avg_replies_by_day
     
     # 4.10 游戏类型与回复数关系分析
+    sections.next('4.10 游戏类型与回复数关系分析', len(df_contents))
     print("\n=== 游戏类型与回复数关系分析 ===")
-    if 'total_replay_num' in df_contents.columns and 'game_type' in df_contents.columns:
-        avg_replies_by_type = df_contents.groupby('game_type')['total_replay_num'].mean()
+    if 'total_replay_num' in df_contents.columns:
+        avg_replies_by_type = time_results['avg_replies_by_type']
         print("\n不同游戏类型的平均回复数：")
-        print(avg_replies_by_type.round(2))
+        print(pd.Series(avg_replies_by_type, dtype=float).round(2))
         
-        analysis_results['avg_replies_by_type'] = avg_replies_by_type.to_dict()
+        analysis_results['avg_replies_by_type'] = avg_replies_by_type
     
     # 4.11 增强版情感分析
+    sections.next('4.11 增强版情感分析', len(df_contents))
     print("\n=== 增强版游戏评价情感分析 ===")
-    # 细化情感关键词
-    sentiment_keywords = {
-        '非常正面': ['神作', '惊艳', '完美', '极致', '必玩', '经典', '史诗', '震撼', '爽到', '无敌'],
-        '正面': ['好玩', '不错', '喜欢', '推荐', '优秀', '给力', '良心', '精彩', '流畅', '满意'],
-        '中性': ['一般', '普通', '还行', '中规中矩', '过得去', '没感觉'],
-        '负面': ['失望', '差评', '垃圾', '坑', '骗钱', '卡顿', '闪退', '无聊', '后悔', '卸载'],
-        '非常负面': ['垃圾中的垃圾', '完全失望', '骗钱游戏', '根本没法玩', '史上最差', '烂作']
-    }
-    
-    # 计算情感分布
-    sentiment_counts = Counter()
-    total_sentiment = 0
-    
-    for index, row in df_contents.iterrows():
-        text = f"{row.get('title', '')} {row.get('desc', '')}"
-        sentiment = '中性'
-        
-        # 检查非常负面
-        if any(neg in text for neg in sentiment_keywords['非常负面']):
-            sentiment = '非常负面'
-        # 检查非常正面
-        elif any(pos in text for pos in sentiment_keywords['非常正面']):
-            sentiment = '非常正面'
-        # 检查负面
-        elif any(neg in text for neg in sentiment_keywords['负面']):
-            sentiment = '负面'
-        # 检查正面
-        elif any(pos in text for pos in sentiment_keywords['正面']):
-            sentiment = '正面'
-        
-        sentiment_counts[sentiment] += 1
-        total_sentiment += 1
+    # 计算情感分布（按首次出现顺序计数）
+    sentiment_counts = Counter(features['sentiment_level'])
+    total_sentiment = len(features)
     
     print("\n游戏评价情感倾向分布：")
     for sentiment, count in sentiment_counts.items():
@@ -502,407 +1279,1534 @@ def analyze_data(contents, comments):
     
     analysis_results['sentiment_distribution'] = sentiment_counts
     
+    # 4.12 评论情感分析（按帖子、贴吧、游戏聚合）
+    sections.next('4.12 评论情感分析', len(df_comments))
+    if len(df_comments) > 0:
+        print("\n=== 评论情感分析 ===")
+        comment_scores, comment_games = score_comment_sentiment(df_comments)
+        comment_sentiment = aggregate_comment_sentiment(df_comments, comment_scores, comment_games, df_contents, game_matrix)
+        comment_sentiment['distribution'] = comment_scores['sentiment_level'].value_counts().reindex(SENTIMENT_LEVELS).to_dict()
+        
+        print("评论情感倾向分布：")
+        for level, count in comment_sentiment['distribution'].items():
+            print(f"{level}: {count}条 ({count / len(df_comments) * 100:.2f}%)")
+        print(f"评论平均情感得分: {comment_scores['sentiment_score'].mean():.3f}")
+        print("\n评论最多的游戏的评论情感分布：")
+        print(comment_sentiment['by_game'].head(10).round(3))
+        print("\n评论最多的贴吧的评论情感分布：")
+        print(comment_sentiment.get('by_tieba', pd.DataFrame()).head(10).round(3))
+        analysis_results['comment_sentiment'] = comment_sentiment
+    
+    # 4.13 评论回复树分析（楼中楼的深度、宽度、回复延迟，回复最多的评论）
+    sections.next('4.13 评论回复树分析', len(df_comments))
+    if len(df_comments) > 0 and 'comment_id' in df_comments.columns and 'note_id' in df_comments.columns:
+        print("\n=== 评论回复树分析 ===")
+        threads = build_comment_threads(df_comments)
+        thread_table = threads.thread_table()
+        latency = threads.reply_latency() / 60
+        
+        print(f"楼层数: {len(thread_table)}，楼中楼回复数: {len(threads) - len(thread_table)}，"
+              f"找不到父评论的回复数: {threads.orphans}")
+        print(f"最大回复深度: {threads.max_depth()}，单个楼层最多评论数: {thread_table['size'].max()}，"
+              f"单层最多回复数: {thread_table['breadth'].max()}")
+        if len(latency):
+            print(f"回复延迟中位数: {np.median(latency):.1f}分钟，90%分位数: {np.percentile(latency, 90):.1f}分钟")
+        
+        top_replied = threads.top_replied()
+        print("\n回复最多的评论：")
+        print(top_replied.sort_values('reply_count', ascending=False, kind='stable').head(10))
+        analysis_results['comment_threads'] = threads
+        analysis_results['thread_stats'] = {
+            'threads': len(thread_table),
+            'replies': len(threads) - len(thread_table),
+            'orphans': threads.orphans,
+            'max_depth': threads.max_depth(),
+            'max_thread_size': thread_table['size'].max(),
+            'max_breadth': thread_table['breadth'].max(),
+            'median_latency_minutes': np.median(latency) if len(latency) else None,
+            'p90_latency_minutes': np.percentile(latency, 90) if len(latency) else None,
+        }
+        analysis_results['thread_depth_distribution'] = thread_table['depth'].value_counts().sort_index()
+        analysis_results['top_replied_comments'] = top_replied
+    
+    # 4.14 用户数统计：热门贴吧（发帖数TOP10）和热门游戏（提及次数TOP10）的发帖和评论用户数（按昵称去重）
+    sections.next('4.14 用户数统计', len(df_contents) + len(df_comments))
+    print("\n=== 用户数统计 ===")
+    post_tieba_pairs, post_game_pairs = user_pairs(df_contents, game_matrix)
+    comment_tieba_pairs, comment_game_pairs = user_pairs(df_comments, comment_games if len(df_comments) > 0 else None)
+    tieba_users = pd.concat([post_tieba_pairs, comment_tieba_pairs]).drop_duplicates()['key'].value_counts()
+    game_users = pd.concat([post_game_pairs, comment_game_pairs]).drop_duplicates()['key'].value_counts()
+    analysis_results['distinct_users_by_tieba'] = {tieba: int(tieba_users.get(tieba, 0)) for tieba in tieba_counts.index}
+    analysis_results['distinct_users_by_game'] = {game: int(game_users.get(game, 0)) for game, count in top_games}
+    print(f"热门贴吧的用户数: {analysis_results['distinct_users_by_tieba']}")
+    print(f"热门游戏的用户数: {analysis_results['distinct_users_by_game']}")
+    sections.close()
+    
     return analysis_results, df_contents, df_comments
 
 # 5. 生成可视化报告
-def generate_visualizations(analysis_results, df_contents):
-    # 创建可视化目录
-    vis_dir = 'c:\\Users\\23120\\Desktop\\贴吧\\visualizations'
-    if not os.path.exists(vis_dir):
-        os.makedirs(vis_dir)
-    
-    # 5.1 热门贴吧柱状图
+# 每张图表是一个独立的绘图任务：chart_inputs 从分析结果中取出各图表用到的数据，
+# 绘图函数只依赖这些数据，可以在子进程中用 Agg 后端并行绘制；
+# 数据的哈希记录在可视化目录中，数据未变化且图片已存在的图表直接跳过
+CHART_HASH_FILE = '.chart_hashes.json'
+CHART_VERSION = 2  # 修改绘图代码后递增，使已有图片全部重新绘制
+# 逐点绘制的图表（5.9）点数超过此值时改为按格子绘制密度图，绘制时间只与格子数有关
+DENSITY_THRESHOLD = 50000
+DENSITY_BINS = (200, 100)  # 密度图的格子数（帖子长度 × 回复数）
+
+# 5.1 热门贴吧柱状图
+def plot_hot_tieba(tieba_counts, path):
     plt.figure(figsize=(12, 6))
-    if 'tieba_counts' in analysis_results:
-        analysis_results['tieba_counts'].plot(kind='bar')
-        plt.title('热门游戏贴吧TOP10')
-        plt.xlabel('贴吧名称')
-        plt.ylabel('帖子数量')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/hot_tieba.png')
-        plt.close()
-    
-    # 5.2 热门游戏柱状图
+    tieba_counts.plot(kind='bar')
+    plt.title('热门游戏贴吧TOP10')
+    plt.xlabel('贴吧名称')
+    plt.ylabel('帖子数量')
+    plt.xticks(rotation=45, ha='right')
+    plt.tight_layout()
+    plt.savefig(path)
+
+# 5.2 热门游戏柱状图
+def plot_hot_games(game_counts, path):
     plt.figure(figsize=(12, 6))
-    if 'game_counts' in analysis_results:
-        games, counts = zip(*analysis_results['game_counts'])
-        plt.bar(games, counts, color='skyblue')
-        plt.title('热门游戏TOP10', fontsize=16)
-        plt.xlabel('游戏名称', fontsize=12)
-        plt.ylabel('提及次数', fontsize=12)
-        plt.xticks(rotation=45, ha='right', fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/hot_games.png', dpi=300)
-        plt.close()
-    
-    # 5.2.1 主机游戏热度柱状图
+    games, counts = zip(*game_counts)
+    plt.bar(games, counts, color='skyblue')
+    plt.title('热门游戏TOP10', fontsize=16)
+    plt.xlabel('游戏名称', fontsize=12)
+    plt.ylabel('提及次数', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.2.1 主机游戏热度柱状图
+def plot_hot_host_games(host_game_counts, path):
     plt.figure(figsize=(12, 6))
-    if 'host_game_counts' in analysis_results and analysis_results['host_game_counts']:
-        # 过滤掉[主机平台内容]项
-        filtered_host = [(game, count) for game, count in analysis_results['host_game_counts'] if game != '[主机平台内容]']
-        if filtered_host:
-            host_games, host_counts = zip(*filtered_host)
-            plt.bar(host_games, host_counts, color='#4CAF50')
-            plt.title('主机游戏热度TOP10', fontsize=16)
-            plt.xlabel('游戏名称', fontsize=12)
-            plt.ylabel('提及次数', fontsize=12)
-            plt.xticks(rotation=45, ha='right', fontsize=10)
-            plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/hot_host_games.png', dpi=300)
-    plt.close()
-    
-    # 5.2.2 手游热度柱状图
+    host_games, host_counts = zip(*host_game_counts)
+    plt.bar(host_games, host_counts, color='#4CAF50')
+    plt.title('主机游戏热度TOP10', fontsize=16)
+    plt.xlabel('游戏名称', fontsize=12)
+    plt.ylabel('提及次数', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.2.2 手游热度柱状图
+def plot_hot_mobile_games(mobile_game_counts, path):
     plt.figure(figsize=(12, 6))
-    if 'mobile_game_counts' in analysis_results and analysis_results['mobile_game_counts']:
-        # 过滤掉[手游平台内容]项
-        filtered_mobile = [(game, count) for game, count in analysis_results['mobile_game_counts'] if game != '[手游平台内容]']
-        if filtered_mobile:
-            mobile_games, mobile_counts = zip(*filtered_mobile)
-            plt.bar(mobile_games, mobile_counts, color='#2196F3')
-            plt.title('手游热度TOP10', fontsize=16)
-            plt.xlabel('游戏名称', fontsize=12)
-            plt.ylabel('提及次数', fontsize=12)
-            plt.xticks(rotation=45, ha='right', fontsize=10)
-            plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/hot_mobile_games.png', dpi=300)
-    plt.close()
-    
-    # 5.3 发布时间趋势图
+    mobile_games, mobile_counts = zip(*mobile_game_counts)
+    plt.bar(mobile_games, mobile_counts, color='#2196F3')
+    plt.title('手游热度TOP10', fontsize=16)
+    plt.xlabel('游戏名称', fontsize=12)
+    plt.ylabel('提及次数', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.3 发布时间趋势图
+def plot_post_trend(filtered_daily_posts, path):
     plt.figure(figsize=(14, 8))
-    if 'daily_posts' in analysis_results:
-        daily_posts = analysis_results['daily_posts']
-        
-        # 创建临时DataFrame并将索引转换为DatetimeIndex
-        temp_df = pd.DataFrame({'count': daily_posts})
-        temp_df.index = pd.to_datetime(temp_df.index)
-        
-        # 过滤2025-2026年的数据
-        mask = (temp_df.index >= '2025-01-01') & (temp_df.index <= '2026-12-31')
-        filtered_daily_posts = temp_df[mask]
-        
-        if not filtered_daily_posts.empty:
-            # 创建折线图
-            ax = filtered_daily_posts['count'].plot(kind='line', marker='o', linewidth=2, markersize=6)
-            
-            plt.title('帖子发布时间趋势 (2025-2026)', fontsize=16)
-            plt.xlabel('日期', fontsize=12)
-            plt.ylabel('帖子数量', fontsize=12)
-            
-            # 优化日期显示
-            plt.xticks(rotation=45, ha='right', fontsize=10)
-            
-            # 添加更密集的网格线
-            plt.grid(True, alpha=0.3, linestyle='--')
-            
-            # 标注数据集中的时间段
-            plt.axvspan('2025-11-13', '2025-11-17', alpha=0.2, color='yellow', label='2025年11月中旬集中期')
-            plt.axvspan('2025-12-23', '2025-12-25', alpha=0.2, color='red', label='2025年12月下旬集中期')
-            
-            # 添加图例
-            plt.legend()
-            
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/post_trend.png', dpi=300)
-        plt.close()
-        
-        # 生成月份聚合的柱状图
-        plt.figure(figsize=(12, 6))
-        if not filtered_daily_posts.empty:
-            # 按月聚合
-            monthly_posts = filtered_daily_posts.resample('ME').sum()
-            monthly_posts.plot(kind='bar', color='skyblue', use_index=True)
-            plt.title('帖子发布月份分布 (2025-2026)', fontsize=16)
-            plt.xlabel('月份', fontsize=12)
-            plt.ylabel('帖子数量', fontsize=12)
-            plt.xticks(rotation=45, ha='right', fontsize=10)
-            plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/monthly_distribution.png', dpi=300)
-        plt.close()
-    
-    # 5.4 好评率饼图
+    # 创建折线图
+    ax = filtered_daily_posts['count'].plot(kind='line', marker='o', linewidth=2, markersize=6)
+    
+    plt.title('帖子发布时间趋势 (2025-2026)', fontsize=16)
+    plt.xlabel('日期', fontsize=12)
+    plt.ylabel('帖子数量', fontsize=12)
+    
+    # 优化日期显示
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    
+    # 添加更密集的网格线
+    plt.grid(True, alpha=0.3, linestyle='--')
+    
+    # 标注数据集中的时间段
+    plt.axvspan('2025-11-13', '2025-11-17', alpha=0.2, color='yellow', label='2025年11月中旬集中期')
+    plt.axvspan('2025-12-23', '2025-12-25', alpha=0.2, color='red', label='2025年12月下旬集中期')
+    
+    # 添加图例
+    plt.legend()
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.3.1 月份聚合的柱状图
+def plot_monthly_distribution(filtered_daily_posts, path):
+    plt.figure(figsize=(12, 6))
+    # 按月聚合
+    monthly_posts = filtered_daily_posts.resample('ME').sum()
+    monthly_posts.plot(kind='bar', color='skyblue', use_index=True)
+    plt.title('帖子发布月份分布 (2025-2026)', fontsize=16)
+    plt.xlabel('月份', fontsize=12)
+    plt.ylabel('帖子数量', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.4 好评率饼图
+def plot_sentiment_pie(sentiment, path):
     plt.figure(figsize=(8, 8))
-    if 'sentiment_stats' in analysis_results:
-        sentiment = analysis_results['sentiment_stats']
-        labels = ['好评', '差评', '中性']
-        sizes = [sentiment['positive_rate'], sentiment['negative_rate'], sentiment['neutral_rate']]
-        colors = ['#4CAF50', '#F44336', '#9E9E9E']
-        plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-        plt.title('游戏评价分布')
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/sentiment_pie.png')
-        plt.close()
-    
-    # 5.5 回复数分布直方图
+    labels = ['好评', '差评', '中性']
+    sizes = [sentiment['positive_rate'], sentiment['negative_rate'], sentiment['neutral_rate']]
+    colors = ['#4CAF50', '#F44336', '#9E9E9E']
+    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
+    plt.title('游戏评价分布')
+    plt.axis('equal')
+    plt.tight_layout()
+    plt.savefig(path)
+
+# 5.5 回复数分布直方图（只包含有回复的帖子）
+# 输入为 chart_inputs 中分好箱的计数和箱边界，与直接对每个帖子调用 plt.hist 的图相同
+def plot_replies_distribution(counts, edges, path):
     plt.figure(figsize=(12, 6))
-    if 'total_replay_num' in df_contents.columns:
-        # 过滤掉回复数为0的帖子，只显示有回复的
-        filtered_replies = df_contents[df_contents['total_replay_num'] > 0]['total_replay_num']
-        plt.hist(filtered_replies, bins=20, edgecolor='black')
-        plt.title('帖子回复数分布')
-        plt.xlabel('回复数')
-        plt.ylabel('帖子数量')
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/replies_distribution.png')
-        plt.close()
-    
-    # 5.6 双平台游戏分析图
+    plt.hist(edges[:-1], bins=edges, weights=counts, edgecolor='black')
+    plt.title('帖子回复数分布')
+    plt.xlabel('回复数')
+    plt.ylabel('帖子数量')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+
+# 5.6 双平台游戏分析图
+def plot_cross_platform_games(cross_games, host_counts, mobile_counts, path):
     plt.figure(figsize=(12, 6))
-    if 'cross_platform_games' in analysis_results and analysis_results['cross_platform_games']:
-        cross_games = analysis_results['cross_platform_games']
-        
-        # 从分析结果中获取主机和手游游戏计数
-        host_game_dict = dict(analysis_results['host_game_counts'])
-        mobile_game_dict = dict(analysis_results['mobile_game_counts'])
-        
-        host_counts = [host_game_dict[game] for game in cross_games]
-        mobile_counts = [mobile_game_dict[game] for game in cross_games]
-        
-        x = range(len(cross_games))
-        width = 0.35
-        
-        plt.bar([i - width/2 for i in x], host_counts, width, label='主机平台', color='#4CAF50')
-        plt.bar([i + width/2 for i in x], mobile_counts, width, label='手游平台', color='#2196F3')
-        
-        plt.title('双平台游戏热度对比', fontsize=16)
-        plt.xlabel('游戏名称', fontsize=12)
-        plt.ylabel('提及次数', fontsize=12)
-        plt.xticks(x, cross_games, rotation=45, ha='right', fontsize=10)
-        plt.legend()
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/cross_platform_games.png', dpi=300)
-        plt.close()
-    
-    # 5.7 游戏类型时间趋势图
+    x = range(len(cross_games))
+    width = 0.35
+    
+    plt.bar([i - width/2 for i in x], host_counts, width, label='主机平台', color='#4CAF50')
+    plt.bar([i + width/2 for i in x], mobile_counts, width, label='手游平台', color='#2196F3')
+    
+    plt.title('双平台游戏热度对比', fontsize=16)
+    plt.xlabel('游戏名称', fontsize=12)
+    plt.ylabel('提及次数', fontsize=12)
+    plt.xticks(x, cross_games, rotation=45, ha='right', fontsize=10)
+    plt.legend()
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.7 游戏类型时间趋势图
+def plot_game_type_trend(monthly_counts, path):
     plt.figure(figsize=(14, 8))
-    if 'monthly_type_counts' in analysis_results and not analysis_results['monthly_type_counts'].empty:
-        monthly_counts = analysis_results['monthly_type_counts']
-        monthly_counts.plot(kind='line', marker='o', linewidth=2, markersize=6)
-        
-        plt.title('不同游戏类型的月度分布趋势', fontsize=16)
-        plt.xlabel('月份', fontsize=12)
-        plt.ylabel('帖子数量', fontsize=12)
-        plt.xticks(rotation=45, ha='right', fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--')
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/game_type_trend.png', dpi=300)
-        plt.close()
-    
-    # 5.8 游戏类型分布饼图
+    monthly_counts.plot(kind='line', marker='o', linewidth=2, markersize=6)
+    
+    plt.title('不同游戏类型的月度分布趋势', fontsize=16)
+    plt.xlabel('月份', fontsize=12)
+    plt.ylabel('帖子数量', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.8 游戏类型分布饼图
+def plot_game_type_distribution(game_type_distribution, path):
     plt.figure(figsize=(8, 8))
-    if 'game_type_distribution' in analysis_results:
-        game_types = pd.Series(analysis_results['game_type_distribution'])
-        game_types.plot(kind='pie', autopct='%1.1f%%', startangle=90)
-        plt.title('游戏类型分布', fontsize=16)
-        plt.axis('equal')
-        plt.legend(title='游戏类型')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/game_type_distribution.png', dpi=300)
-        plt.close()
-    
-    # 5.9 帖子长度与回复数关系图
+    game_types = pd.Series(game_type_distribution)
+    game_types.plot(kind='pie', autopct='%1.1f%%', startangle=90)
+    plt.title('游戏类型分布', fontsize=16)
+    plt.axis('equal')
+    plt.legend(title='游戏类型')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.9 帖子长度与回复数关系图（只包含有回复的帖子）
+# grid 为 (计数, 长度边界, 回复数边界) 时（帖子数超过 DENSITY_THRESHOLD，见 chart_inputs）绘制二维直方图，
+# 颜色为每格的帖子数（对数刻度，空格子不着色），否则逐点绘制散点图
+def plot_length_reply_scatter(post_length, replies, grid, path):
     plt.figure(figsize=(12, 6))
-    if 'post_length' in df_contents.columns:
-        # 只分析有回复的帖子
-        df_with_replies = df_contents[df_contents['total_replay_num'] > 0]
-        if len(df_with_replies) > 0:
-            plt.scatter(df_with_replies['post_length'], df_with_replies['total_replay_num'], alpha=0.5)
-            plt.title('帖子长度与回复数关系', fontsize=16)
-            plt.xlabel('帖子长度（字符数）', fontsize=12)
-            plt.ylabel('回复数', fontsize=12)
-            plt.grid(True, alpha=0.3, linestyle='--')
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/length_reply_scatter.png', dpi=300)
-            plt.close()
-    
-    # 5.10 不同长度区间平均回复数图
+    if grid is None:
+        plt.scatter(post_length, replies, alpha=0.5)
+    else:
+        counts, x_edges, y_edges = grid
+        mesh = plt.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap='viridis',
+                              norm='log', rasterized=True)
+        plt.colorbar(mesh, label='帖子数量')
+    plt.title('帖子长度与回复数关系', fontsize=16)
+    plt.xlabel('帖子长度（字符数）', fontsize=12)
+    plt.ylabel('回复数', fontsize=12)
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.10 不同长度区间平均回复数图
+def plot_avg_replies_by_length(avg_replies_by_length, path):
     plt.figure(figsize=(12, 6))
-    if 'avg_replies_by_length' in analysis_results:
-        avg_replies = pd.Series(analysis_results['avg_replies_by_length'])
-        avg_replies.plot(kind='bar', color='skyblue', edgecolor='black')
-        plt.title('不同帖子长度区间的平均回复数', fontsize=16)
-        plt.xlabel('帖子长度区间', fontsize=12)
-        plt.ylabel('平均回复数', fontsize=12)
-        plt.xticks(rotation=45, ha='right', fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        
-        # 添加数据标签
-        for i, v in enumerate(avg_replies):
-            plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
-        
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/avg_replies_by_length.png', dpi=300)
-        plt.close()
-    
-    # 5.11 评论最多的帖子TOP10
+    avg_replies = pd.Series(avg_replies_by_length)
+    avg_replies.plot(kind='bar', color='skyblue', edgecolor='black')
+    plt.title('不同帖子长度区间的平均回复数', fontsize=16)
+    plt.xlabel('帖子长度区间', fontsize=12)
+    plt.ylabel('平均回复数', fontsize=12)
+    plt.xticks(rotation=45, ha='right', fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    
+    # 添加数据标签
+    for i, v in enumerate(avg_replies):
+        plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.11 评论最多的帖子TOP10（titles 为与 top_commented 对应的帖子标题）
+def plot_top_commented_posts(top_commented, titles, path):
     plt.figure(figsize=(12, 8))
-    if 'comments_per_post' in analysis_results:
-        comments_dict = analysis_results['comments_per_post']
-        if comments_dict:
-            # 转换为Series并排序
-            comments_series = pd.Series(comments_dict)
-            top_commented = comments_series.head(10).sort_values(ascending=True)
-            
-            top_commented.plot(kind='barh', color='purple', edgecolor='black')
-            plt.title('评论最多的帖子TOP10', fontsize=16)
-            plt.xlabel('评论数量', fontsize=12)
-            plt.ylabel('帖子标题', fontsize=12)
-            plt.grid(True, alpha=0.3, linestyle='--', axis='x')
-            
-            # 获取帖子标题
-            yticks = []
-            for note_id in top_commented.index:
-                post_title = df_contents[df_contents['note_id'] == note_id]['title'].values[0] if len(df_contents[df_contents['note_id'] == note_id]) > 0 else '未知标题'
-                yticks.append(post_title[:25] + '...')
-            
-            plt.yticks(range(len(yticks)), yticks, fontsize=10)
-            
-            # 添加数据标签
-            for i, v in enumerate(top_commented):
-                plt.text(v + 0.5, i, str(v), va='center', fontsize=10)
-            
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/top_commented_posts.png', dpi=300)
-            plt.close()
+    top_commented.plot(kind='barh', color='purple', edgecolor='black')
+    plt.title('评论最多的帖子TOP10', fontsize=16)
+    plt.xlabel('评论数量', fontsize=12)
+    plt.ylabel('帖子标题', fontsize=12)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='x')
+    
+    yticks = [post_title[:25] + '...' for post_title in titles]
+    plt.yticks(range(len(yticks)), yticks, fontsize=10)
+    
+    # 添加数据标签
+    for i, v in enumerate(top_commented):
+        plt.text(v + 0.5, i, str(v), va='center', fontsize=10)
     
-    # 5.12 热门游戏讨论关键词TOP20
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.12 热门游戏讨论关键词TOP20
+def plot_top_game_keywords(top_game_keywords, path):
     plt.figure(figsize=(14, 8))
-    if 'top_game_keywords' in analysis_results:
-        words, counts = zip(*analysis_results['top_game_keywords'])
-        plt.barh(words, counts, color='skyblue', edgecolor='black')
-        plt.title('热门游戏讨论关键词TOP20', fontsize=16)
-        plt.xlabel('提及次数', fontsize=12)
-        plt.ylabel('关键词', fontsize=12)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='x')
-        
-        # 调整字体大小和间距
-        plt.yticks(fontsize=10)
-        plt.xlim(0, max(counts) * 1.1)
-        
-        # 添加数据标签
-        for i, v in enumerate(counts):
-            plt.text(v + 0.5, i, str(v), va='center', fontsize=10)
-        
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/top_game_keywords.png', dpi=300)
-        plt.close()
-    
-    # 5.13 发布时间与回复数量关系
-    # 按小时
+    words, counts = zip(*top_game_keywords)
+    plt.barh(words, counts, color='skyblue', edgecolor='black')
+    plt.title('热门游戏讨论关键词TOP20', fontsize=16)
+    plt.xlabel('提及次数', fontsize=12)
+    plt.ylabel('关键词', fontsize=12)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='x')
+    
+    # 调整字体大小和间距
+    plt.yticks(fontsize=10)
+    plt.xlim(0, max(counts) * 1.1)
+    
+    # 添加数据标签
+    for i, v in enumerate(counts):
+        plt.text(v + 0.5, i, str(v), va='center', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.13 发布时间与回复数量关系：按小时
+def plot_avg_replies_by_hour(avg_replies_by_hour, path):
     plt.figure(figsize=(12, 6))
-    if 'avg_replies_by_hour' in analysis_results:
-        avg_replies = pd.Series(analysis_results['avg_replies_by_hour'])
-        avg_replies.plot(kind='bar', color='orange', edgecolor='black')
-        plt.title('不同发布小时的平均回复数', fontsize=16)
-        plt.xlabel('发布小时', fontsize=12)
-        plt.ylabel('平均回复数', fontsize=12)
-        plt.xticks(fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/avg_replies_by_hour.png', dpi=300)
-        plt.close()
-    
-    # 按星期几
+    avg_replies = pd.Series(avg_replies_by_hour)
+    avg_replies.plot(kind='bar', color='orange', edgecolor='black')
+    plt.title('不同发布小时的平均回复数', fontsize=16)
+    plt.xlabel('发布小时', fontsize=12)
+    plt.ylabel('平均回复数', fontsize=12)
+    plt.xticks(fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.13.1 发布时间与回复数量关系：按星期几
+def plot_avg_replies_by_day(avg_replies_by_day, path):
     plt.figure(figsize=(12, 6))
-    if 'avg_replies_by_day' in analysis_results:
-        avg_replies = pd.Series(analysis_results['avg_replies_by_day'])
-        avg_replies.plot(kind='bar', color='green', edgecolor='black')
-        plt.title('不同星期几的平均回复数', fontsize=16)
-        plt.xlabel('星期几', fontsize=12)
-        plt.ylabel('平均回复数', fontsize=12)
-        plt.xticks(fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        
-        # 添加数据标签
-        for i, v in enumerate(avg_replies):
-            plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
-        
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/avg_replies_by_day.png', dpi=300)
-        plt.close()
-    
-    # 5.14 不同游戏类型的平均回复数
+    avg_replies = pd.Series(avg_replies_by_day)
+    avg_replies.plot(kind='bar', color='green', edgecolor='black')
+    plt.title('不同星期几的平均回复数', fontsize=16)
+    plt.xlabel('星期几', fontsize=12)
+    plt.ylabel('平均回复数', fontsize=12)
+    plt.xticks(fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    
+    # 添加数据标签
+    for i, v in enumerate(avg_replies):
+        plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.14 不同游戏类型的平均回复数
+def plot_avg_replies_by_type(avg_replies_by_type, path):
     plt.figure(figsize=(12, 6))
-    if 'avg_replies_by_type' in analysis_results:
-        avg_replies = pd.Series(analysis_results['avg_replies_by_type'])
-        avg_replies.plot(kind='bar', color=['blue', 'red', 'green', 'purple'], edgecolor='black')
-        plt.title('不同游戏类型的平均回复数', fontsize=16)
-        plt.xlabel('游戏类型', fontsize=12)
-        plt.ylabel('平均回复数', fontsize=12)
-        plt.xticks(fontsize=10)
-        plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-        
-        # 添加数据标签
-        for i, v in enumerate(avg_replies):
-            plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
-        
-        plt.tight_layout()
-        plt.savefig(f'{vis_dir}/avg_replies_by_type.png', dpi=300)
-        plt.close()
-    
-    # 5.15 增强版情感分析分布
+    avg_replies = pd.Series(avg_replies_by_type)
+    avg_replies.plot(kind='bar', color=['blue', 'red', 'green', 'purple'], edgecolor='black')
+    plt.title('不同游戏类型的平均回复数', fontsize=16)
+    plt.xlabel('游戏类型', fontsize=12)
+    plt.ylabel('平均回复数', fontsize=12)
+    plt.xticks(fontsize=10)
+    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
+    
+    # 添加数据标签
+    for i, v in enumerate(avg_replies):
+        plt.text(i, v + 0.5, f'{v:.1f}', ha='center', va='bottom', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
+
+# 5.15 增强版情感分析分布
+def plot_enhanced_sentiment_pie(sentiment, path):
     plt.figure(figsize=(8, 8))
-    if 'sentiment_distribution' in analysis_results:
-        sentiment = analysis_results['sentiment_distribution']
-        if sentiment:
-            labels = list(sentiment.keys())
-            sizes = list(sentiment.values())
-            colors = ['#4CAF50', '#8BC34A', '#FFC107', '#FF5722', '#F44336']
-            plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-            plt.title('游戏评价情感倾向分布（增强版）', fontsize=16)
-            plt.axis('equal')
-            plt.legend(title='情感倾向')
-            plt.tight_layout()
-            plt.savefig(f'{vis_dir}/enhanced_sentiment_pie.png', dpi=300)
-            plt.close()
-    
-    print(f"\n可视化报告已生成，保存在 {vis_dir} 目录中")
+    labels = list(sentiment.keys())
+    sizes = list(sentiment.values())
+    colors = ['#4CAF50', '#8BC34A', '#FFC107', '#FF5722', '#F44336']
+    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
+    plt.title('游戏评价情感倾向分布（增强版）', fontsize=16)
+    plt.axis('equal')
+    plt.legend(title='情感倾向')
+    plt.tight_layout()
+    plt.savefig(path, dpi=300)
 
-# 主函数
-def main():
-    print("正在加载数据...")
-    contents, comments = load_all_data()
+# 图表名称 -> 绘图函数，图片保存为 <名称>.png
+CHARTS = {
+    'hot_tieba': plot_hot_tieba,
+    'hot_games': plot_hot_games,
+    'hot_host_games': plot_hot_host_games,
+    'hot_mobile_games': plot_hot_mobile_games,
+    'post_trend': plot_post_trend,
+    'monthly_distribution': plot_monthly_distribution,
+    'sentiment_pie': plot_sentiment_pie,
+    'replies_distribution': plot_replies_distribution,
+    'cross_platform_games': plot_cross_platform_games,
+    'game_type_trend': plot_game_type_trend,
+    'game_type_distribution': plot_game_type_distribution,
+    'length_reply_scatter': plot_length_reply_scatter,
+    'avg_replies_by_length': plot_avg_replies_by_length,
+    'top_commented_posts': plot_top_commented_posts,
+    'top_game_keywords': plot_top_game_keywords,
+    'avg_replies_by_hour': plot_avg_replies_by_hour,
+    'avg_replies_by_day': plot_avg_replies_by_day,
+    'avg_replies_by_type': plot_avg_replies_by_type,
+    'enhanced_sentiment_pie': plot_enhanced_sentiment_pie,
+}
+
+# 各图表的绘图参数（不含保存路径）；缺少数据的图表不出现在结果中
+def chart_inputs(analysis_results, df_contents):
+    inputs = {}
     
-    print(f"原始数据：{len(contents)}个帖子，{len(comments)}条评论")
+    if 'tieba_counts' in analysis_results:
+        inputs['hot_tieba'] = (analysis_results['tieba_counts'],)
     
-    print("\n正在筛选游戏相关内容...")
-    filtered_contents = filter_game_related(contents)
-    filtered_comments = filter_game_related(comments)
+    if analysis_results.get('game_counts'):
+        inputs['hot_games'] = (analysis_results['game_counts'],)
     
-    print(f"筛选后：{len(filtered_contents)}个帖子，{len(filtered_comments)}条评论")
+    # 过滤掉[主机平台内容]和[手游平台内容]项
+    filtered_host = [(game, count) for game, count in analysis_results.get('host_game_counts') or [] if game != '[主机平台内容]']
+    if filtered_host:
+        inputs['hot_host_games'] = (filtered_host,)
+    filtered_mobile = [(game, count) for game, count in analysis_results.get('mobile_game_counts') or [] if game != '[手游平台内容]']
+    if filtered_mobile:
+        inputs['hot_mobile_games'] = (filtered_mobile,)
     
-    print("\n正在去重...")
-    unique_contents = remove_duplicates(filtered_contents)
-    unique_comments = remove_duplicates(filtered_comments)
+    if 'daily_posts' in analysis_results:
+        # 创建临时DataFrame并将索引转换为DatetimeIndex，只保留2025-2026年的数据
+        temp_df = pd.DataFrame({'count': analysis_results['daily_posts']})
+        temp_df.index = pd.to_datetime(temp_df.index)
+        mask = (temp_df.index >= '2025-01-01') & (temp_df.index <= '2026-12-31')
+        filtered_daily_posts = temp_df[mask]
+        if not filtered_daily_posts.empty:
+            inputs['post_trend'] = (filtered_daily_posts,)
+            inputs['monthly_distribution'] = (filtered_daily_posts,)
     
-    print(f"去重后：{len(unique_contents)}个帖子，{len(unique_comments)}条评论")
+    if 'sentiment_stats' in analysis_results:
+        inputs['sentiment_pie'] = (analysis_results['sentiment_stats'],)
     
-    print("\n正在分析数据...")
-    analysis_results, df_contents, df_comments = analyze_data(unique_contents, unique_comments)
+    if 'reply_points' in analysis_results:
+        # 增量 / 分块分析：聚合状态中按 (帖子长度, 回复数) 计数的有回复的帖子
+        reply_chart_inputs(inputs, *analysis_results['reply_points'])
+    elif 'total_replay_num' in df_contents.columns:
+        df_with_replies = df_contents[df_contents['total_replay_num'] > 0]
+        post_length = df_with_replies['post_length'].to_numpy() if 'post_length' in df_contents.columns else None
+        reply_chart_inputs(inputs, post_length, df_with_replies['total_replay_num'].to_numpy())
     
-    print("\n正在生成可视化报告...")
-    generate_visualizations(analysis_results, df_contents)
+    if analysis_results.get('cross_platform_games'):
+        cross_games = sorted(analysis_results['cross_platform_games'])  # 集合转换来的列表，排序后哈希才稳定
+        # 从分析结果中获取主机和手游游戏计数
+        host_game_dict = dict(analysis_results['host_game_counts'])
+        mobile_game_dict = dict(analysis_results['mobile_game_counts'])
+        inputs['cross_platform_games'] = (list(cross_games),
+                                          [host_game_dict[game] for game in cross_games],
+                                          [mobile_game_dict[game] for game in cross_games])
+    
+    if 'monthly_type_counts' in analysis_results and not analysis_results['monthly_type_counts'].empty:
+        inputs['game_type_trend'] = (analysis_results['monthly_type_counts'],)
+    
+    for name in ['game_type_distribution', 'avg_replies_by_length', 'avg_replies_by_hour',
+                 'avg_replies_by_day', 'avg_replies_by_type']:
+        if name in analysis_results:
+            inputs[name] = (analysis_results[name],)
+    
+    if analysis_results.get('comments_per_post'):
+        # 转换为Series并排序，标题在主进程中从帖子-评论关联表查出
+        comments_series = pd.Series(analysis_results['comments_per_post'])
+        top_commented = comments_series.head(10).sort_values(ascending=True)
+        post_join = analysis_results['post_comment_join']
+        titles = [lookup_post_title(post_join, note_id) for note_id in top_commented.index]
+        inputs['top_commented_posts'] = (top_commented, titles)
+    
+    if analysis_results.get('top_game_keywords'):
+        inputs['top_game_keywords'] = (analysis_results['top_game_keywords'],)
+    
+    if analysis_results.get('sentiment_distribution'):
+        inputs['enhanced_sentiment_pie'] = (analysis_results['sentiment_distribution'],)
+    
+    return inputs
+
+# 5.5 / 5.9 的绘图参数（有回复的帖子），weights 为每个 (帖子长度, 回复数) 的帖子数（None 时每点一个帖子）
+# 只保存分箱结果，绘图和图表哈希的开销与帖子数无关；post_length 为 None 时不绘制 5.9
+def reply_chart_inputs(inputs, post_length, replies, weights=None):
+    counts, edges = np.histogram(replies, bins=20, weights=weights)
+    inputs['replies_distribution'] = (counts.astype(np.int64), edges)
+    if post_length is None or len(post_length) == 0:
+        return
+    total = len(post_length) if weights is None else int(weights.sum())
+    if total > DENSITY_THRESHOLD:
+        counts, x_edges, y_edges = np.histogram2d(post_length, replies, bins=DENSITY_BINS, weights=weights)
+        inputs['length_reply_scatter'] = (None, None, (counts.astype(np.int64), x_edges, y_edges))
+    elif weights is None:
+        inputs['length_reply_scatter'] = (post_length, replies, None)
+    else:
+        inputs['length_reply_scatter'] = (np.repeat(post_length, weights), np.repeat(replies, weights), None)
+
+def chart_digest(name, args):
+    payload = pickle.dumps((CHART_VERSION, name, args), protocol=4)
+    return hashlib.sha256(payload).hexdigest()
+
+# 绘图进程只保存图片，不需要图形界面
+def _init_plot_worker():
+    plt.switch_backend('Agg')
+
+# 返回图表名称和绘制该图表的耗时、内存（在子进程中测量）
+def _render_chart(name, args, path):
+    with measure_work({}) as values:
+        try:
+            CHARTS[name](*args, path)
+        finally:
+            plt.close('all')
+    return name, values
+
+# inputs 为 chart_inputs 的结果；charts 只绘制指定名称的图表；force 为 True 时忽略哈希记录全部重新绘制
+def render_charts(inputs, charts=None, workers=None, force=False):
+    # 创建可视化目录
+    vis_dir = VIS_DIR
+    if not os.path.exists(vis_dir):
+        os.makedirs(vis_dir)
     
-    # 保存处理后的数据
-    output_dir = 'c:\\Users\\23120\\Desktop\\贴吧\\processed_data'
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if charts is not None:
+        unknown = [name for name in charts if name not in CHARTS]
+        if unknown:
+            raise ValueError(f"未知的图表名称: {', '.join(unknown)}")
+        inputs = {name: args for name, args in inputs.items() if name in charts}
+    
+    hash_path = os.path.join(vis_dir, CHART_HASH_FILE)
+    chart_hashes = {}
+    if os.path.exists(hash_path):
+        with open(hash_path, 'r', encoding='utf-8') as f:
+            chart_hashes = json.load(f)
+    
+    tasks = []
+    skipped = 0
+    for name, args in inputs.items():
+        digest = chart_digest(name, args)
+        path = os.path.join(vis_dir, f'{name}.png')
+        if not force and chart_hashes.get(name) == digest and os.path.exists(path):
+            skipped += 1
+            continue
+        tasks.append((name, args, path, digest))
+    
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1 or len(tasks) <= 1:
+        _init_plot_worker()
+        rendered = [_render_chart(name, args, path) for name, args, path, _ in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_plot_worker) as pool:
+            rendered = list(pool.map(_render_chart, *zip(*[(name, args, path) for name, args, path, _ in tasks])))
     
-    with open(f'{output_dir}/filtered_contents.json', 'w', encoding='utf-8') as f:
-        json.dump(unique_contents, f, ensure_ascii=False, indent=2)
+    for name, values in rendered:
+        metrics.add(f'plot/{name}', records_out=1, **values)
+    for name, _, _, digest in tasks:
+        chart_hashes[name] = digest
+    _atomic_write(hash_path, lambda f: json.dump(chart_hashes, f, ensure_ascii=False, indent=2), 'w', encoding='utf-8')
     
-    with open(f'{output_dir}/filtered_comments.json', 'w', encoding='utf-8') as f:
-        json.dump(unique_comments, f, ensure_ascii=False, indent=2)
+    print(f"绘制图表 {len(rendered)} 张，数据未变化跳过 {skipped} 张")
+    print(f"\n可视化报告已生成，保存在 {vis_dir} 目录中")
+
+def generate_visualizations(analysis_results, df_contents, charts=None, workers=None, force=False):
+    render_charts(chart_inputs(analysis_results, df_contents), charts, workers, force)
+
+# 6. 增量分析
+# 保留 digits 位有效数字（近似模式下 reply_points 的键数不随帖子数增长）
+def _round_significant(values, digits=2):
+    scale = 10.0 ** np.maximum(np.floor(np.log10(np.maximum(values, 1))) - (digits - 1), 0)
+    return (np.round(values / scale) * scale).astype(np.int64)
+
+# 各分析环节的可合并中间结果：新数据的部分结果直接合并进已保存的状态
+# 回复数的四分位数由 QuantileSketch 估计（回复数小于4096时与全量计算一致）
+# approximate=True 时（分块分析的近似模式）内存固定：数量随数据增长的计数换成草图（见 aggregates.py），
+#   贴吧、帖子评论数、关键词的TOP-N用 FrequentItems，各贴吧评论的情感等级用 CountMinSketch，
+#   用户数用 HyperLogLog（只为 FrequentItems 中保留的贴吧保存）；不保存每个帖子的信息，
+#   因此没有帖子回复数与评论数的相关性，评论只按正文中提到的游戏归类；草图不能撤销数据，不能用于增量分析
+# 游戏、游戏类型、情感等的计数只有固定的少量键，两种模式下都是精确值
+# incremental=True 时（增量分析）另外保存每条评论的帖子、情感等级和正文中提到的游戏：
+#   评论始终按所在帖子当前提到的游戏归类，帖子被重新抓取、提到的游戏变化时随之重新归类
+class AnalysisState:
+    VERSION = 9  # 字段有变化时加一，旧版本的状态需要重新生成
+    
+    def __init__(self, approximate=False, incremental=False):
+        from aggregates import QuantileSketch, RunningMoments, GroupedMean, FrequentItems, CountMinSketch
+        from rollup_cube import RollupCube
+        
+        frequent = (lambda: FrequentItems(SKETCH_CAPACITY)) if approximate else Counter
+        self.version = self.VERSION
+        self.approximate = approximate
+        self.generation = 0  # 增量分析的运行次数，与去重索引中保存的值一致时两者对应同一次运行
+        self.post_count = 0
+        self.comment_count = 0
+        self.tieba_counts = frequent()
+        self.game_counts = Counter()
+        self.host_game_counts = Counter()
+        self.mobile_game_counts = Counter()
+        self.platform_only_host = 0
+        self.platform_only_mobile = 0
+        self.replies = QuantileSketch()
+        self.cube = RollupCube()  # 按日/月/小时/星期/游戏类型的统计
+        self.game_type_counts = Counter()
+        self.comments_per_post = frequent()
+        self.post_info = {}  # note_id -> (回复数, 标题)，用于评论数相关性和帖子标题
+        self.sentiment_counts = Counter()
+        self.sentiment_levels = Counter()
+        self.length_reply = RunningMoments()
+        self.replies_by_length = GroupedMean()
+        # 有回复的帖子按 (帖子长度, 回复数) 计数，用于 5.5 / 5.9 图表；近似模式下两者保留两位有效数字
+        self.reply_points = Counter()
+        self.keyword_counts = frequent()
+        self.comment_keyword_counts = frequent()
+        self.post_games = {}  # note_id -> 帖子提到的游戏，评论按加入时所在帖子提到的游戏归类
+        self.comment_info = {} if incremental else None  # comment_id -> (note_id, 情感等级, 正文中提到的游戏)
+        self.post_comments = {}  # note_id -> 该帖子下的 comment_id（只在 incremental=True 时使用）
+        self.comment_levels = Counter()  # 评论情感等级分布
+        self.comment_tieba_levels = CountMinSketch() if approximate else Counter()  # (贴吧, 情感等级) -> 评论数
+        self.comment_tiebas = frequent()  # 各贴吧的评论数
+        self.comment_game_levels = Counter()  # (游戏, 情感等级) -> 评论数
+        # 用户数：精确模式为 (键, 用户) -> 出现次数，近似模式为 键 -> HyperLogLog
+        self.tieba_users = {} if approximate else Counter()
+        self.game_users = {} if approximate else Counter()
+    
+    # counter 可以是 Counter、FrequentItems 或 CountMinSketch（都接受 {键: 次数}）
+    @staticmethod
+    def _count(counter, values, sign=1):
+        counter.update({key: sign * count for key, count in Counter(values).items()})
+    
+    # 加入一批 (键, 用户) 对（见 user_pairs）
+    def _add_users(self, tieba_pairs, game_pairs, sign=1):
+        from aggregates import HyperLogLog
+        
+        if not self.approximate:
+            self._count(self.tieba_users, zip(tieba_pairs['key'], tieba_pairs['user']), sign)
+            self._count(self.game_users, zip(game_pairs['key'], game_pairs['user']), sign)
+            return
+        if sign < 0:
+            raise ValueError('近似模式不支持撤销数据')
+        for users, pairs, tracked in [(self.tieba_users, tieba_pairs, self.tieba_counts), (self.game_users, game_pairs, None)]:
+            for key, group in pairs.groupby('key', sort=False)['user']:
+                if tracked is None or key in tracked:
+                    users.setdefault(key, HyperLogLog()).add(group)
+        # 被挤出 FrequentItems 的贴吧不再保存用户数
+        for key in [key for key in self.tieba_users if key not in self.tieba_counts]:
+            del self.tieba_users[key]
+    
+    def _distinct_users(self, users, keys):
+        if self.approximate:
+            return {key: users[key].count() if key in users else 0 for key in keys}
+        counts = Counter(key for (key, user), count in users.items() if count > 0)
+        return {key: counts[key] for key in keys}
+    
+    # 加入（sign=-1 时撤销）一批帖子，features / game_matrix 为 extract_features 的结果
+    def add_posts(self, df_contents, features, game_matrix, sign=1):
+        self.post_count += sign * len(df_contents)
+        if 'tieba_name' in df_contents.columns:
+            self._count(self.tieba_counts, df_contents['tieba_name'].dropna(), sign)
+        
+        host_games = set(GAME_CATEGORIES['主机游戏'])
+        mobile_games = set(GAME_CATEGORIES['手游'])
+        for game, count in game_matrix.label_counts().items():
+            self.game_counts[game] += sign * count
+            if game in host_games:
+                self.host_game_counts[game] += sign * count
+            if game in mobile_games:
+                self.mobile_game_counts[game] += sign * count
+        no_game = game_matrix.row_counts() == 0
+        self.platform_only_host += sign * int((no_game & features['is_host'].to_numpy()).sum())
+        self.platform_only_mobile += sign * int((no_game & features['is_mobile'].to_numpy()).sum())
+        
+        self._count(self.game_type_counts, features['game_type'].astype(object), sign)
+        self._count(self.sentiment_counts, features['sentiment'].astype(object), sign)
+        self._count(self.sentiment_levels, features['sentiment_level'].astype(object), sign)
+        self._count(self.keyword_counts, extract_keywords(features['text'], _cache_keys(df_contents, 'note_id', 'note')), sign)
+        
+        if 'total_replay_num' in df_contents.columns:
+            replies = pd.to_numeric(df_contents['total_replay_num'], errors='coerce').astype(float)
+        else:
+            replies = pd.Series(np.nan, index=df_contents.index)
+        self.replies.add(replies.values, sign)
+        
+        titles = df_contents['title'] if 'title' in df_contents.columns else pd.Series('', index=df_contents.index)
+        if 'note_id' in df_contents.columns and not self.approximate:
+            for note_id, reply_count, title, games in zip(df_contents['note_id'], replies, titles, game_matrix.row_labels()):
+                games = tuple(games) if sign > 0 else ()
+                changed = games != self.post_games.get(note_id, ())
+                if changed:
+                    self._recount_comments(note_id, -1)
+                if sign > 0:
+                    self.post_info[note_id] = (reply_count, title)
+                else:
+                    self.post_info.pop(note_id, None)
+                if games:
+                    self.post_games[note_id] = games
+                else:
+                    self.post_games.pop(note_id, None)
+                if changed:
+                    self._recount_comments(note_id, 1)
+        
+        with_replies = (replies > 0).values
+        self.length_reply.add(features['post_length'].values[with_replies], replies.values[with_replies], sign)
+        length_range = pd.cut(features['post_length'][with_replies], bins=LENGTH_BINS, labels=LENGTH_LABELS, right=False)
+        self.replies_by_length.add(length_range.astype(object), replies.values[with_replies], sign)
+        point_lengths = features['post_length'].to_numpy()[with_replies].astype(np.int64)
+        point_replies = replies.to_numpy()[with_replies].astype(np.int64)
+        if self.approximate:
+            point_lengths, point_replies = _round_significant(point_lengths), _round_significant(point_replies)
+        self._count(self.reply_points, zip(point_lengths.tolist(), point_replies.tolist()), sign)
+        add_posts_to_cube(self.cube, df_contents, features, sign)
+        self._add_users(*user_pairs(df_contents, game_matrix), sign)
+    
+    # 评论归入的游戏：正文中提到的游戏和所在帖子提到的游戏
+    def _comment_games(self, note_id, games):
+        return dict.fromkeys([*games, *self.post_games.get(note_id, ())])
+    
+    # 帖子提到的游戏变化前后，撤销（sign=-1）/重新加入该帖子下已有评论的 (游戏, 情感等级) 计数
+    def _recount_comments(self, note_id, sign):
+        if self.comment_info is None:
+            return
+        for comment_id in self.post_comments.get(note_id, ()):
+            _, level, games = self.comment_info[comment_id]
+            for game in self._comment_games(note_id, games):
+                self.comment_game_levels[game, level] += sign
+    
+    # 加入（sign=-1 时撤销）一批评论
+    def add_comments(self, df_comments, sign=1):
+        self.comment_count += sign * len(df_comments)
+        if 'note_id' in df_comments.columns:
+            self._count(self.comments_per_post, df_comments['note_id'].dropna(), sign)
+        self._count(self.comment_keyword_counts, extract_comment_keywords(df_comments), sign)
+        
+        scores, comment_games = score_comment_sentiment(df_comments)
+        levels = scores['sentiment_level'].astype(object).to_numpy()
+        self._count(self.comment_levels, levels, sign)
+        if 'tieba_name' in df_comments.columns:
+            self._count(self.comment_tieba_levels, ((tieba, level) for tieba, level in zip(df_comments['tieba_name'], levels)
+                                                    if not pd.isna(tieba)), sign)
+            self._count(self.comment_tiebas, df_comments['tieba_name'].dropna(), sign)
+        note_ids = df_comments['note_id'] if 'note_id' in df_comments.columns else pd.Series(None, index=df_comments.index)
+        game_levels = []
+        for note_id, level, games in zip(note_ids, levels, comment_games.row_labels()):
+            game_levels.extend((game, level) for game in self._comment_games(note_id, games))
+        self._count(self.comment_game_levels, game_levels, sign)
+        if self.comment_info is not None and 'comment_id' in df_comments.columns:
+            for comment_id, note_id, level, games in zip(df_comments['comment_id'], note_ids, levels,
+                                                         comment_games.row_labels()):
+                if sign > 0:
+                    self.comment_info[comment_id] = (note_id, level, games)
+                    self.post_comments.setdefault(note_id, set()).add(comment_id)
+                elif comment_id in self.comment_info:
+                    note_id = self.comment_info.pop(comment_id)[0]
+                    comments = self.post_comments[note_id]
+                    comments.discard(comment_id)
+                    if not comments:
+                        del self.post_comments[note_id]
+        self._add_users(*user_pairs(df_comments, comment_games), sign)
+    
+    # 合并另一份状态（例如另一批数据或另一个进程的部分结果）
+    def merge(self, other):
+        self.post_count += other.post_count
+        self.comment_count += other.comment_count
+        for name in ['tieba_counts', 'game_counts', 'host_game_counts', 'mobile_game_counts',
+                     'game_type_counts', 'comments_per_post', 'sentiment_counts',
+                     'sentiment_levels', 'keyword_counts', 'comment_keyword_counts',
+                     'comment_levels', 'comment_tieba_levels', 'comment_tiebas', 'comment_game_levels',
+                     'reply_points']:
+            getattr(self, name).update(getattr(other, name))
+        self.platform_only_host += other.platform_only_host
+        self.platform_only_mobile += other.platform_only_mobile
+        self.post_info.update(other.post_info)
+        self.post_games.update(other.post_games)
+        if self.comment_info is not None and other.comment_info is not None:
+            self.comment_info.update(other.comment_info)
+            for note_id, comment_ids in other.post_comments.items():
+                self.post_comments.setdefault(note_id, set()).update(comment_ids)
+        for users, other_users in [(self.tieba_users, other.tieba_users), (self.game_users, other.game_users)]:
+            if not self.approximate:
+                users.update(other_users)
+                continue
+            for key, sketch in other_users.items():
+                if key in users:
+                    users[key].merge(sketch)
+                else:
+                    users[key] = sketch
+        if self.approximate:
+            for key in [key for key in self.tieba_users if key not in self.tieba_counts]:
+                del self.tieba_users[key]
+        for name in ['replies', 'length_reply', 'replies_by_length', 'cube']:
+            getattr(self, name).merge(getattr(other, name))
+        return self
+    
+    # 转换为与 analyze_data 相同结构的分析结果
+    def to_results(self):
+        analysis_results = {}
+        
+        def top(counter, n):
+            return [(key, count) for key, count in counter.most_common() if count > 0][:n]
+        
+        tieba_counts = pd.Series(dict(top(self.tieba_counts, 10)), name='count', dtype='int64')
+        tieba_counts.index.name = 'tieba_name'
+        analysis_results['tieba_counts'] = tieba_counts
+        
+        host_game_counts = +self.host_game_counts
+        mobile_game_counts = +self.mobile_game_counts
+        if self.platform_only_host > 0:
+            host_game_counts['[主机平台内容]'] = self.platform_only_host
+        if self.platform_only_mobile > 0:
+            mobile_game_counts['[手游平台内容]'] = self.platform_only_mobile
+        analysis_results['game_counts'] = top(self.game_counts, 10)
+        analysis_results['host_game_counts'] = host_game_counts.most_common(10)
+        analysis_results['mobile_game_counts'] = mobile_game_counts.most_common(10)
+        analysis_results['cross_platform_games'] = list(
+            (set(host_game_counts) - {'[主机平台内容]'}) & (set(mobile_game_counts) - {'[手游平台内容]'}))
+        
+        if self.replies.count > 0:
+            Q1 = self.replies.quantile(0.25)
+            Q3 = self.replies.quantile(0.75)
+            IQR = Q3 - Q1
+            valid_count, avg_replies, min_replies, max_replies = self.replies.range_stats(Q1 - 1.5 * IQR, Q3 + 1.5 * IQR)
+            analysis_results['replies_stats'] = {
+                'avg': avg_replies,
+                'max': max_replies,
+                'min': min_replies,
+                'outlier_count': self.replies.count - valid_count
+            }
+        
+        time_results = cube_results(self.cube)
+        analysis_results['rollup_cube'] = self.cube
+        analysis_results['daily_posts'] = time_results['daily_posts']
+        analysis_results['game_type_distribution'] = {key: count for key, count in self.game_type_counts.items() if count > 0}
+        if 'monthly_type_counts' in time_results:
+            analysis_results['monthly_type_counts'] = time_results['monthly_type_counts']
+        
+        comments_per_post = dict(top(self.comments_per_post, len(self.comments_per_post)))
+        analysis_results['comments_per_post'] = comments_per_post
+        top_note_ids = list(comments_per_post)[:10]
+        analysis_results['post_comment_join'] = pd.DataFrame(
+            {'title': [self.post_info.get(note_id, (None, None))[1] for note_id in top_note_ids],
+             'comment_count': [comments_per_post[note_id] for note_id in top_note_ids]},
+            index=pd.Index(top_note_ids, name='note_id'))
+        if len(self.post_info) > 1 and not self.approximate:
+            post_ids = list(self.post_info)
+            replies = pd.Series([self.post_info[note_id][0] for note_id in post_ids], dtype=float)
+            comment_counts = pd.Series([self.comments_per_post.get(note_id, 0) for note_id in post_ids], dtype=float)
+            analysis_results['reply_comment_correlation'] = replies.corr(comment_counts)
+        
+        total_count = self.post_count
+        if total_count > 0:
+            analysis_results['sentiment_stats'] = {
+                'positive_rate': self.sentiment_counts['好评'] / total_count * 100,
+                'negative_rate': self.sentiment_counts['差评'] / total_count * 100,
+                'neutral_rate': self.sentiment_counts['中性'] / total_count * 100,
+                'total_count': total_count
+            }
+        
+        if self.length_reply.n > 1:
+            analysis_results['length_reply_correlation'] = self.length_reply.correlation()
+            by_length = self.replies_by_length.means()
+            analysis_results['avg_replies_by_length'] = {label: by_length[label] for label in LENGTH_LABELS if label in by_length}
+        
+        points = [(point, count) for point, count in self.reply_points.items() if count > 0]
+        if points:
+            (lengths, replies), counts = zip(*(point for point, _ in points)), [count for _, count in points]
+            analysis_results['reply_points'] = (np.array(lengths), np.array(replies), np.array(counts))
+        
+        analysis_results['top_game_keywords'] = top(self.keyword_counts, 20)
+        analysis_results['top_comment_keywords'] = top(self.comment_keyword_counts, 20)
+        for name in ['avg_replies_by_hour', 'avg_replies_by_day', 'avg_replies_by_type']:
+            analysis_results[name] = time_results[name]
+        analysis_results['sentiment_distribution'] = +self.sentiment_levels
+        if self.comment_count > 0:
+            if self.approximate:
+                # 评论最多的贴吧由 FrequentItems 选出，各情感等级的评论数由 CountMinSketch 估计
+                tiebas = [tieba for tieba, count in self.comment_tiebas.most_common(10)]
+                keys = [(tieba, level) for tieba in tiebas for level in SENTIMENT_LEVELS]
+                tieba_levels = dict(zip(keys, self.comment_tieba_levels.estimate(keys).tolist()))
+            else:
+                tieba_levels = self.comment_tieba_levels
+            analysis_results['comment_sentiment'] = {
+                'distribution': {level: self.comment_levels[level] for level in SENTIMENT_LEVELS},
+                'by_tieba': sentiment_table(tieba_levels),
+                'by_game': sentiment_table(self.comment_game_levels),
+            }
+        
+        analysis_results['distinct_users_by_tieba'] = self._distinct_users(self.tieba_users, tieba_counts.index)
+        analysis_results['distinct_users_by_game'] = self._distinct_users(
+            self.game_users, [game for game, count in analysis_results['game_counts']])
+        if self.approximate:
+            analysis_results['error_bounds'] = self.error_bounds()
+        return analysis_results
+    
+    # 近似模式下各结果的误差界，键与统计摘要中的名称相同
+    def error_bounds(self):
+        from aggregates import HyperLogLog
+        
+        def frequent(sketch):
+            return {'method': 'misra_gries', 'max_error': sketch.error, 'total': sketch.total}
+        
+        max_error, confidence = self.comment_tieba_levels.error_bound()
+        users = {'method': 'hyperloglog', 'relative_std_error': HyperLogLog().relative_error()}
+        return {
+            'tieba_counts': frequent(self.tieba_counts),
+            'top_commented_posts': frequent(self.comments_per_post),
+            'top_game_keywords': frequent(self.keyword_counts),
+            'top_comment_keywords': frequent(self.comment_keyword_counts),
+            'comment_sentiment_by_tieba': {'method': 'count_min', 'max_error': max_error, 'confidence': confidence},
+            'distinct_users_by_tieba': users,
+            'distinct_users_by_game': users,
+        }
+
+# 文件指纹：大小和修改时间未变时沿用上次的哈希，否则重新计算
+def file_fingerprint(file_path, previous=None):
+    stat = os.stat(file_path)
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+        return previous
+    
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# 先写临时文件再替换，避免中途失败留下损坏的状态
+def _atomic_write(path, write, mode='wb', **kwargs):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode, **kwargs) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def save_manifest(manifest, path):
+    _atomic_write(path, lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2), 'w', encoding='utf-8')
+
+# 状态保存为各聚合结构组成的字典（只引用 collections / aggregates / rollup_cube 中的类），
+# 不保存 AnalysisState 本身：直接运行脚本时它属于 __main__ 模块，从其他入口导入时无法还原
+# 状态文件不存在时返回空状态，版本过旧或无法读取时返回 None（重新生成）
+def load_state(path):
+    if not os.path.exists(path):
+        return AnalysisState(incremental=True)
+    try:
+        with open(path, 'rb') as f:
+            fields = pickle.load(f)
+    except (pickle.UnpicklingError, AttributeError, ImportError, EOFError, ValueError, TypeError) as e:
+        print(f"无法读取增量分析状态 {path}: {e}")
+        return None
+    if not isinstance(fields, dict) or fields.get('version') != AnalysisState.VERSION:
+        return None
+    state = AnalysisState.__new__(AnalysisState)
+    state.__dict__.update(fields)
+    return state
+
+def save_state(state, path):
+    _atomic_write(path, lambda f: pickle.dump(vars(state), f, protocol=pickle.HIGHEST_PROTOCOL))
+
+# 去重索引最后一次提交时记录的运行次数（没有索引时为 0）
+def dedup_generation(dedup_path):
+    if not os.path.exists(dedup_path):
+        return 0
+    with DedupStore(dedup_path) as store:
+        return store.get_meta('generation', 0)
+
+# 只解析清单中没有或内容有变化的文件，把结果合并进已保存的状态
+# 去重索引保存在 dedup.sqlite 中：已处理过的ID被跳过；
+# 重新抓取到更新版本（last_modify_ts 更大）时，先从状态中撤销旧版本再加入新版本
+# 一次运行对去重索引的修改在同一个事务中，保存状态之后才提交，中途出错时回滚
+def run_incremental(roots=None, patterns=None, state_dir=STATE_DIR, workers=None):
+    os.makedirs(state_dir, exist_ok=True)
+    manifest_path = os.path.join(state_dir, 'manifest.json')
+    state_path = os.path.join(state_dir, 'state.pkl')
+    dedup_path = os.path.join(state_dir, 'dedup.sqlite')
+    manifest = load_manifest(manifest_path)
+    state = load_state(state_path)
+    if state is None:
+        # 旧版本的状态缺少新的聚合结构：清空清单和去重索引，重新处理全部数据文件
+        print("增量分析状态的格式已更新，将重新处理全部数据文件")
+    elif state.generation != dedup_generation(dedup_path):
+        # 上次运行保存状态后、提交去重索引前中断：两者不对应
+        print("增量分析状态与去重索引不一致（上次运行中途失败），将重新处理全部数据文件")
+        state = None
+    if state is None:
+        manifest = {}
+        if os.path.exists(dedup_path):
+            os.remove(dedup_path)
+        state = AnalysisState(incremental=True)
+    
+    new_files = {'contents': [], 'comments': []}
+    new_manifest = {}
+    for file_path, kind in iter_data_files(roots, patterns):
+        key = os.path.relpath(file_path, BASE_DIR)
+        previous = manifest.get(key)
+        fingerprint = file_fingerprint(file_path, previous)
+        new_manifest[key] = dict(fingerprint, kind=kind)
+        if previous is None or previous['sha256'] != fingerprint['sha256']:
+            new_files[kind].append(file_path)
+    
+    stats = {}
+    counts = {'contents': {}, 'comments': {}}
+    changes = {'contents': [0, 0], 'comments': [0, 0]}  # [新增, 更新]
+    with DedupStore(dedup_path, autocommit=False) as store:
+        for kind in ['contents', 'comments']:
+            for batch in iter_filtered_batches(kind, stats, counts[kind], workers=workers, files=new_files[kind]):
+                inserted, updated = store.add_batch(kind, dedup_items(batch))
+                changes[kind][0] += len(inserted)
+                changes[kind][1] += len(updated)
+                old_records = [old for old, new in updated]
+                new_records = inserted + [new for old, new in updated]
+                if kind == 'contents':
+                    if old_records:
+                        df_old = pd.DataFrame(old_records)
+                        state.add_posts(df_old, *extract_features(df_old), sign=-1)
+                    if new_records:
+                        df_new = pd.DataFrame(new_records)
+                        state.add_posts(df_new, *extract_features(df_new))
+                else:
+                    if old_records:
+                        state.add_comments(pd.DataFrame(old_records), sign=-1)
+                    if new_records:
+                        state.add_comments(pd.DataFrame(new_records))
+        
+        # 依次保存状态、提交去重索引、保存清单：
+        # 保存状态前失败时去重索引回滚，下次重新处理这些文件；
+        # 保存状态后、提交前失败时两者的运行次数不一致，下次重新处理全部文件；
+        # 提交后、保存清单前失败时下次重新读取这些文件，其中的记录都会被去重跳过
+        state.generation += 1
+        store.set_meta('generation', state.generation)
+        save_state(state, state_path)
+        store.commit()
+    save_manifest(new_manifest, manifest_path)
+    
+    print(f"新增数据文件：{len(new_files['contents'])}个帖子文件，{len(new_files['comments'])}个评论文件")
+    if stats:
+        print_load_report(stats)
+    print(f"新增记录：{changes['contents'][0]}个帖子，{changes['comments'][0]}条评论")
+    print(f"更新记录：{changes['contents'][1]}个帖子，{changes['comments'][1]}条评论")
+    
+    return state.to_results(), state
+
+# 6.1 分块分析：按 chunk_size 条一块读取 ingest 写出的处理后数据（JSONL），逐块加入 AnalysisState，
+# 内存占用取决于块大小和聚合状态，与数据总量无关，可以分析大于内存的数据
+# 与一次性加载全部数据的 analyze_data 相比：
+#   计数、排名、好评率、情感分布、关键词、时间和游戏类型统计：结果相同（数量相同的项之间的顺序可能不同）
+#   4.5 / 4.7 相关系数：由累计矩计算，只有浮点舍入误差
+#   4.3 回复数统计：Q1/Q3 由 QuantileSketch 计算，回复数都是小于 4096 的非负整数时与精确值相同，
+#       否则相对误差不超过 1%；均值、最值按草图的代表值计算，相对误差同样不超过 1%，
+#       异常值数量只在有回复数落在界限的 1% 以内时可能不同
+#   4.12 评论情感：结果相同；按游戏统计时评论按加入时所在帖子提到的游戏归类，帖子先于评论读取
+# 聚合状态中每个帖子保存回复数、标题和提到的游戏（4.5、4.12），占用与帖子数成正比，远小于正文和评论
+# 不包括需要同时看到整棵回复树的 4.13 评论回复树；5.5 和 5.9 图表由 reply_points 绘制，
+# 近似模式下帖子长度和回复数按两位有效数字分组
+# approximate=True 时聚合状态的内存固定（见 AnalysisState），误差界保存在结果的 error_bounds 中
+def run_chunked(chunk_size=CHUNK_SIZE, approximate=False):
+    state = AnalysisState(approximate)
+    paths = {}
+    for kind in ['contents', 'comments']:
+        paths[kind] = find_output(PROCESSED_DATA_PATHS[kind])
+        if paths[kind] is None:
+            raise FileNotFoundError(f"未找到 {PROCESSED_DATA_PATHS[kind]} 的处理后数据，请先运行 ingest")
+        for batch in iter_batches(iter_jsonl(paths[kind]), chunk_size):
+            df = records_frame(batch, kind, ANALYSIS_COLUMNS[kind])
+            if kind == 'contents':
+                state.add_posts(df, *extract_features(df))
+            else:
+                state.add_comments(df)
+    
+    if approximate:
+        # 近似模式不保存每个帖子的信息：评论最多的帖子确定后，再读一遍帖子取出它们的标题
+        top_note_ids = {note_id for note_id, count in state.comments_per_post.most_common(10)}
+        for batch in iter_batches(iter_jsonl(paths['contents']), chunk_size):
+            df = records_frame(batch, 'contents', ['note_id', 'title', 'total_replay_num'])
+            if 'note_id' not in df.columns:
+                continue
+            df = df[df['note_id'].isin(top_note_ids)]
+            titles = df['title'] if 'title' in df.columns else pd.Series(None, index=df.index)
+            for note_id, title in zip(df['note_id'], titles):
+                state.post_info[note_id] = (None, title)
+    return state.to_results(), state
+
+# 7. 统计摘要
+# 分析结果整理为只含基本类型的摘要保存为JSON，report 子命令直接读取并打印，不需要 pandas
+def _plain(value):
+    return value.item() if hasattr(value, 'item') else value
+
+def _pairs(items):
+    return [[_plain(key), _plain(value)] for key, value in items]
+
+def summarize_results(analysis_results, post_count, comment_count):
+    summary = {'post_count': post_count, 'comment_count': comment_count}
+    
+    for name in ['tieba_counts', 'game_type_distribution', 'avg_replies_by_length', 'avg_replies_by_hour',
+                 'avg_replies_by_day', 'avg_replies_by_type', 'sentiment_distribution',
+                 'distinct_users_by_tieba', 'distinct_users_by_game']:
+        if name in analysis_results:
+            summary[name] = _pairs(analysis_results[name].items())
+    for name in ['game_counts', 'host_game_counts', 'mobile_game_counts', 'top_game_keywords', 'top_comment_keywords']:
+        if name in analysis_results:
+            summary[name] = _pairs(analysis_results[name])
+    for name in ['replies_stats', 'sentiment_stats']:
+        if name in analysis_results:
+            summary[name] = {key: _plain(value) for key, value in analysis_results[name].items()}
+    for name in ['reply_comment_correlation', 'length_reply_correlation']:
+        if name in analysis_results:
+            summary[name] = _plain(analysis_results[name])
+    
+    summary['cross_platform_games'] = sorted(analysis_results.get('cross_platform_games', []))
+    
+    # 评论情感：整体分布，以及评论最多的游戏/贴吧的 (名称, 评论数, 平均得分)
+    if 'comment_sentiment' in analysis_results:
+        comment_sentiment = analysis_results['comment_sentiment']
+        summary['comment_sentiment_distribution'] = _pairs(comment_sentiment['distribution'].items())
+        for name in ['by_game', 'by_tieba']:
+            if name in comment_sentiment:
+                top = comment_sentiment[name].head(10)
+                summary[f'comment_sentiment_{name}'] = [[_plain(key), _plain(count), _plain(mean_score)]
+                                                        for key, count, mean_score in zip(top.index, top['count'], top['mean_score'])]
+    
+    # 评论回复树：整体统计、楼层深度分布、回复最多的评论 (帖子标题, 评论ID, 回复数)
+    if 'thread_stats' in analysis_results:
+        summary['thread_stats'] = {key: _plain(value) for key, value in analysis_results['thread_stats'].items()}
+        summary['thread_depth_distribution'] = _pairs(analysis_results['thread_depth_distribution'].items())
+        top_replied = analysis_results['top_replied_comments'].sort_values('reply_count', ascending=False, kind='stable')
+        summary['top_replied_comments'] = [
+            [lookup_post_title(analysis_results['post_comment_join'], note_id), _plain(comment_id), _plain(count)]
+            for note_id, comment_id, count in zip(top_replied['note_id'], top_replied['comment_id'],
+                                                  top_replied['reply_count'])][:10]
+    
+    # 评论最多的帖子TOP5（标题, 评论数）
+    comments_per_post = analysis_results.get('comments_per_post') or {}
+    post_join = analysis_results.get('post_comment_join')
+    summary['top_commented_posts'] = [[lookup_post_title(post_join, note_id), _plain(count)]
+                                      for note_id, count in list(comments_per_post.items())[:5]]
+    
+    # 近似模式下各结果的误差界
+    if 'error_bounds' in analysis_results:
+        summary['error_bounds'] = {name: {key: _plain(value) for key, value in bound.items()}
+                                   for name, bound in analysis_results['error_bounds'].items()}
+    return summary
+
+# 保存 report 用的统计摘要和 plot 用的绘图数据
+def save_analysis_outputs(analysis_results, df_contents, post_count, comment_count):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    summary = summarize_results(analysis_results, post_count, comment_count)
+    _atomic_write(SUMMARY_PATH, lambda f: json.dump(summary, f, ensure_ascii=False, indent=2), 'w', encoding='utf-8')
+    inputs = chart_inputs(analysis_results, df_contents)
+    if 'comment_threads' in analysis_results:
+        analysis_results['comment_threads'].save(THREADS_PATH)
+    if 'rollup_cube' in analysis_results:
+        analysis_results['rollup_cube'].save(CUBE_PATH)
+    _atomic_write(CHART_INPUTS_PATH, lambda f: pickle.dump(inputs, f, protocol=pickle.HIGHEST_PROTOCOL))
+    return summary, inputs
+
+def load_summary(path=SUMMARY_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_chart_inputs(path=CHART_INPUTS_PATH):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def _print_pairs(summary, name, title, unit='', digits=None):
+    if not summary.get(name):
+        return
+    print(title)
+    for key, value in summary[name]:
+        value = f'{value:.{digits}f}' if digits is not None else value
+        print(f"{key}: {value}{unit}")
+    _print_error_bound(summary, name)
+
+# 近似模式的结果后面给出误差界
+def _print_error_bound(summary, name):
+    bound = summary.get('error_bounds', {}).get(name)
+    if bound is None:
+        return
+    if bound['method'] == 'misra_gries':
+        print(f"（近似值：频繁项草图，计数偏小不超过{bound['max_error']}，总数{bound['total']}）")
+    elif bound['method'] == 'count_min':
+        print(f"（近似值：Count-Min 草图，各情感等级的评论数偏大不超过{bound['max_error']:.0f}，"
+              f"置信度{bound['confidence']:.1%}）")
+    elif bound['method'] == 'hyperloglog':
+        print(f"（近似值：HyperLogLog，相对标准误差约{bound['relative_std_error']:.1%}）")
+
+# 输出统计摘要
+def print_report(summary):
+    print("=== 数据基本信息 ===")
+    print(f"总帖子数: {summary['post_count']}")
+    print(f"总评论数: {summary['comment_count']}")
+    
+    _print_pairs(summary, 'tieba_counts', "\n=== 游戏热度分析（按贴吧） ===", '个帖子')
+    _print_pairs(summary, 'game_counts', "\n整体热门游戏TOP10：", '次')
+    _print_pairs(summary, 'host_game_counts', "\n主机游戏热度TOP10：", '次')
+    _print_pairs(summary, 'mobile_game_counts', "\n手游热度TOP10：", '次')
+    if summary['cross_platform_games']:
+        print(f"\n双平台游戏：{'、'.join(summary['cross_platform_games'])}")
+    
+    if 'replies_stats' in summary:
+        replies_stats = summary['replies_stats']
+        print("\n=== 帖子回复数分析 ===")
+        print(f"平均回复数: {replies_stats['avg']:.2f}")
+        print(f"最大回复数: {replies_stats['max']}")
+        print(f"最小回复数: {replies_stats['min']}")
+        print(f"异常值数量: {replies_stats['outlier_count']}")
+    
+    _print_pairs(summary, 'game_type_distribution', "\n游戏类型分布：", '个帖子')
+    
+    if summary['top_commented_posts']:
+        print("\n评论最多的帖子TOP5：")
+        for post_title, count in summary['top_commented_posts']:
+            print(f"{post_title[:20]}...: {count}条评论")
+        _print_error_bound(summary, 'top_commented_posts')
+    if 'reply_comment_correlation' in summary:
+        print(f"帖子回复数与评论数的相关性: {summary['reply_comment_correlation']:.2f}")
+    
+    if 'sentiment_stats' in summary:
+        sentiment = summary['sentiment_stats']
+        print("\n=== 好评率分析 ===")
+        print(f"好评率: {sentiment['positive_rate']:.2f}%，差评率: {sentiment['negative_rate']:.2f}%，中性率: {sentiment['neutral_rate']:.2f}%")
+    
+    if 'length_reply_correlation' in summary:
+        print(f"\n帖子长度与回复数的相关性: {summary['length_reply_correlation']:.2f}")
+    _print_pairs(summary, 'avg_replies_by_length', "\n不同长度区间的平均回复数：", digits=2)
+    _print_pairs(summary, 'avg_replies_by_hour', "\n不同发布小时的平均回复数：", digits=2)
+    _print_pairs(summary, 'avg_replies_by_day', "\n不同星期几的平均回复数：", digits=2)
+    _print_pairs(summary, 'avg_replies_by_type', "\n不同游戏类型的平均回复数：", digits=2)
+    
+    _print_pairs(summary, 'top_game_keywords', "\n热门游戏讨论关键词TOP20：", '次')
+    _print_pairs(summary, 'top_comment_keywords', "\n评论关键词TOP20：", '次')
+    _print_pairs(summary, 'sentiment_distribution', "\n游戏评价情感倾向分布：", '次')
+    _print_pairs(summary, 'comment_sentiment_distribution', "\n评论情感倾向分布：", '条')
+    _print_pairs(summary, 'distinct_users_by_tieba', "\n热门贴吧的用户数（发帖和评论，按昵称去重）：", '人')
+    _print_pairs(summary, 'distinct_users_by_game', "\n热门游戏的用户数（发帖和评论，按昵称去重）：", '人')
+    for name, title in [('by_game', "\n各游戏的评论情感（评论数，平均得分）："),
+                        ('by_tieba', "\n各贴吧的评论情感（评论数，平均得分）：")]:
+        if summary.get(f'comment_sentiment_{name}'):
+            print(title)
+            for key, count, mean_score in summary[f'comment_sentiment_{name}']:
+                print(f"{key}: {count}条，{mean_score:.2f}")
+            _print_error_bound(summary, f'comment_sentiment_{name}')
+    
+    if 'thread_stats' in summary:
+        stats = summary['thread_stats']
+        print("\n=== 评论回复树分析 ===")
+        print(f"楼层数: {stats['threads']}，楼中楼回复数: {stats['replies']}，找不到父评论的回复数: {stats['orphans']}")
+        print(f"最大回复深度: {stats['max_depth']}，单个楼层最多评论数: {stats['max_thread_size']}，"
+              f"单层最多回复数: {stats['max_breadth']}")
+        if stats['median_latency_minutes'] is not None:
+            print(f"回复延迟中位数: {stats['median_latency_minutes']:.1f}分钟，"
+                  f"90%分位数: {stats['p90_latency_minutes']:.1f}分钟")
+        _print_pairs(summary, 'thread_depth_distribution', "\n楼层回复深度分布：", '个楼层')
+        if summary['top_replied_comments']:
+            print("\n回复最多的评论TOP10：")
+            for post_title, comment_id, count in summary['top_replied_comments']:
+                print(f"{post_title[:20]}... 评论{comment_id}: {count}条回复")
+
+# 8. 命令行
+# 子命令对应处理流程的各个阶段，每个阶段只导入自己用到的库：
+#   ingest   读取、筛选、去重，保存处理后的数据和列式缓存
+#   analyze  从列式缓存分析（--incremental 时只处理新增的数据文件），保存统计摘要和绘图数据
+#   plot     根据 analyze 保存的绘图数据生成图表
+#   report   打印统计摘要（不加载 pandas / matplotlib）
+#   run      依次执行全部阶段（不指定子命令时的默认行为）
+COMMANDS = ['run', 'ingest', 'analyze', 'plot', 'report']
+
+# 去重后的记录边产出边写入 JSONL（compression 为 auto / zstd / gzip / none）
+# 返回去重后帖子和评论的紧凑 DataFrame（见 records_frame）；
+# frames=False 时只写出 JSONL，不在内存中保留记录，也不更新列式缓存（分块分析使用），返回 None
+# near_duplicates 为 'tag' / 'drop' 时在去重后检测近似重复（见 mark_near_duplicates）
+# typed=True 时按模式直接解码为类型化的列（见 typed_game_frame），整个数据集保留在内存中，
+# 不能与 dedup_store 或 frames=False 同时使用
+# roots / patterns 为数据目录和文件名模式（见 iter_data_files），默认为 DATA_ROOTS / FILE_PATTERNS
+def run_ingest(workers=None, dedup_store=None, compression='auto', frames=True, near_duplicates=None,
+               similarity=NEAR_DUPLICATE_THRESHOLD, typed=False, roots=None, patterns=None):
+    if typed and (dedup_store or not frames):
+        raise ValueError('typed=True 时在内存中去重，不能与 dedup_store 或 frames=False 同时使用')
+    print("正在加载数据...")
+    stats = {}
+    content_counts = {}
+    comment_counts = {}
+    output_dir = OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    
+    violations = []
+    if typed:
+        results = {}
+        paths = []
+        for kind, kind_counts in [('contents', content_counts), ('comments', comment_counts)]:
+            with metrics.stage(f'ingest/{kind}') as span, JsonlWriter(PROCESSED_DATA_PATHS[kind], compression) as writer:
+                results[kind] = typed_game_frame(kind, stats, kind_counts, violations, roots, patterns, workers,
+                                                 near_duplicates=near_duplicates, similarity=similarity)
+                writer.write_many(frame_records(results[kind]))
+                span.update(records_in=kind_counts['raw'], records_out=writer.count)
+            paths.append(writer.path)
+        unique_contents, unique_comments = results['contents'], results['comments']
+    else:
+        unique_contents, unique_comments, paths = _stream_ingest(stats, content_counts, comment_counts, workers,
+                                                                 dedup_store, compression, frames,
+                                                                 near_duplicates, similarity, roots, patterns)
+    print_load_report(stats)
+    if typed:
+        report_schema_violations(violations)
+    
+    print(f"\n原始数据：{content_counts['raw']}个帖子，{comment_counts['raw']}条评论")
+    print(f"筛选后：{content_counts['filtered']}个帖子，{comment_counts['filtered']}条评论")
+    print(f"去重后：{content_counts['unique']}个帖子，{comment_counts['unique']}条评论")
+    if near_duplicates:
+        action = '已标记 near_duplicate_of' if near_duplicates == 'tag' else '已删除'
+        print(f"近似重复（相似度≥{similarity}）：{content_counts['near_duplicates']}个帖子，"
+              f"{comment_counts['near_duplicates']}条评论（{action}）")
+    
+    # 保存列式缓存（处理后的记录已在去重时写出）
+    if frames:
+        with metrics.stage('ingest/save', len(unique_contents) + len(unique_comments)):
+            save_processed_cache(unique_contents, unique_comments)
+    
+    print(f"\n处理后的数据已保存到 {output_dir} 目录（{'、'.join(os.path.basename(path) for path in paths)}）")
+    return unique_contents, unique_comments
+
+# 逐条记录流式读取、筛选、去重，边去重边写出 JSONL；返回 (帖子, 评论, 写出的文件)
+def _stream_ingest(stats, content_counts, comment_counts, workers, dedup_store, compression, frames,
+                   near_duplicates, similarity, roots=None, patterns=None):
+    dedup_index = DedupStore(dedup_store) if dedup_store else MemoryDedupIndex()
+    with dedup_index, JsonlWriter(PROCESSED_DATA_PATHS['contents'], compression) as contents_writer, \
+            JsonlWriter(PROCESSED_DATA_PATHS['comments'], compression) as comments_writer:
+        with metrics.stage('ingest/contents') as span:
+            records = contents_writer.tee(stream_game_data('contents', stats, content_counts, roots=roots,
+                                                           patterns=patterns, workers=workers,
+                                                           dedup_index=dedup_index, near_duplicates=near_duplicates,
+                                                           similarity=similarity))
+            unique_contents = records_frame(records, 'contents') if frames else _consume(records)
+            span.update(records_in=content_counts['raw'], records_out=contents_writer.count)
+        with metrics.stage('ingest/comments') as span:
+            records = comments_writer.tee(stream_game_data('comments', stats, comment_counts, roots=roots,
+                                                           patterns=patterns, workers=workers,
+                                                           dedup_index=dedup_index, near_duplicates=near_duplicates,
+                                                           similarity=similarity))
+            unique_comments = records_frame(records, 'comments') if frames else _consume(records)
+            span.update(records_in=comment_counts['raw'], records_out=comments_writer.count)
+    return unique_contents, unique_comments, [contents_writer.path, comments_writer.path]
+
+def _consume(records):
+    for _ in records:
+        pass
+
+# contents / comments 为 None 时从列式缓存读取；返回绘图数据
+# incremental / chunked 时按批加入聚合状态（见 run_incremental、run_chunked）；roots / patterns 只用于 incremental
+def run_analyze(contents=None, comments=None, incremental=False, workers=None, chunked=False, chunk_size=CHUNK_SIZE,
+                approximate=False, roots=None, patterns=None):
+    if incremental or chunked:
+        print("正在增量加载数据..." if incremental else f"正在分块读取处理后的数据（每块{chunk_size}条）...")
+        with metrics.stage('analyze/incremental' if incremental else 'analyze/chunked') as span:
+            if incremental:
+                analysis_results, state = run_incremental(roots, patterns, workers=workers)
+            else:
+                analysis_results, state = run_chunked(chunk_size, approximate)
+            span.update(records_out=state.post_count + state.comment_count)
+        print("\n正在分析数据...")
+        with metrics.stage('analyze/save'):
+            summary, inputs = save_analysis_outputs(analysis_results, pd.DataFrame(), state.post_count, state.comment_count)
+        print_report(summary)
+        return inputs
+    
+    if contents is None:
+        print("正在读取列式缓存...")
+        with metrics.stage('analyze/load_cache') as span:
+            contents, comments = load_processed_cache()
+            span['records_out'] = len(contents) + len(comments)
+    print("\n正在分析数据...")
+    analysis_results, df_contents, df_comments = analyze_data(contents, comments)
+    with metrics.stage('analyze/save'):
+        summary, inputs = save_analysis_outputs(analysis_results, df_contents, len(df_contents), len(df_comments))
+    return inputs
+
+# --pattern 的值 KIND=GLOB（可重复）：给出的数据类型只用这些模式，其余类型沿用 FILE_PATTERNS
+def parse_file_patterns(values):
+    if not values:
+        return None
+    patterns = {}
+    for value in values:
+        kind, sep, pattern = value.partition('=')
+        if not sep or kind not in FILE_PATTERNS or not pattern:
+            raise ValueError(f"--pattern 的格式为 {'|'.join(FILE_PATTERNS)}=GLOB: {value}")
+        patterns.setdefault(kind, []).append(pattern)
+    return {kind: patterns.get(kind, default) for kind, default in FILE_PATTERNS.items()}
+
+def build_parser():
+    workers_options = argparse.ArgumentParser(add_help=False)
+    workers_options.add_argument('--workers', type=int, default=None, help='并行读取数据文件和绘制图表的进程数')
+    workers_options.add_argument('--metrics', default=os.path.join(METRICS_DIR, 'metrics.jsonl'),
+                                 help='各阶段耗时、内存和记录数的输出文件（JSONL，追加写入）')
+    workers_options.add_argument('--profile', default=None, metavar='STAGE',
+                                 help='对指定阶段开启采样分析，例如 analyze、plot、analyze/4.8 热门游戏讨论关键词提取')
+    workers_options.add_argument('--profile-interval', type=float, default=0.005, help='采样间隔（秒）')
+    source_options = argparse.ArgumentParser(add_help=False)
+    source_options.add_argument('--data-root', action='append', dest='data_roots', metavar='DIR',
+                                help='爬虫数据目录（可重复指定），默认为脚本旁的 游戏、游戏推荐、game 目录')
+    source_options.add_argument('--pattern', action='append', dest='patterns', metavar='KIND=GLOB',
+                                help='数据文件名模式（可重复指定），KIND 为 contents 或 comments，'
+                                     '例如 contents=search_contents_*.json；未指定的类型使用默认模式')
+    ingest_options = argparse.ArgumentParser(add_help=False)
+    ingest_options.add_argument('--dedup-store', default=None,
+                                help='使用磁盘去重索引（SQLite文件路径），跨运行保留每个ID的最新版本；'
+                                     '不指定时每个ID的最新记录都保存在内存中，内存占用与去重后的数据量成正比')
+    ingest_options.add_argument('--compression', choices=['auto', 'zstd', 'gzip', 'none'], default='auto',
+                                help='处理后数据（JSONL）的压缩方式，auto 在安装了 zstandard 时用 zstd，否则用 gzip')
+    ingest_options.add_argument('--near-duplicates', choices=['tag', 'drop'], default=None,
+                                help='检测文本近似重复的帖子和评论（复制粘贴的广告、换ID重发的帖子）：'
+                                     'tag 只在处理后数据中标记 near_duplicate_of，分析结果仍包含这些记录；'
+                                     'drop 只保留每簇最早的一条，只有 drop 会影响分析结果')
+    ingest_options.add_argument('--similarity', type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                                help='近似重复的相似度阈值（0~1，字符3-gram 的 Jaccard 相似度）')
+    ingest_options.add_argument('--typed', action='store_true',
+                                help='按字段类型直接解码为列（整数ID、时间、分类字符串），不为每条记录生成字典，'
+                                     '并报告违反类型的值所在的文件和偏移（在内存中去重，不能与 --dedup-store、--chunked 同时使用）')
+    analyze_options = argparse.ArgumentParser(add_help=False)
+    analyze_options.add_argument('--incremental', action='store_true',
+                                 help='增量模式：只处理新增或变化的数据文件，并与已保存的聚合状态合并')
+    analyze_options.add_argument('--chunked', action='store_true',
+                                 help='分块模式：按块读取处理后的数据并合并聚合状态，内存占用与数据总量无关'
+                                      '（run 时 ingest 不在内存中保留记录，数据很大时配合 --dedup-store 使用）')
+    analyze_options.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='分块模式下每块的记录数')
+    analyze_options.add_argument('--approximate', action='store_true',
+                                 help='近似模式（需要 --chunked）：TOP-N 和用户数用固定大小的草图统计，报告中给出误差界')
+    plot_options = argparse.ArgumentParser(add_help=False)
+    plot_options.add_argument('--charts', nargs='+', choices=list(CHARTS), metavar='NAME',
+                              help='只绘制指定的图表（名称即图片文件名，不含 .png）')
+    plot_options.add_argument('--redraw', action='store_true', help='忽略图表的哈希记录，重新绘制全部图表')
+    
+    parser = argparse.ArgumentParser(description='百度贴吧游戏数据分析')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    run_parser = subparsers.add_parser('run', help='依次执行 ingest、analyze、plot（默认）',
+                                       parents=[workers_options, source_options, ingest_options, analyze_options,
+                                                plot_options])
+    run_parser.add_argument('--from-cache', action='store_true',
+                            help='跳过读取和清洗，直接从 processed_data 的列式缓存读取分析所需的列')
+    subparsers.add_parser('ingest', help='读取、筛选、去重并保存处理后的数据',
+                          parents=[workers_options, source_options, ingest_options])
+    subparsers.add_parser('analyze', help='分析处理后的数据，保存统计摘要和绘图数据',
+                          parents=[workers_options, source_options, analyze_options])
+    subparsers.add_parser('plot', help='根据保存的绘图数据生成图表', parents=[workers_options, plot_options])
+    subparsers.add_parser('report', help='打印保存的统计摘要')
+    return parser
+
+# 主函数
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # 兼容旧的用法：不指定子命令时执行全部阶段
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run', *argv]
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'approximate', False) and not args.chunked:
+        parser.error('--approximate 需要与 --chunked 一起使用')
+    if hasattr(args, 'similarity') and not 0 < args.similarity <= 1:
+        parser.error('--similarity 需要在0和1之间')
+    if getattr(args, 'typed', False) and args.dedup_store:
+        parser.error('--typed 不能与 --dedup-store 同时使用')
+    if getattr(args, 'typed', False) and getattr(args, 'chunked', False):
+        parser.error('--typed 在内存中去重，不能与 --chunked 同时使用')
+    if getattr(args, 'incremental', False) and args.chunked:
+        parser.error('--incremental 不能与 --chunked 同时使用')
+    if getattr(args, 'from_cache', False) and (args.incremental or args.chunked):
+        parser.error('--from-cache 不能与 --incremental、--chunked 同时使用')
+    if args.command == 'run' and (args.incremental or args.from_cache):
+        # 这两种模式不执行 ingest 阶段，ingest 的选项不会生效
+        ignored = [option for option, value in [('--dedup-store', args.dedup_store), ('--typed', args.typed),
+                                                ('--near-duplicates', args.near_duplicates)] if value]
+        if ignored:
+            parser.error(f"{'、'.join(ignored)} 不能与 {'--incremental' if args.incremental else '--from-cache'} 同时使用")
+    if hasattr(args, 'data_roots'):
+        # analyze 只在增量模式下读取原始数据文件，run --from-cache 不读取
+        reads_files = args.command == 'ingest' or (args.incremental if args.command == 'analyze' else not args.from_cache)
+        if (args.data_roots or args.patterns) and not reads_files:
+            parser.error('--data-root、--pattern 只用于 ingest、run 和 analyze --incremental')
+        try:
+            args.patterns = parse_file_patterns(args.patterns)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.command in ('report', 'plot'):
+        path = SUMMARY_PATH if args.command == 'report' else CHART_INPUTS_PATH
+        if not os.path.exists(path):
+            sys.exit(f"未找到 {path}，请先运行 analyze")
+    
+    if args.command == 'report':
+        print_report(load_summary())
+        return
+    
+    if not NATIVE_AVAILABLE and args.command != 'plot':
+        print("提示: 未安装 pyahocorasick，关键词匹配使用纯Python实现（约慢3倍），可用 pip install pyahocorasick 安装")
+    if args.profile:
+        metrics.enable_profile(args.profile, METRICS_DIR, args.profile_interval)
+    try:
+        run_command(args)
+    finally:
+        metrics.write(args.metrics)
+        print(f"\n运行指标已保存到 {args.metrics}")
+
+def run_command(args):
+    if args.command == 'ingest':
+        with metrics.stage('ingest'):
+            run_ingest(args.workers, args.dedup_store, args.compression,
+                       near_duplicates=args.near_duplicates, similarity=args.similarity, typed=args.typed,
+                       roots=args.data_roots, patterns=args.patterns)
+        return
+    
+    if args.command == 'analyze':
+        with metrics.stage('analyze'):
+            run_analyze(incremental=args.incremental, workers=args.workers, chunked=args.chunked,
+                        chunk_size=args.chunk_size, approximate=args.approximate,
+                        roots=args.data_roots, patterns=args.patterns)
+        return
+    
+    if args.command == 'plot':
+        print("正在生成可视化报告...")
+        inputs = load_chart_inputs()
+        with metrics.stage('plot', len(inputs)):
+            render_charts(inputs, args.charts, args.workers, args.redraw)
+        return
+    
+    if args.incremental or args.from_cache:
+        with metrics.stage('analyze'):
+            inputs = run_analyze(incremental=args.incremental, workers=args.workers,
+                                 roots=args.data_roots, patterns=args.patterns)
+    elif args.chunked:
+        with metrics.stage('ingest'):
+            run_ingest(args.workers, args.dedup_store, args.compression, frames=False,
+                       near_duplicates=args.near_duplicates, similarity=args.similarity, typed=args.typed,
+                       roots=args.data_roots, patterns=args.patterns)
+        with metrics.stage('analyze'):
+            inputs = run_analyze(chunked=True, chunk_size=args.chunk_size, approximate=args.approximate)
+    else:
+        with metrics.stage('ingest'):
+            unique_contents, unique_comments = run_ingest(args.workers, args.dedup_store, args.compression,
+                                                          near_duplicates=args.near_duplicates,
+                                                          similarity=args.similarity, typed=args.typed,
+                                                          roots=args.data_roots, patterns=args.patterns)
+        with metrics.stage('analyze'):
+            inputs = run_analyze(unique_contents, unique_comments)
     
-    print(f"\n处理后的数据已保存到 {output_dir} 目录")
+    print("\n正在生成可视化报告...")
+    with metrics.stage('plot', len(inputs)):
+        render_charts(inputs, args.charts, args.workers, args.redraw)
     print("\n数据分析完成！")
 
 if __name__ == "__main__":
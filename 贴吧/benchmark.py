@@ -0,0 +1,255 @@
+# 性能测试：在不同规模的合成数据（见 synthetic_data.py）上依次运行各处理阶段，
+# 记录每个阶段的耗时、吞吐量和峰值内存，结果保存为JSON
+#
+#   python benchmark.py --sizes 10000 100000 1000000
+#   python benchmark.py --sizes 10000 --compare processed_data/benchmarks/benchmark-20260101-000000.json
+#
+# load / filter / dedup 分别测量逐条记录的列表函数；ingest、ingest_typed 测量实际使用的 run_ingest
+# （并行读取、流式去重、写出 JSONL 和列式缓存；ingest_typed 为 --typed），并行读取时峰值内存只包括主进程
+# 每个阶段重复运行 --repeat 次，吞吐量按耗时的中位数计算；analyze 第一次运行时分词缓存为空，
+# 之后的运行命中缓存。峰值内存由 tracemalloc 在额外的一次运行中测量（包括 numpy/pandas 的数组），
+# 不计入耗时。所有输出（分词缓存、图表）写入临时目录，不影响 processed_data 和 visualizations
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import analyze_game_data as pipeline
+from synthetic_data import CorpusModel, write_corpus
+
+STAGES = ['load', 'filter', 'dedup', 'ingest', 'ingest_typed', 'analyze', 'plot']
+BENCHMARK_DIR = os.path.join(pipeline.OUTPUT_DIR, 'benchmarks')
+
+# 合成数据中按真实命中率插入的关键词
+def benchmark_keywords():
+    keywords = list(pipeline.GAME_KEYWORDS) + list(pipeline.COMMON_GAMES)
+    keywords += [keyword for words in pipeline.PLATFORM_KEYWORDS.values() for keyword in words]
+    keywords += pipeline.POSITIVE_KEYWORDS + pipeline.NEGATIVE_KEYWORDS
+    keywords += [keyword for words in pipeline.SENTIMENT_KEYWORDS.values() for keyword in words]
+    return keywords
+
+# 把分析脚本的输出目录临时指向 work_dir，数据目录指向 data_roots
+@contextlib.contextmanager
+def isolated_outputs(work_dir, data_roots=None):
+    names = ['OUTPUT_DIR', 'VIS_DIR', 'TOKEN_CACHE_PATH', 'PROCESSED_DATA_PATHS', 'CACHE_PATHS',
+             'SCHEMA_VIOLATIONS_PATH', 'DATA_ROOTS']
+    saved = {name: getattr(pipeline, name) for name in names}
+    pipeline.OUTPUT_DIR = os.path.join(work_dir, 'processed_data')
+    pipeline.VIS_DIR = os.path.join(work_dir, 'visualizations')
+    pipeline.TOKEN_CACHE_PATH = os.path.join(pipeline.OUTPUT_DIR, 'token_cache.sqlite')
+    pipeline.PROCESSED_DATA_PATHS = {kind: os.path.join(pipeline.OUTPUT_DIR, os.path.basename(path))
+                                     for kind, path in saved['PROCESSED_DATA_PATHS'].items()}
+    pipeline.CACHE_PATHS = {kind: os.path.join(pipeline.OUTPUT_DIR, os.path.basename(path))
+                            for kind, path in saved['CACHE_PATHS'].items()}
+    pipeline.SCHEMA_VIOLATIONS_PATH = os.path.join(pipeline.OUTPUT_DIR, 'schema_violations.jsonl')
+    if data_roots is not None:
+        pipeline.DATA_ROOTS = list(data_roots)
+    pipeline.get_tokenizer.cache_clear()
+    try:
+        yield
+    finally:
+        if pipeline.get_tokenizer.cache_info().currsize:
+            pipeline.get_tokenizer().close()
+        pipeline.get_tokenizer.cache_clear()
+        for name, value in saved.items():
+            setattr(pipeline, name, value)
+
+# 运行一个阶段 repeat 次；measure_memory 时再额外运行一次测量峰值内存
+def measure(func, repeat=1, measure_memory=True):
+    seconds = []
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - start)
+
+        peak = None
+        if measure_memory:
+            tracemalloc.start()
+            try:
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return result, seconds, peak
+
+def stage_report(records_in, records_out, seconds, peak):
+    median = statistics.median(seconds)
+    return {
+        'records_in': records_in,
+        'records_out': records_out,
+        'seconds': [round(value, 6) for value in seconds],
+        'median_seconds': round(median, 6),
+        'throughput': round(records_in / median, 1) if median > 0 else None,  # 条/秒
+        'peak_memory_mb': round(peak / (1 << 20), 2) if peak is not None else None,
+    }
+
+def run_size(model, size, work_dir, stages=STAGES, repeat=1, measure_memory=True, seed=0,
+             duplicate_rate=0.3, workers=None):
+    corpus_dir = os.path.join(work_dir, 'corpus')
+    start = time.perf_counter()
+    corpus = write_corpus(model, corpus_dir, size, seed=seed, duplicate_rate=duplicate_rate)
+    run = {
+        'records': size,
+        'contents': corpus['contents'],
+        'comments': corpus['comments'],
+        'corpus_bytes': sum(os.path.getsize(path) for path in corpus['files']),
+        'generate_seconds': round(time.perf_counter() - start, 3),
+        'stages': {},
+    }
+
+    with isolated_outputs(work_dir, [corpus_dir]):
+        (contents, comments), seconds, peak = measure(
+            lambda: pipeline.load_all_data(roots=[corpus_dir]),
+            repeat if 'load' in stages else 1, measure_memory and 'load' in stages)
+        if 'load' in stages:
+            run['stages']['load'] = stage_report(size, len(contents) + len(comments), seconds, peak)
+
+        if 'filter' in stages or 'dedup' in stages or 'analyze' in stages or 'plot' in stages:
+            (contents, comments), seconds, peak = measure(
+                lambda: (pipeline.filter_game_related(contents), pipeline.filter_game_related(comments)),
+                repeat if 'filter' in stages else 1, measure_memory and 'filter' in stages)
+            if 'filter' in stages:
+                run['stages']['filter'] = stage_report(run['stages'].get('load', {}).get('records_out', size),
+                                                       len(contents) + len(comments), seconds, peak)
+
+            filtered_count = len(contents) + len(comments)
+            (contents, comments), seconds, peak = measure(
+                lambda: (pipeline.remove_duplicates(contents), pipeline.remove_duplicates(comments)),
+                repeat if 'dedup' in stages else 1, measure_memory and 'dedup' in stages)
+            if 'dedup' in stages:
+                run['stages']['dedup'] = stage_report(filtered_count, len(contents) + len(comments), seconds, peak)
+
+        # 实际的 ingest 流程：结果与上面的 load -> filter -> dedup 相同
+        for stage, typed in [('ingest', False), ('ingest_typed', True)]:
+            if stage not in stages:
+                continue
+            frames, seconds, peak = measure(lambda: pipeline.run_ingest(workers, typed=typed), repeat, measure_memory)
+            run['stages'][stage] = stage_report(size, sum(len(frame) for frame in frames), seconds, peak)
+
+        unique_count = len(contents) + len(comments)
+        if 'analyze' in stages or 'plot' in stages:
+            (analysis_results, df_contents, _), seconds, peak = measure(
+                lambda: pipeline.analyze_data(contents, comments),
+                repeat if 'analyze' in stages else 1, measure_memory and 'analyze' in stages)
+            if 'analyze' in stages:
+                run['stages']['analyze'] = stage_report(unique_count, unique_count, seconds, peak)
+
+        if 'plot' in stages:
+            chart_count = len(pipeline.chart_inputs(analysis_results, df_contents))
+            _, seconds, peak = measure(
+                lambda: pipeline.generate_visualizations(analysis_results, df_contents, workers=workers, force=True),
+                repeat, measure_memory)
+            run['stages']['plot'] = stage_report(len(df_contents), chart_count, seconds, peak)
+
+    return run
+
+def environment():
+    import numpy
+    import pandas
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+    }
+
+# 与之前的结果对比（相同规模、相同阶段），耗时中位数超过基准 (1 + tolerance) 倍的视为退化
+def compare_results(result, baseline, tolerance=0.2):
+    baseline_runs = {run['records']: run for run in baseline['runs']}
+    regressions = []
+    print(f"\n{'规模':>10} {'阶段':<12} {'基准(秒)':>10} {'本次(秒)':>10} {'比值':>6}")
+    for run in result['runs']:
+        baseline_run = baseline_runs.get(run['records'])
+        if baseline_run is None:
+            continue
+        for stage, report in run['stages'].items():
+            baseline_report = baseline_run['stages'].get(stage)
+            if not baseline_report or not baseline_report['median_seconds']:
+                continue
+            ratio = report['median_seconds'] / baseline_report['median_seconds']
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = '  <- 退化'
+                regressions.append((run['records'], stage, ratio))
+            print(f"{run['records']:>10} {stage:<12} {baseline_report['median_seconds']:>10.3f} "
+                  f"{report['median_seconds']:>10.3f} {ratio:>6.2f}{flag}")
+    return regressions
+
+def print_result(result):
+    for run in result['runs']:
+        print(f"\n=== {run['records']}条记录（{run['contents']}个帖子，{run['comments']}条评论，"
+              f"{run['corpus_bytes'] / (1 << 20):.1f}MB） ===")
+        for stage, report in run['stages'].items():
+            memory = f"{report['peak_memory_mb']:.1f}MB" if report['peak_memory_mb'] is not None else '-'
+            print(f"{stage:<12} 输入{report['records_in']:>9} 输出{report['records_out']:>9} "
+                  f"耗时{report['median_seconds']:>9.3f}秒 吞吐量{report['throughput'] or 0:>11.0f}条/秒 峰值内存{memory:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='用合成数据测量各处理阶段的性能')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='合成数据的记录数（帖子+评论），可指定多个，例如 10000 100000 1000000')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='要测量的阶段')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段的重复次数')
+    parser.add_argument('--no-memory', action='store_true', help='不测量峰值内存（省去额外的一次运行）')
+    parser.add_argument('--duplicate-rate', type=float, default=0.3, help='合成数据中重复记录（同一ID的新版本）的比例')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='ingest 并行读取数据文件和绘制图表的进程数')
+    parser.add_argument('--source', default=pipeline.OUTPUT_DIR,
+                        help='用于生成合成数据的真实数据目录（包含 ingest 保存的 filtered_contents 和 filtered_comments）')
+    parser.add_argument('--work-dir', default=None, help='合成数据和中间结果的目录（默认使用临时目录，结束后删除）')
+    parser.add_argument('--output', default=None, help='结果JSON的路径（默认保存到 processed_data/benchmarks/）')
+    parser.add_argument('--compare', default=None, help='与之前的结果JSON对比，有阶段退化时以状态码1退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='对比时允许的耗时增长比例')
+    args = parser.parse_args(argv)
+
+    model = CorpusModel.from_processed_data(args.source, benchmark_keywords())
+    result = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {'repeat': args.repeat, 'duplicate_rate': args.duplicate_rate, 'seed': args.seed,
+                   'stages': args.stages, 'measure_memory': not args.no_memory},
+        'runs': [],
+    }
+
+    for size in args.sizes:
+        print(f"正在测试 {size} 条记录...")
+        work_dir = os.path.join(args.work_dir, str(size)) if args.work_dir else tempfile.mkdtemp(prefix='tieba-benchmark-')
+        try:
+            result['runs'].append(run_size(model, size, work_dir, args.stages, args.repeat, not args.no_memory,
+                                           args.seed, args.duplicate_rate, args.workers))
+        finally:
+            if not args.work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_result(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        output = os.path.join(BENCHMARK_DIR, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n测试结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 个阶段性能退化")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# 列式缓存：每列单独存成 NumPy 数组，打包在一个不压缩的 .npz 文件中
+# 读取时只解压需要的列；字符串列存为 UTF-8 文本 + 偏移量，分类列存为整数编码 + 类别表，
+# ID 和计数存为整数，时间存为 datetime64
+#
+# 列类型（schema 中使用）：
+#   'int64' / 'int32'  整数（可以有缺失值，读取后为 pandas 可空整数）
+#   'float'            浮点数
+#   'datetime'         时间，写入时按 datetime_format 解析
+#   'category'         字典编码的字符串
+#   'string'           普通字符串（未在 schema 中声明的列默认按此类型保存）
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+def _encode_strings(values):
+    values = ['' if pd.isna(value) else str(value) for value in values]
+    lengths = np.fromiter((len(value) for value in values), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.frombuffer(''.join(values).encode('utf-8'), dtype=np.uint8)
+    return data, offsets
+
+def _decode_strings(data, offsets):
+    text = data.tobytes().decode('utf-8')
+    offsets = offsets.tolist()
+    return [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+# 按 schema 把列转换为目标类型；无法转换为整数的ID列退回字符串类型
+# 字符串形式的整数直接解析为可空整数（不经过 float64），有缺失值时超过 2**53 的ID也保持精确
+def coerce_frame(df, schema, datetime_format=None):
+    df = df.copy()
+    kinds = {}
+    for name in df.columns:
+        kind = schema.get(name, 'string')
+        column = df[name]
+        if kind in ('int64', 'int32'):
+            # 已是数值类型的列按原样转换：可空浮点类型中 NaN 不算缺失值，转换为整数时会出错
+            if pd.api.types.is_numeric_dtype(column):
+                numbers = pd.to_numeric(column, errors='coerce')
+            else:
+                numbers = pd.to_numeric(column.replace('', np.nan), errors='coerce', dtype_backend='numpy_nullable')
+            if (numbers.isna() & column.notna() & (column != '')).any() or (numbers.dropna() % 1 != 0).any():
+                kind = 'string'
+            else:
+                df[name] = numbers.astype('Int64' if kind == 'int64' else 'Int32')
+        elif kind == 'float':
+            df[name] = pd.to_numeric(column, errors='coerce')
+        elif kind == 'datetime':
+            df[name] = pd.to_datetime(column, format=datetime_format, errors='coerce')
+        elif kind == 'category':
+            df[name] = column.astype('category')
+        kinds[name] = kind
+    return df, kinds
+
+def save_frame(df, path, schema=None, datetime_format=None):
+    df, kinds = coerce_frame(df, schema or {}, datetime_format)
+    arrays = {}
+    for name, kind in kinds.items():
+        column = df[name]
+        if kind in ('int64', 'int32'):
+            arrays[f'{name}.values'] = column.fillna(0).to_numpy(dtype=kind)
+            if column.isna().any():
+                arrays[f'{name}.null'] = column.isna().to_numpy()
+        elif kind == 'float':
+            arrays[f'{name}.values'] = column.to_numpy(dtype=np.float64)
+        elif kind == 'datetime':
+            arrays[f'{name}.values'] = column.to_numpy(dtype='datetime64[s]')
+        elif kind == 'category':
+            arrays[f'{name}.codes'] = column.cat.codes.to_numpy(dtype=np.int32)
+            data, offsets = _encode_strings(column.cat.categories)
+            arrays[f'{name}.categories.data'] = data
+            arrays[f'{name}.categories.offsets'] = offsets
+        else:
+            data, offsets = _encode_strings(column.tolist())
+            arrays[f'{name}.data'] = data
+            arrays[f'{name}.offsets'] = offsets
+
+    meta = {'version': FORMAT_VERSION, 'rows': len(df), 'columns': kinds}
+    arrays['__meta__'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+    # 先写临时文件再替换；np.savez 会自动追加 .npz 后缀，所以用文件对象写入
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+def read_meta(path):
+    with np.load(path) as npz:
+        return json.loads(npz['__meta__'].tobytes().decode('utf-8'))
+
+# columns 只读取指定的列（不存在的列会被忽略）
+def load_frame(path, columns=None):
+    with np.load(path) as npz:
+        meta = json.loads(npz['__meta__'].tobytes().decode('utf-8'))
+        kinds = meta['columns']
+        names = [name for name in (columns if columns is not None else kinds) if name in kinds]
+
+        data = {}
+        for name in names:
+            kind = kinds[name]
+            if kind in ('int64', 'int32'):
+                values = npz[f'{name}.values']
+                if f'{name}.null' in npz.files:
+                    values = pd.array(values, dtype='Int64' if kind == 'int64' else 'Int32')
+                    values[npz[f'{name}.null']] = pd.NA
+                data[name] = values
+            elif kind in ('float', 'datetime'):
+                data[name] = npz[f'{name}.values']
+            elif kind == 'category':
+                categories = _decode_strings(npz[f'{name}.categories.data'], npz[f'{name}.categories.offsets'])
+                data[name] = pd.Categorical.from_codes(npz[f'{name}.codes'], categories=categories)
+            else:
+                data[name] = _decode_strings(npz[f'{name}.data'], npz[f'{name}.offsets'])
+
+    return pd.DataFrame(data, index=pd.RangeIndex(meta['rows']), columns=names)
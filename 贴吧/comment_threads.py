@@ -0,0 +1,179 @@
+# 评论回复树：按 parent_comment_id 把评论还原成楼中楼回复树
+# 树以数组形式保存（每条评论一个下标），不为节点创建 Python 对象，也不递归，可以处理上千万条评论：
+#   parent  父评论的下标，顶层评论为 -1
+#   root    所在楼层（顶层评论）的下标
+#   depth   回复深度，顶层评论为 0
+# 父评论不在数据中（未爬取或属于其他帖子）的回复按顶层评论处理，数量记在 orphans 中
+
+import os
+
+import numpy as np
+import pandas as pd
+
+class CommentThreads:
+    def __init__(self, comment_ids, note_ids, parent, publish_seconds=None, sub_comment_counts=None, orphans=0):
+        n = len(parent)
+        index_dtype = np.int32 if n < 2 ** 31 else np.int64
+        self.comment_ids = np.asarray(comment_ids)
+        self.note_codes, self.notes = pd.factorize(np.asarray(note_ids))
+        self.note_codes = self.note_codes.astype(index_dtype)
+        self.parent = np.asarray(parent, dtype=index_dtype)
+        self.publish_seconds = publish_seconds  # 发布时间（Unix秒，缺失为 NaN）
+        self.sub_comment_counts = sub_comment_counts  # 爬虫记录的楼中楼回复数
+        self.orphans = orphans
+        self.root, self.depth = _resolve_roots(self.parent)
+
+    # 一遍建立 ID → 下标 的哈希索引，再按下标查出每条评论的父评论
+    @classmethod
+    def build(cls, comment_ids, parent_ids, note_ids, publish_times=None, sub_comment_counts=None):
+        comment_ids = pd.Series(comment_ids).to_numpy()
+        parent_ids = pd.Series(parent_ids)
+        index = pd.Index(comment_ids)
+        if not index.is_unique:
+            raise ValueError('comment_id 有重复，请先去重')
+
+        has_parent = parent_ids.notna()
+        has_parent &= parent_ids != ('' if not pd.api.types.is_numeric_dtype(parent_ids) else 0)
+        has_parent = has_parent.to_numpy(dtype=bool)
+        parent = index.get_indexer(parent_ids.to_numpy())
+        parent[~has_parent] = -1
+
+        # 回复和父评论必须属于同一个帖子；自己回复自己的视为顶层评论
+        note_codes = pd.factorize(pd.Series(note_ids).to_numpy())[0]
+        linked = parent >= 0
+        invalid = linked & ((note_codes[parent] != note_codes) | (parent == np.arange(len(parent))))
+        parent[invalid] = -1
+        orphans = int((has_parent & (parent < 0)).sum())
+
+        publish_seconds = None
+        if publish_times is not None:
+            publish_times = pd.to_datetime(pd.Series(publish_times), format='%Y-%m-%d %H:%M', errors='coerce')
+            publish_seconds = publish_times.to_numpy(dtype='datetime64[s]').astype(np.int64).astype(float)
+            publish_seconds[publish_times.isna().to_numpy()] = np.nan
+        if sub_comment_counts is not None:
+            sub_comment_counts = pd.to_numeric(pd.Series(sub_comment_counts), errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        return cls(comment_ids, pd.Series(note_ids).to_numpy(), parent, publish_seconds, sub_comment_counts, orphans)
+
+    def __len__(self):
+        return len(self.parent)
+
+    # 每条评论的直接回复数
+    def direct_replies(self):
+        return np.bincount(self.parent[self.parent >= 0], minlength=len(self))
+
+    # 每条评论下的回复总数（所有后代）：从最深一层开始逐层累加到父评论，循环次数等于最大深度
+    def descendants(self):
+        counts = np.zeros(len(self), dtype=np.int64)
+        order = np.argsort(self.depth, kind='stable')
+        bounds = np.searchsorted(self.depth[order], np.arange(self.max_depth() + 2))
+        for level in range(self.max_depth(), 0, -1):
+            nodes = order[bounds[level]:bounds[level + 1]]
+            np.add.at(counts, self.parent[nodes], counts[nodes] + 1)
+        return counts
+
+    def max_depth(self):
+        return int(self.depth.max()) if len(self) else 0
+
+    # 回复延迟（秒）：回复与其父评论的发布时间之差，缺少时间的回复不计入
+    def reply_latency(self):
+        if self.publish_seconds is None:
+            return np.zeros(0)
+        replies = np.flatnonzero(self.parent >= 0)
+        latency = self.publish_seconds[replies] - self.publish_seconds[self.parent[replies]]
+        return latency[~np.isnan(latency)]
+
+    # 每个楼层一行：楼层评论ID、帖子、评论数（含楼层本身）、深度、宽度（同一深度上最多的评论数）
+    # 按 (楼层, 深度) 计数后排序，每个楼层的各层评论数连续排列，用 reduceat 求每个楼层的最大值
+    def thread_table(self):
+        columns = ['comment_id', 'note_id', 'size', 'depth', 'breadth']
+        if len(self) == 0:
+            return pd.DataFrame(columns=columns, index=pd.Index([], name='row'))
+
+        levels = self.max_depth() + 1
+        keys, level_sizes = np.unique(self.root.astype(np.int64) * levels + self.depth, return_counts=True)
+        key_roots = keys // levels
+        starts = np.flatnonzero(np.diff(key_roots, prepend=-1))
+        roots = key_roots[starts]
+        return pd.DataFrame({
+            'comment_id': self.comment_ids[roots],
+            'note_id': self.notes[self.note_codes[roots]],
+            'size': np.add.reduceat(level_sizes, starts),
+            'depth': np.maximum.reduceat(keys % levels, starts),
+            'breadth': np.maximum.reduceat(level_sizes, starts),
+        }, index=pd.Index(roots, name='row'), columns=columns)
+
+    # 每个帖子一行：楼层数、评论数、回复数、最大深度、最大宽度、回复延迟中位数（秒）
+    def post_table(self):
+        threads = self.thread_table()
+        table = threads.groupby('note_id', sort=False).agg(
+            threads=('size', 'size'), comments=('size', 'sum'), max_depth=('depth', 'max'), max_breadth=('breadth', 'max'))
+        table['replies'] = table['comments'] - table['threads']
+
+        replies = np.flatnonzero(self.parent >= 0)
+        if self.publish_seconds is not None and len(replies):
+            latency = pd.Series(self.publish_seconds[replies] - self.publish_seconds[self.parent[replies]],
+                                index=self.notes[self.note_codes[replies]])
+            table['median_latency'] = latency.groupby(level=0).median().reindex(table.index)
+        else:
+            table['median_latency'] = np.nan
+        return table.sort_values('comments', ascending=False, kind='stable')
+
+    # 每个帖子回复最多的 n 条评论；回复数取还原出的直接回复数和爬虫记录的楼中楼回复数中较大的一个
+    # （只爬取了楼层、没有爬取楼中楼时，后者是唯一的回复数来源）
+    def top_replied(self, n=3):
+        direct = self.direct_replies()
+        reply_count = direct if self.sub_comment_counts is None else np.maximum(direct, self.sub_comment_counts)
+        table = pd.DataFrame({
+            'note_id': self.notes[self.note_codes],
+            'comment_id': self.comment_ids,
+            'direct_replies': direct,
+            'descendants': self.descendants(),
+            'reply_count': reply_count,
+        })
+        table = table[table['reply_count'] > 0].sort_values('reply_count', ascending=False, kind='stable')
+        return table.groupby('note_id', sort=False).head(n)
+
+    def save(self, path):
+        arrays = {
+            'comment_ids': _plain_array(self.comment_ids),
+            'notes': _plain_array(self.notes),
+            'note_codes': self.note_codes,
+            'parent': self.parent,
+            'orphans': np.array(self.orphans),
+        }
+        if self.publish_seconds is not None:
+            arrays['publish_seconds'] = self.publish_seconds
+        if self.sub_comment_counts is not None:
+            arrays['sub_comment_counts'] = self.sub_comment_counts
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as npz:
+            notes = npz['notes']
+            return cls(npz['comment_ids'], notes[npz['note_codes']], npz['parent'],
+                       npz['publish_seconds'] if 'publish_seconds' in npz.files else None,
+                       npz['sub_comment_counts'] if 'sub_comment_counts' in npz.files else None,
+                       int(npz['orphans']))
+
+# ID 为字符串时保存为定长 Unicode 数组，避免 .npz 中出现需要 pickle 的对象数组
+def _plain_array(values):
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+# 指针跳跃：每轮让每个节点指向"祖先的祖先"并累加距离，轮数为 log2(最大深度)，全部为向量运算
+# 若干轮后仍未到达顶层评论说明回复关系中有环
+def _resolve_roots(parent):
+    n = len(parent)
+    rows = np.arange(n, dtype=parent.dtype)
+    jump = np.where(parent >= 0, parent, rows)
+    depth = (parent >= 0).astype(np.int32)
+    for _ in range(max(n, 1).bit_length() + 1):
+        if (parent[jump] < 0).all():
+            return jump, depth
+        depth = depth + depth[jump]
+        jump = jump[jump]
+    raise ValueError('评论回复关系中存在环')
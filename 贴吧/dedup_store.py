@@ -0,0 +1,151 @@
+# 去重索引：同一ID只保留 last_modify_ts 最新的版本
+# MemoryDedupIndex 在内存中保存记录；DedupStore 保存在 SQLite 文件中，可跨运行使用，
+# ID 数量达到千万级也不需要在Python中保存全部ID
+# 两者接口相同：add_batch 返回本批新增的记录和被新版本替换的 (旧记录, 新记录)
+# DedupStore(autocommit=False) 时 add_batch 不提交，由调用方在保存完相关结果后调用 commit，
+# 出错时 rollback（或不提交直接关闭），索引回到上次提交时的内容
+
+import json
+import sqlite3
+
+# 同一批内先按ID保留最新版本，items 为 (key, last_modify_ts, record)
+def _latest_per_key(items):
+    latest = {}
+    for key, ts, record in items:
+        current = latest.get(key)
+        if current is None or ts > current[0]:
+            latest[key] = (ts, record)
+    return latest
+
+class MemoryDedupIndex:
+    def __init__(self):
+        self._records = {}
+
+    def add_batch(self, kind, items):
+        records = self._records.setdefault(kind, {})
+        inserted = []
+        updated = []
+        for key, (ts, record) in _latest_per_key(items).items():
+            current = records.get(key)
+            if current is None:
+                inserted.append(record)
+            elif ts > current[0]:
+                updated.append((current[1], record))
+            else:
+                continue
+            records[key] = (ts, record)
+        return inserted, updated
+
+    # 按ID首次出现的顺序产出每个ID的最新记录
+    def iter_records(self, kind):
+        for ts, record in self._records.get(kind, {}).values():
+            yield record
+
+    def count(self, kind):
+        return len(self._records.get(kind, {}))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class DedupStore:
+    _LOOKUP_CHUNK = 500  # SQLite 单条语句的参数个数有限制，分块查询
+
+    def __init__(self, path, autocommit=True):
+        self.path = path
+        self.autocommit = autocommit
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS records (
+                kind TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                last_modify_ts INTEGER NOT NULL,
+                record TEXT NOT NULL,
+                PRIMARY KEY (kind, record_id)
+            )
+        ''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.conn.commit()
+
+    def _lookup(self, kind, keys):
+        existing = {}
+        for start in range(0, len(keys), self._LOOKUP_CHUNK):
+            chunk = keys[start:start + self._LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT record_id, last_modify_ts, record FROM records WHERE kind = ? AND record_id IN ({placeholders})',
+                [kind, *chunk])
+            for record_id, ts, record in rows:
+                existing[record_id] = (ts, record)
+        return existing
+
+    def add_batch(self, kind, items):
+        latest = {str(key): value for key, value in _latest_per_key(items).items()}
+        existing = self._lookup(kind, list(latest))
+
+        inserted = []
+        updated = []
+        rows = []
+        for key, (ts, record) in latest.items():
+            current = existing.get(key)
+            if current is None:
+                inserted.append(record)
+            elif ts > current[0]:
+                updated.append((json.loads(current[1]), record))
+            else:
+                continue
+            rows.append((kind, key, ts, json.dumps(record, ensure_ascii=False)))
+
+        # 已存在的ID原地更新，rowid 不变，iter_records 的顺序保持为首次出现的顺序
+        self.conn.executemany('''
+            INSERT INTO records (kind, record_id, last_modify_ts, record) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kind, record_id) DO UPDATE SET
+                last_modify_ts = excluded.last_modify_ts,
+                record = excluded.record
+            WHERE excluded.last_modify_ts > records.last_modify_ts
+        ''', rows)
+        if self.autocommit:
+            self.conn.commit()
+        return inserted, updated
+
+    # 与记录一起提交的附加信息（值保存为JSON）
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        if self.autocommit:
+            self.conn.commit()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def iter_records(self, kind):
+        cursor = self.conn.execute('SELECT record FROM records WHERE kind = ? ORDER BY rowid', (kind,))
+        for (record,) in cursor:
+            yield json.loads(record)
+
+    def count(self, kind):
+        return self.conn.execute('SELECT COUNT(*) FROM records WHERE kind = ?', (kind,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
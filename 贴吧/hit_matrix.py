@@ -0,0 +1,72 @@
+# 记录 × 类别的稀疏命中矩阵（CSR）：第 i 条记录命中的类别编号为 indices[indptr[i]:indptr[i + 1]]（升序、不重复）
+# 每次命中只占一个整数，按类别计数、取每条记录的命中、按类别取命中的记录都是数组运算
+
+from lazy_module import LazyModule
+
+# analyze_game_data 在启动时导入本模块，numpy 在第一次使用时才加载（report 子命令不需要）
+np = LazyModule('numpy')
+
+class HitMatrix:
+    def __init__(self, indptr, indices, labels):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.labels = list(labels)
+        self._by_label = None
+
+    # rows / codes 为等长的 (记录序号, 类别编号) 数组，可以重复、无序
+    @classmethod
+    def from_pairs(cls, rows, codes, n_rows, labels):
+        rows = np.asarray(rows, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int64)
+        keys = np.unique(rows * len(labels) + codes)
+        rows, codes = keys // max(len(labels), 1), keys % max(len(labels), 1)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, codes, labels)
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.labels)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    # 每条记录的命中数
+    def row_counts(self):
+        return np.diff(self.indptr)
+
+    # 展开为 (记录序号, 类别编号)，按记录排序
+    def pairs(self):
+        return np.repeat(np.arange(self.shape[0]), self.row_counts()), self.indices
+
+    # 每个类别命中的记录数；rows 为布尔数组时只统计其中为 True 的记录
+    def counts(self, rows=None):
+        indices = self.indices if rows is None else self.indices[np.repeat(np.asarray(rows), self.row_counts())]
+        return np.bincount(indices, minlength=len(self.labels))
+
+    # {类别: 记录数}，只含命中过的类别，按类别首次被命中的顺序（记录顺序）排列
+    def label_counts(self):
+        codes, first = np.unique(self.indices, return_index=True)
+        counts = self.counts()
+        return {self.labels[code]: int(counts[code]) for code in codes[np.argsort(first, kind='stable')]}
+
+    # 每条记录命中的类别（元组）
+    def row_labels(self):
+        labels = np.asarray(self.labels, dtype=object)
+        names = labels[self.indices].tolist()
+        bounds = self.indptr.tolist()
+        return [tuple(names[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    # 按类别排序的转置（CSC）：命中第 code 个类别的记录为 rows[offsets[code]:offsets[code + 1]]
+    def by_label(self):
+        if self._by_label is None:
+            rows, codes = self.pairs()
+            order = np.argsort(codes, kind='stable')
+            offsets = np.searchsorted(codes[order], np.arange(len(self.labels) + 1))
+            self._by_label = offsets, rows[order]
+        return self._by_label
+
+    def rows(self, code):
+        offsets, rows = self.by_label()
+        return rows[offsets[code]:offsets[code + 1]]
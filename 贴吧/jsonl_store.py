@@ -0,0 +1,119 @@
+# 流式 JSONL 读写：每行一条记录，记录逐条编码、按块写出，不在内存中拼出整个文档
+# 可选压缩：zstd（需要安装 zstandard）或 gzip，按文件后缀区分：.jsonl / .jsonl.gz / .jsonl.zst
+# 读取时逐行解析，按需产出记录；也能读取旧版的 JSON 数组文件（.json，一次性加载）
+
+import gzip
+import io
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIXES = {'zstd': '.jsonl.zst', 'gzip': '.jsonl.gz', 'none': '.jsonl'}
+LEGACY_SUFFIX = '.json'
+
+# auto：安装了 zstandard 时用 zstd，否则用 gzip
+def resolve_compression(compression='auto'):
+    if compression == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('zstd 压缩需要安装 zstandard（pip install zstandard）')
+    if compression not in SUFFIXES:
+        raise ValueError(f'未知的压缩方式: {compression}')
+    return compression
+
+def _compression_of(path):
+    for compression, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return 'none'
+
+def _open_binary(path, mode, compression):
+    if compression == 'gzip':
+        # 压缩级别1比默认的9只大约一成，写入快几倍，压缩不会成为写出的瓶颈
+        return gzip.open(path, mode, compresslevel=1)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError(f'读取 {path} 需要安装 zstandard（pip install zstandard）')
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, mode)
+
+class JsonlWriter:
+    # path 不含后缀，后缀由压缩方式决定（见 self.path）；先写临时文件，close 时替换
+    def __init__(self, path, compression='auto', chunk_size=1000):
+        self.compression = resolve_compression(compression)
+        self.path = path + SUFFIXES[self.compression]
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._tmp_path = self.path + '.tmp'
+        self._file = _open_binary(self._tmp_path, 'wb', self.compression)
+        self._lines = []
+
+    def write(self, record):
+        self._lines.append(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+        if len(self._lines) >= self.chunk_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    # 边写边把记录原样传下去，用于在流水线中间落盘
+    def tee(self, records):
+        for record in records:
+            self.write(record)
+            yield record
+
+    def flush(self):
+        if self._lines:
+            self._file.write(('\n'.join(self._lines) + '\n').encode('utf-8'))
+            self._lines = []
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    # 出错时丢弃临时文件，保留之前的输出
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+# 逐条读取记录；path 可以是 JSONL（含压缩）或旧版 JSON 数组文件
+def iter_jsonl(path):
+    if path.endswith(LEGACY_SUFFIX):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+
+    with _open_binary(path, 'rb', _compression_of(path)) as raw:
+        for line in io.TextIOWrapper(raw, encoding='utf-8'):
+            if line.strip():
+                yield json.loads(line)
+
+# base 为不含后缀的路径；多种格式的文件同时存在时取最近写入的一个，都不存在时返回 None
+def find_output(base):
+    candidates = [base + suffix for suffix in list(SUFFIXES.values()) + [LEGACY_SUFFIX]]
+    existing = [path for path in candidates if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else None
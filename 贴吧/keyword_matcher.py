@@ -0,0 +1,147 @@
+# 多模式关键词匹配（Aho-Corasick 自动机）
+# 所有关键词编译进一个自动机，每段文本只需线性扫描一遍即可找出全部命中的关键词
+# 安装了 pyahocorasick 时使用其C实现，否则退回纯Python实现，两者结果一致（纯Python实现约慢3倍）
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+NATIVE_AVAILABLE = ahocorasick is not None
+
+class KeywordMatcher:
+    def __init__(self, keywords, use_native=True):
+        # 去重并保持原有顺序
+        self.keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self._native = None
+        self._lengths = None
+
+        if use_native and ahocorasick is not None:
+            if self.keywords:
+                automaton = ahocorasick.Automaton()
+                for index, keyword in enumerate(self.keywords):
+                    automaton.add_word(keyword, index)
+                automaton.make_automaton()
+                self._native = automaton
+            return
+
+        self._build()
+
+    # 构建 goto / fail / output 表
+    def _build(self):
+        goto = [{}]
+        output = [[]]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append([])
+                state = next_state
+            output[state].append(index)
+
+        # 按层次（BFS）计算失配指针，并合并后缀状态的输出
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                if fail[next_state] == next_state:
+                    fail[next_state] = 0
+                output[next_state] = output[next_state] + output[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = [tuple(indexes) for indexes in output]
+
+    # 依次产出 (结束位置, 关键词序号)
+    def iter_matches(self, text):
+        if self._native is not None:
+            return self._native.iter(text)
+        return self._iter_python(text)
+
+    def _iter_python(self, text):
+        if not text or not self.keywords:
+            return
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position, index
+
+    # 是否命中任意关键词（命中即停止扫描）
+    def search(self, text):
+        for _ in self.iter_matches(text):
+            return True
+        return False
+
+    # 文本中命中的全部关键词（按关键词定义顺序）
+    def find_all(self, text):
+        indexes = {index for _, index in self.iter_matches(text)}
+        return [self.keywords[index] for index in sorted(indexes)]
+
+    # 批量匹配，返回与 texts 一一对应的命中关键词列表，便于核查筛选结果
+    def match_batch(self, texts):
+        return [self.find_all(text) for text in texts]
+
+    # 大量短文本：用分隔符拼接后只扫描一遍，避免逐条调用的开销
+    # 返回三个等长的 numpy 数组：文本序号、关键词序号、命中结束位置（相对于该文本）
+    # lower=True 时拼接后整体转小写；个别字符转小写后长度会变化，这时改为逐条转换
+    def match_arrays(self, texts, separator='\x00', lower=False):
+        import numpy as np
+
+        texts = list(texts)
+        joined = separator.join(texts)
+        if lower:
+            lowered = joined.lower()
+            if len(lowered) != len(joined):
+                texts = [text.lower() for text in texts]
+                lowered = separator.join(texts)
+            joined = lowered
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        ends = np.cumsum(lengths + len(separator))  # 每段文本（含分隔符）在拼接文本中的结束位置
+        matches = list(self.iter_matches(joined))
+        if not matches:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        positions, indexes = np.array(matches, dtype=np.int64).T
+        rows = np.searchsorted(ends, positions, side='right')
+        starts = ends[rows] - lengths[rows] - len(separator)
+        return rows, indexes, positions - starts
+
+    # 最长匹配：去掉被同一文本中更长的命中覆盖的命中（如“塞尔达传说”中的“塞尔达”）
+    # 参数为 match_arrays 的结果；给出 eligible 时只在其为 True 的命中之间比较，其余命中都保留
+    # 返回表示是否保留的布尔数组
+    def longest_matches(self, rows, indexes, ends, eligible=None):
+        import numpy as np
+
+        keep = np.ones(len(rows), dtype=bool)
+        candidates = np.arange(len(rows)) if eligible is None else np.flatnonzero(eligible)
+        if len(candidates) < 2:
+            return keep
+        if self._lengths is None:
+            self._lengths = np.fromiter((len(keyword) for keyword in self.keywords), dtype=np.int64, count=len(self.keywords))
+
+        rows = rows[candidates]
+        ends = ends[candidates]
+        lengths = self._lengths[indexes[candidates]]
+        # 按 (文本, 起点, 长度从长到短) 排序后，终点不超过之前命中的最远终点的命中被覆盖
+        order = np.lexsort((-lengths, ends - lengths, rows))
+        reach = rows[order] * (int(ends.max()) + 2) + ends[order]
+        covered = np.r_[False, reach[1:] <= np.maximum.accumulate(reach)[:-1]]
+        keep[candidates[order[covered]]] = False
+        return keep
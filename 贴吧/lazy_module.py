@@ -0,0 +1,26 @@
+# 延迟导入：模块在第一次访问其属性时才真正导入
+# pandas / numpy / matplotlib 的导入需要零点几秒到一秒，只打印统计结果时不需要加载它们
+
+import importlib
+
+class LazyModule:
+    # setup 在模块导入后调用一次（例如设置 matplotlib 的字体）
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._setup is not None:
+                self._setup(module)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
@@ -0,0 +1,205 @@
+# 运行指标：按阶段记录墙钟时间、CPU时间、峰值内存（RSS）和输入/输出记录数，追加写入JSONL文件
+# 每行一条记录，同一次运行的记录 run_id 相同；阶段名用 / 表示层级，例如 analyze/4.3 帖子回复数分析
+# 另外可以对某一个阶段开启采样分析器，按固定间隔采集主线程的调用栈
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 进程启动以来的峰值RSS（字节），无法获取时返回 None
+def peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+# 已结束的子进程（进程池）消耗的CPU时间
+def children_cpu_time():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def _megabytes(value):
+    return round(value / (1 << 20), 2) if value is not None else None
+
+# 采样分析器：后台线程每隔 interval 秒记录一次目标线程的调用栈
+# 结果为折叠栈格式（每行"调用栈 次数"，可直接用 flamegraph.pl / speedscope 查看）
+class StackSampler:
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+    # 按自身耗时（位于栈顶的采样数）排序的函数
+    def top_functions(self, n=15):
+        leaf_counts = Counter()
+        for stack, count in self.samples.items():
+            leaf_counts[stack.rsplit(';', 1)[-1]] += count
+        return leaf_counts.most_common(n)
+
+class MetricsRecorder:
+    def __init__(self):
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.records = []
+        self.profile_stage = None
+        self.profile_dir = None
+        self.profile_interval = 0.005
+        self.profile_path = None
+
+    # 对名为 stage 的阶段开启采样分析，结果写入 output_dir
+    def enable_profile(self, stage, output_dir, interval=0.005):
+        self.profile_stage = stage
+        self.profile_dir = output_dir
+        self.profile_interval = interval
+
+    def _start(self, name, records_in=None):
+        span = {
+            'run_id': self.run_id,
+            'stage': name,
+            'started': datetime.now().isoformat(timespec='milliseconds'),
+            'records_in': records_in,
+            'records_out': None,
+            '_wall': time.perf_counter(),
+            '_cpu': time.process_time(),
+            '_children_cpu': children_cpu_time(),
+            '_peak_rss': peak_rss(),
+            '_sampler': None,
+        }
+        if name == self.profile_stage:
+            span['_sampler'] = StackSampler(self.profile_interval)
+            span['_sampler'].start()
+        return span
+
+    def _finish(self, span, status='ok'):
+        sampler = span.pop('_sampler')
+        wall = time.perf_counter() - span.pop('_wall')
+        cpu = time.process_time() - span.pop('_cpu')
+        children_start = span.pop('_children_cpu')
+        rss_start = span.pop('_peak_rss')
+        children_end = children_cpu_time()
+        rss_end = peak_rss()
+
+        span.update({
+            'status': status,
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(cpu, 6),
+            'children_cpu_seconds': round(children_end - children_start, 6) if children_start is not None else None,
+            'peak_rss_mb': _megabytes(rss_end),
+            'peak_rss_growth_mb': _megabytes(rss_end - rss_start) if rss_start is not None else None,
+        })
+        self.records.append(span)
+
+        if sampler is not None:
+            sampler.stop()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            safe_name = span['stage'].replace('/', '_').replace(' ', '_')
+            self.profile_path = os.path.join(self.profile_dir, f"profile-{self.run_id}-{safe_name}.txt")
+            sampler.write(self.profile_path)
+            print(f"\n采样分析（{span['stage']}，共{sum(sampler.samples.values())}次采样）：")
+            for function, count in sampler.top_functions():
+                print(f"{count:>6}  {function}")
+            print(f"调用栈已保存到 {self.profile_path}")
+        return span
+
+    # 记录一个阶段；可以在阶段内设置 span['records_out']
+    @contextmanager
+    def stage(self, name, records_in=None):
+        span = self._start(name, records_in)
+        try:
+            yield span
+        except BaseException:
+            self._finish(span, 'error')
+            raise
+        self._finish(span)
+
+    # 连续的小节：每次调用 next 时结束上一个小节并开始新的小节，适合给长函数分段计时
+    def sections(self, prefix):
+        return SectionTimer(self, prefix)
+
+    # 直接加入在其他地方测量好的记录（如进程池中绘制的图表）
+    def add(self, name, **values):
+        record = {'run_id': self.run_id, 'stage': name, 'status': 'ok'}
+        record.update(values)
+        self.records.append(record)
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.records = []
+
+class SectionTimer:
+    def __init__(self, recorder, prefix):
+        self.recorder = recorder
+        self.prefix = prefix
+        self.current = None
+
+    def next(self, name, records_in=None):
+        self.close()
+        self.current = self.recorder._start(f'{self.prefix}/{name}', records_in)
+        return self.current
+
+    def close(self):
+        if self.current is not None:
+            self.recorder._finish(self.current)
+            self.current = None
+
+# 在当前进程中测量一段工作的耗时和内存，返回可以交给 MetricsRecorder.add 的字段（用于子进程）
+@contextmanager
+def measure_work(values):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield values
+    finally:
+        values['wall_seconds'] = round(time.perf_counter() - wall, 6)
+        values['cpu_seconds'] = round(time.process_time() - cpu, 6)
+        values['peak_rss_mb'] = _megabytes(peak_rss())
@@ -0,0 +1,138 @@
+# 近似重复检测：MinHash 签名 + LSH 分段，不做两两比较
+# 文本去掉空白后按字符切成 n-gram，每个 n-gram 哈希为64位值，高位决定落入 num_perm 个桶中的哪一个，
+# 低32位在每个桶内取最小值（单次置换 MinHash，每个 n-gram 只哈希一次，而不是 num_perm 次）；
+# 空桶取其后第一个非空桶的值（循环），得到每条文本的签名；
+# 两条文本签名中相同位置的比例近似其 Jaccard 相似度
+# 签名切成 bands 段，每段 rows 个值；某一段完全相同的两条文本成为候选（按段排序后相邻比较），
+# 候选再用签名确认相似度不低于 threshold，确认的文本并为一簇（传递闭包），簇中最早出现的文本为代表
+# 去掉空白后短于 min_length 个字符的文本（“1”“啥游戏？”这类常见短评论）不参与比较
+# 每条文本只保存签名（num_perm × 4 字节），分段、排序和合并都是数组运算，可以处理上百万条文本
+
+import numpy as np
+
+_PRIME = np.uint32(1000003)  # n-gram 多项式哈希的底数
+_MAX = np.iinfo(np.uint32).max
+
+# splitmix64 的混合函数：把 n-gram 的32位哈希打散为64位
+def _mix64(values, seed):
+    x = values.astype(np.uint64) + np.uint64((seed * 0x9E3779B97F4A7C15) % 2 ** 64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+# 在 threshold 处成为候选的概率不低于 recall 的分段方式中取每段最长的（候选最少）；
+# 相似度为 s 的两条文本成为候选的概率为 1 - (1 - s^rows)^bands
+def choose_bands(num_perm, threshold, recall=0.99):
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+class MinHasher:
+    def __init__(self, num_perm=64, ngram=3, min_length=10, seed=0):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.min_length = max(min_length, 1)
+        self.seed = seed
+
+    # 一批文本的签名，形状为 (len(texts), num_perm)；过短的文本签名全为最大值，skipped 中对应位置为 True
+    def signatures(self, texts):
+        texts = [''.join(text.split()) if text else '' for text in texts]
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        signatures = np.full((len(texts), self.num_perm), _MAX, dtype=np.uint32)
+        skipped = lengths < self.min_length
+        if skipped.all():
+            return signatures, skipped
+
+        # 所有文本的字符拼成一个数组；不足 n 个字符的文本整条作为一个 n-gram
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+        ends = np.cumsum(lengths)
+        counts = np.where(skipped, 0, np.maximum(lengths - self.ngram + 1, 1))
+        owners = np.repeat(np.arange(len(texts)), counts)
+        offsets = np.cumsum(counts) - counts
+        starts = (ends - lengths)[owners] + (np.arange(counts.sum()) - offsets[owners])
+        stops = ends[owners]
+
+        hashes = np.zeros(len(starts), dtype=np.uint32)
+        for i in range(self.ngram):
+            positions = starts + i
+            inside = positions < stops
+            hashes = hashes * _PRIME + np.where(inside, codes[np.minimum(positions, len(codes) - 1)], 0).astype(np.uint32)
+        hashes = _mix64(hashes, self.seed)
+
+        buckets = ((hashes >> np.uint64(32)) * np.uint64(self.num_perm)) >> np.uint64(32)
+        values = (hashes & np.uint64(_MAX)).astype(np.uint32)
+        np.minimum.at(signatures.reshape(-1), owners * self.num_perm + buckets.astype(np.int64), values)
+
+        # 空桶取其后（循环）第一个非空桶的值
+        rows = np.flatnonzero(~skipped)
+        filled = np.concatenate([signatures[rows], signatures[rows]], axis=1)
+        positions = np.where(filled != _MAX, np.arange(2 * self.num_perm), 2 * self.num_perm)
+        nearest = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :self.num_perm]
+        signatures[rows] = np.take_along_axis(filled, nearest, axis=1)
+        return signatures, skipped
+
+# 返回每条文本所在簇的代表（簇中最小的下标）；不与其他文本相似的文本代表为自身
+# skipped 为 True 的文本不参与比较
+def find_clusters(signatures, threshold=0.8, bands=None, skipped=None):
+    n, num_perm = signatures.shape
+    bands, rows = bands or choose_bands(num_perm, threshold)
+    candidates = np.arange(n) if skipped is None else np.flatnonzero(~skipped)
+    multipliers = np.random.default_rng(1).integers(1, 2 ** 63, rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    left, right = [], []
+    for band in range(bands):
+        # 每段的值合成一个64位键，键相同的文本按下标排序，段中每条文本与第一条比较
+        block = signatures[candidates, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (block * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.r_[True, keys[1:] != keys[:-1]]
+        leaders = order[np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))]
+        pairs = ~starts
+        left.append(candidates[leaders[pairs]])
+        right.append(candidates[order[pairs]])
+
+    # 多个分段给出的相同候选只确认一次
+    pairs = np.unique(np.concatenate(left) * n + np.concatenate(right))
+    left, right = pairs // n, pairs % n
+    similar = np.zeros(len(pairs), dtype=bool)
+    for start in range(0, len(pairs), 100000):
+        block = slice(start, start + 100000)
+        similar[block] = (signatures[left[block]] == signatures[right[block]]).mean(axis=1) >= threshold
+    left, right = left[similar], right[similar]
+
+    # 沿确认的边反复传播较小的下标，直到不再变化
+    parents = np.arange(n)
+    while len(left):
+        smaller = np.minimum(parents[left], parents[right])
+        updated = parents.copy()
+        np.minimum.at(updated, left, smaller)
+        np.minimum.at(updated, right, smaller)
+        updated = updated[updated]
+        if np.array_equal(updated, parents):
+            break
+        parents = updated
+    return parents
+
+# 流式使用：分批加入文本计算签名，全部加入后一次聚类
+class NearDuplicateDetector:
+    def __init__(self, threshold=0.8, num_perm=64, ngram=3, min_length=10, seed=0):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, ngram, min_length, seed)
+        self._signatures = []
+        self._skipped = []
+
+    def add_batch(self, texts):
+        signatures, skipped = self.hasher.signatures(texts)
+        self._signatures.append(signatures)
+        self._skipped.append(skipped)
+
+    def clusters(self):
+        if not self._signatures:
+            return np.zeros(0, dtype=np.int64)
+        return find_clusters(np.concatenate(self._signatures), self.threshold, skipped=np.concatenate(self._skipped))
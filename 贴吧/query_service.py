@@ -0,0 +1,244 @@
+# 本地查询服务：启动时从列式缓存加载帖子并提取一次特征，之后所有查询都在内存中的索引上完成
+# 只监听本机地址，不访问网络；返回JSON
+#
+#   python query_service.py --port 8765
+#   curl "http://127.0.0.1:8765/top_games?tieba=原神吧&days=7"
+#   curl "http://127.0.0.1:8765/trend?freq=month&game=原神"
+#   curl "http://127.0.0.1:8765/sentiment?game_type=手游"
+#
+# 查询：
+#   /top_games  热门游戏TOP-N（n 为正整数，默认10）
+#   /trend      帖子数和平均回复数的时间趋势（freq = day / month / hour / dayofweek，默认 day）
+#   /sentiment  情感分布（增强版五级和简单版三级）及平均情感得分
+#   /stats      数据规模和结果缓存命中情况
+# 过滤条件（三个查询通用）：tieba、game、game_type、since / until（日期或时间），
+# days（最近N天，以数据中最新的发布时间为准；与 since / until 同时给出时需同时满足）
+# 相同的查询直接从 LRU 结果缓存返回
+
+import argparse
+import json
+import math
+import os
+import sys
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import analyze_game_data as pipeline
+
+FILTERS = ['tieba', 'game', 'game_type', 'since', 'until', 'days']
+QUERY_PARAMS = {
+    'top_games': FILTERS + ['n'],
+    'trend': FILTERS + ['freq'],
+    'sentiment': FILTERS,
+}
+TREND_FREQS = ['day', 'month', 'hour', 'dayofweek']
+
+# 帖子特征的内存索引：每列一个 numpy 数组，字符串列编码为整数；
+# 帖子×游戏的命中关系取自游戏命中矩阵的转置（按游戏排序），每个游戏命中的帖子是其中连续的一段
+class PostIndex:
+    def __init__(self, df_contents, features, game_matrix):
+        self.size = len(df_contents)
+        tieba = df_contents['tieba_name'] if 'tieba_name' in df_contents.columns else pd.Series(pd.NA, index=df_contents.index)
+        self.tieba_codes, tiebas = pd.factorize(tieba.astype(object))
+        self.tiebas = {name: code for code, name in enumerate(tiebas)}
+        self.game_type_codes = features['game_type'].cat.codes.to_numpy()
+        self.level_codes = features['sentiment_level'].cat.codes.to_numpy()
+        self.sentiment_codes = features['sentiment'].cat.codes.to_numpy()
+
+        replies = df_contents['total_replay_num'] if 'total_replay_num' in df_contents.columns else pd.Series(np.nan, index=df_contents.index)
+        self.replies = pd.to_numeric(replies, errors='coerce').to_numpy(dtype=float)
+        publish_time = df_contents['publish_time'] if 'publish_time' in df_contents.columns else pd.Series(pd.NaT, index=df_contents.index)
+        publish_time = pd.to_datetime(publish_time, format=pipeline.PUBLISH_TIME_FORMAT, errors='coerce')
+        self.times = publish_time.to_numpy(dtype='datetime64[s]')
+        self.timed = ~np.isnat(self.times)
+        self.latest = self.times[self.timed].max() if self.timed.any() else None
+
+        self.games = {game: code for code, game in enumerate(pipeline.COMMON_GAMES)}
+        # 查询时游戏名不区分大小写，别名按对应的游戏查询
+        self._game_names = {game.lower(): code for game, code in self.games.items()}
+        self._game_names.update({alias.lower(): self.games[game] for alias, game in pipeline.GAME_ALIASES.items()})
+        self.game_offsets, self.hit_rows = game_matrix.by_label()
+        self.hit_games = np.repeat(np.arange(len(pipeline.COMMON_GAMES)), np.diff(self.game_offsets))
+
+    @classmethod
+    def from_cache(cls):
+        df_contents, _ = pipeline.load_processed_cache({'contents': pipeline.ANALYSIS_COLUMNS['contents'], 'comments': []})
+        return cls(df_contents, *pipeline.extract_features(df_contents))
+
+    @staticmethod
+    def _time(value, name):
+        try:
+            return np.datetime64(pd.Timestamp(value).to_datetime64(), 's')
+        except ValueError:
+            raise ValueError(f'{name} 不是有效的时间: {value}')
+
+    @staticmethod
+    def _days(value):
+        try:
+            days = float(value)
+        except (TypeError, ValueError, OverflowError):
+            days = math.nan
+        if not math.isfinite(days) or days < 0:
+            raise ValueError(f'days 必须是非负的有限数: {value}')
+        return days
+
+    # 满足过滤条件的帖子（布尔数组）
+    def select(self, tieba=None, game=None, game_type=None, since=None, until=None, days=None):
+        mask = np.ones(self.size, dtype=bool)
+        if tieba is not None:
+            mask &= self.tieba_codes == self.tiebas.get(tieba, -2)
+        if game_type is not None:
+            if game_type not in pipeline.GAME_TYPES:
+                raise ValueError(f"game_type 只能是 {'、'.join(pipeline.GAME_TYPES)}")
+            mask &= self.game_type_codes == pipeline.GAME_TYPES.index(game_type)
+        if game is not None:
+            game_mask = np.zeros(self.size, dtype=bool)
+            code = self._game_names.get(game.lower())
+            if code is not None:
+                game_mask[self.hit_rows[self.game_offsets[code]:self.game_offsets[code + 1]]] = True
+            mask &= game_mask
+        if days is not None:
+            days = self._days(days)
+            if self.latest is None:
+                return np.zeros(self.size, dtype=bool)
+            # 按秒数（浮点）比较，天数很大时不会溢出
+            mask &= self.timed & (self.times.astype(np.int64) >= self.latest.astype(np.int64) - days * 86400)
+        if since is not None or until is not None:
+            mask &= self.timed
+            if since is not None:
+                mask &= self.times >= self._time(since, 'since')
+            if until is not None:
+                mask &= self.times <= self._time(until, 'until')
+        return mask
+
+    def top_games(self, n=10, **filters):
+        try:
+            top_n = int(n)
+        except (TypeError, ValueError):
+            top_n = 0
+        if top_n < 1:
+            raise ValueError(f'n 必须是正整数: {n}')
+        mask = self.select(**filters)
+        counts = np.bincount(self.hit_games[mask[self.hit_rows]], minlength=len(pipeline.COMMON_GAMES))
+        order = np.argsort(-counts, kind='stable')[:top_n]
+        return {'posts': int(mask.sum()),
+                'games': [{'game': pipeline.COMMON_GAMES[code], 'posts': int(counts[code])} for code in order if counts[code] > 0]}
+
+    def trend(self, freq='day', **filters):
+        if freq not in TREND_FREQS:
+            raise ValueError(f"freq 只能是 {'、'.join(TREND_FREQS)}")
+        mask = self.select(**filters) & self.timed
+        times = self.times[mask]
+        if freq == 'day':
+            keys = times.astype('datetime64[D]').astype(str)
+        elif freq == 'month':
+            keys = times.astype('datetime64[M]').astype(str)
+        elif freq == 'hour':
+            keys = (times.astype(np.int64) // 3600 % 24)
+        else:
+            keys = (times.astype('datetime64[D]').astype(np.int64) + 3) % 7  # 1970-01-01 是星期四
+
+        keys, inverse = np.unique(keys, return_inverse=True)
+        replies = self.replies[mask]
+        has_replies = ~np.isnan(replies)
+        posts = np.bincount(inverse, minlength=len(keys))
+        reply_posts = np.bincount(inverse[has_replies], minlength=len(keys))
+        reply_sums = np.bincount(inverse[has_replies], weights=replies[has_replies], minlength=len(keys))
+        labels = [pipeline.DAY_NAMES[key] for key in keys] if freq == 'dayofweek' else keys.tolist()
+        return {'freq': freq, 'points': [
+            {'key': label, 'posts': int(count), 'avg_replies': round(total / replied, 2) if replied else None}
+            for label, count, replied, total in zip(labels, posts.tolist(), reply_posts.tolist(), reply_sums.tolist())]}
+
+    def sentiment(self, **filters):
+        mask = self.select(**filters)
+        total = int(mask.sum())
+        levels = np.bincount(self.level_codes[mask], minlength=len(pipeline.SENTIMENT_LEVELS))
+        labels = np.bincount(self.sentiment_codes[mask], minlength=len(pipeline.SENTIMENT_LABELS))
+        scores = np.array([pipeline.SENTIMENT_SCORES[level] for level in pipeline.SENTIMENT_LEVELS])
+        return {
+            'posts': total,
+            'levels': dict(zip(pipeline.SENTIMENT_LEVELS, levels.tolist())),
+            'labels': dict(zip(pipeline.SENTIMENT_LABELS, labels.tolist())),
+            'mean_score': round(float(levels @ scores) / total, 3) if total else None,
+        }
+
+class QueryService:
+    def __init__(self, index, cache_size=1024):
+        self.index = index
+        self._query = lru_cache(maxsize=cache_size)(self._run)
+
+    # params 为 (名称, 值) 的列表；排序后作为缓存键，参数顺序不同的相同查询共用结果
+    def query(self, name, params):
+        if name == 'stats':
+            info = self._query.cache_info()
+            return {'posts': self.index.size, 'latest': str(self.index.latest) if self.index.latest is not None else None,
+                    'cache': {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}}
+        if name not in QUERY_PARAMS:
+            raise LookupError(name)
+        params = dict(params)
+        unknown = set(params) - set(QUERY_PARAMS[name])
+        if unknown:
+            raise ValueError(f"未知的参数: {'、'.join(sorted(unknown))}")
+        return self._query(name, tuple(sorted(params.items())))
+
+    def _run(self, name, params):
+        return getattr(self.index, name)(**dict(params))
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，客户端可以复用同一个连接连续查询
+    disable_nagle_algorithm = True  # 响应头和正文分两次写出，不关闭 Nagle 算法时每个请求会多等待几十毫秒
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, body = 200, self.server.service.query(url.path.strip('/'), parse_qsl(url.query))
+        except LookupError:
+            status, body = 404, {'error': f'未知的查询: {url.path}', 'queries': list(QUERY_PARAMS) + ['stats']}
+        except ValueError as e:
+            status, body = 400, {'error': str(e)}
+
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def serve(service, host='127.0.0.1', port=8765, verbose=False):
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在本机提供分析结果的查询服务（JSON）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认只允许本机访问）')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-size', type=int, default=1024, help='LRU 结果缓存的条目数')
+    parser.add_argument('--verbose', action='store_true', help='打印每个请求')
+    args = parser.parse_args(argv)
+
+    if not all(os.path.exists(path) for path in pipeline.CACHE_PATHS.values()):
+        sys.exit("未找到处理后的数据缓存，请先运行 python analyze_game_data.py ingest")
+    print("正在加载数据并建立索引...")
+    index = PostIndex.from_cache()
+    server = serve(QueryService(index, args.cache_size), args.host, args.port, args.verbose)
+    print(f"已加载 {index.size} 个帖子，查询服务地址 http://{args.host}:{args.port}/（Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
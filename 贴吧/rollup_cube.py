@@ -0,0 +1,154 @@
+# 时间 × 维度汇总立方体：按 日期 × 小时 × 游戏类型 × 贴吧 × IP属地 预先汇总帖子数和回复数
+# 每个非空格子一行：维度存为整数编码（日期为1970-01-01起的天数，字符串维度为类别表中的序号），
+# 度量为帖子数、有回复数的帖子数、回复数之和、回复数平方和（可以得到均值和方差）
+# 按日、按月、按小时、按星期、按游戏类型的统计都在格子上再汇总得到，不需要重新解析时间；
+# 格子数不超过帖子数，实际远小于帖子数
+# 新数据只汇总新的部分再与已有格子合并；sign=-1 撤销之前加入的数据（记录被新版本替换时使用）
+
+import os
+
+import numpy as np
+import pandas as pd
+
+TIME_DIMENSIONS = ['date', 'hour']
+CATEGORY_DIMENSIONS = ['game_type', 'tieba_name', 'ip_location']
+DIMENSIONS = TIME_DIMENSIONS + CATEGORY_DIMENSIONS
+DERIVED_DIMENSIONS = {'month': 'date', 'dayofweek': 'date'}  # 由日期推出的维度
+MEASURES = ['count', 'reply_count', 'reply_sum', 'reply_sq']
+MISSING = -1  # 缺少发布时间或维度值（日期用 MISSING_DATE，避免与1969-12-31冲突）
+MISSING_DATE = np.iinfo(np.int32).min
+
+_DIMENSION_DTYPES = {'date': np.int32, 'hour': np.int8, 'game_type': np.int32, 'tieba_name': np.int32,
+                     'ip_location': np.int32}
+_MEASURE_DTYPES = {'count': np.int64, 'reply_count': np.int64, 'reply_sum': np.float64, 'reply_sq': np.float64}
+
+class RollupCube:
+    def __init__(self):
+        self.categories = {name: [] for name in CATEGORY_DIMENSIONS}
+        self._positions = {name: {} for name in CATEGORY_DIMENSIONS}
+        self.cells = _empty_cells()
+
+    def __len__(self):
+        return len(self.cells)
+
+    # 字符串维度编码为类别表中的序号，新出现的值追加到类别表末尾
+    def _encode(self, name, values):
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        positions = self._positions[name]
+        categories = self.categories[name]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            if value not in positions:
+                positions[value] = len(categories)
+                categories.append(value)
+            mapping[i] = positions[value]
+        return np.where(codes >= 0, mapping[codes] if len(mapping) else codes, MISSING).astype(np.int32)
+
+    # 加入（sign=-1 时撤销）一批帖子：publish_time 为时间，replies 为回复数（缺失为 NaN），
+    # dimensions 为 {维度名: 与帖子一一对应的值}，未给出的维度记为缺失；
+    # datetime_format 为字符串时间的格式（不给出时由 pandas 推断），不符合格式的时间记为缺失
+    def add(self, publish_time, replies, dimensions, sign=1, datetime_format=None):
+        publish_time = pd.to_datetime(pd.Series(publish_time), format=datetime_format, errors='coerce')
+        timed = publish_time.notna().to_numpy()
+        seconds = publish_time.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        days = np.floor_divide(seconds, 86400)
+        frame = {
+            'date': np.where(timed, days, MISSING_DATE).astype(np.int32),
+            'hour': np.where(timed, (seconds - days * 86400) // 3600, MISSING).astype(np.int8),
+        }
+        for name in CATEGORY_DIMENSIONS:
+            frame[name] = self._encode(name, dimensions[name]) if name in dimensions else np.full(len(timed), MISSING, np.int32)
+
+        replies = pd.to_numeric(pd.Series(replies), errors='coerce').to_numpy(dtype=float)
+        has_replies = ~np.isnan(replies)
+        replies = np.where(has_replies, replies, 0.0)
+        frame.update({'count': sign, 'reply_count': sign * has_replies.astype(np.int64),
+                      'reply_sum': sign * replies, 'reply_sq': sign * replies * replies})
+        batch = pd.DataFrame(frame, index=pd.RangeIndex(len(timed)))
+        self._merge_cells(batch)
+
+    def _merge_cells(self, cells):
+        if len(cells) == 0:
+            return
+        merged = pd.concat([self.cells, cells], ignore_index=True).groupby(DIMENSIONS, sort=False).sum().reset_index()
+        merged = merged[merged['count'] != 0]
+        self.cells = merged.astype(_DIMENSION_DTYPES | _MEASURE_DTYPES).reset_index(drop=True)
+
+    # 合并另一个立方体（例如另一批数据或另一个进程的部分结果）
+    def merge(self, other):
+        cells = other.cells.copy()
+        for name in CATEGORY_DIMENSIONS:
+            mapping = self._encode(name, other.categories[name])
+            codes = cells[name].to_numpy()
+            cells[name] = np.where(codes >= 0, mapping[np.maximum(codes, 0)] if len(mapping) else codes, MISSING)
+        self._merge_cells(cells)
+        return self
+
+    # 按 dimensions 汇总（其余维度求和），返回以维度值为索引、按索引排序的 DataFrame：
+    # 度量列 + mean（有回复数的帖子的平均回复数）+ std（总体标准差）
+    # 可用的维度：DIMENSIONS 以及 month（月份）、dayofweek（0为星期一）；任一所需维度缺失的格子不计入
+    # filters 为 {维度名: 值或值的列表}，只汇总满足条件的格子
+    def rollup(self, dimensions=(), filters=None):
+        dimensions = list(dimensions)
+        cells = self.cells
+        keep = np.ones(len(cells), dtype=bool)
+        columns = {}
+        for name in dict.fromkeys(dimensions + list(filters or {})):
+            source = DERIVED_DIMENSIONS.get(name, name)
+            if source not in DIMENSIONS:
+                raise ValueError(f'未知的维度: {name}')
+            codes = cells[source].to_numpy()
+            keep &= codes != (MISSING_DATE if source == 'date' else MISSING)
+            columns[name] = (source, codes)
+
+        measures = cells.loc[keep, MEASURES].reset_index(drop=True)
+        keys = {name: self._decode(name, source, codes[keep]) for name, (source, codes) in columns.items()}
+        for name, allowed in (filters or {}).items():
+            allowed = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+            matched = pd.Series(keys[name]).isin(list(allowed)).to_numpy()
+            measures = measures[matched].reset_index(drop=True)
+            keys = {key: values[matched] for key, values in keys.items()}
+
+        if dimensions:
+            grouped = measures.groupby([pd.Series(keys[name], name=name) for name in dimensions], sort=True).sum()
+        else:
+            grouped = measures.sum().to_frame().T.astype(measures.dtypes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            grouped['mean'] = grouped['reply_sum'] / grouped['reply_count']
+            variance = grouped['reply_sq'] / grouped['reply_count'] - grouped['mean'] ** 2
+            grouped['std'] = np.sqrt(np.maximum(variance, 0))
+        return grouped
+
+    def _decode(self, name, source, codes):
+        if name == 'month':
+            return pd.PeriodIndex(codes.astype('datetime64[D]').astype('datetime64[M]'), freq='M')
+        if name == 'dayofweek':
+            return ((codes.astype(np.int64) + 3) % 7).astype(np.int32)  # 1970-01-01 是星期四
+        if source == 'date':
+            return codes.astype('datetime64[D]')
+        if source in CATEGORY_DIMENSIONS:
+            return np.asarray(self.categories[source], dtype=object)[codes]
+        return codes.astype(np.int32)
+
+    # 不压缩的 .npz：每个维度和度量一列，字符串维度的类别表单独保存
+    def save(self, path):
+        arrays = {f'cells.{name}': self.cells[name].to_numpy() for name in DIMENSIONS + MEASURES}
+        for name in CATEGORY_DIMENSIONS:
+            arrays[f'categories.{name}'] = np.asarray([str(value) for value in self.categories[name]], dtype=str)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        cube = cls()
+        with np.load(path) as npz:
+            cube.cells = pd.DataFrame({name: npz[f'cells.{name}'] for name in DIMENSIONS + MEASURES})
+            for name in CATEGORY_DIMENSIONS:
+                cube.categories[name] = npz[f'categories.{name}'].tolist()
+                cube._positions[name] = {value: i for i, value in enumerate(cube.categories[name])}
+        return cube
+
+def _empty_cells():
+    return pd.DataFrame({name: np.zeros(0, dtype=dtype) for name, dtype in (_DIMENSION_DTYPES | _MEASURE_DTYPES).items()})
@@ -0,0 +1,173 @@
+# 合成数据：按 processed_data 中真实帖子和评论的字段与分布生成任意规模的数据，用于性能测试
+# - 字段与爬虫输出一致：每条记录以一条随机抽取的真实记录为模板，替换ID、文本和修改时间
+# - 标题、描述、评论内容的长度按真实数据抽样；正文由去掉关键词后的真实文本片段拼成，
+#   关键词（游戏名、平台词、情感词等）按真实数据中每条记录的命中率逐个插入
+# - 评论按真实的"每帖评论数"分布分配到帖子上；可以按比例生成同一ID的新版本（重复记录）
+
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from jsonl_store import find_output, iter_jsonl
+
+TEXT_FIELDS = {'contents': ['title', 'desc'], 'comments': ['content']}
+POST_ID_BASE = 800000000000  # 合成ID的起点，与真实的帖子ID、评论ID不重叠
+COMMENT_ID_BASE = 900000000000
+
+class CorpusModel:
+    def __init__(self, contents, comments, keywords):
+        if not contents or not comments:
+            raise ValueError('需要至少一条真实帖子和一条真实评论')
+        self.templates = {'contents': contents, 'comments': comments}
+        self.keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+        keyword_index = {keyword: index for index, keyword in enumerate(self.keywords)}
+        pattern = re.compile('|'.join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True)),
+                             re.IGNORECASE)
+
+        # 每个文本字段：真实长度、去掉关键词后的文本（用于截取片段）、各关键词的命中率
+        self.fields = {}
+        for kind, field_names in TEXT_FIELDS.items():
+            for field in field_names:
+                texts = [str(record.get(field) or '') for record in self.templates[kind]]
+                hits = np.zeros((len(texts), len(self.keywords)), dtype=bool)
+                stripped = []
+                for row, text in enumerate(texts):
+                    for match in pattern.finditer(text):
+                        hits[row, keyword_index[match.group(0).lower()]] = True
+                    stripped.append(pattern.sub('', text))
+                lengths = np.array([len(text) for text in texts], dtype=np.int64)
+                filler = ''.join(stripped) or '。'
+                # 片段长度不会超过最长的真实文本，拼接两遍即可从任意位置截取
+                while len(filler) < lengths.max():
+                    filler += filler
+                self.fields[(kind, field)] = (lengths, filler + filler, len(filler), hits.mean(axis=0))
+
+        post_comments = Counter(str(comment.get('note_id')) for comment in comments)
+        self.comments_per_post = np.array([post_comments.get(str(post.get('note_id')), 0) for post in contents], dtype=float)
+        self.reply_rate = sum(1 for comment in comments if comment.get('parent_comment_id')) / len(comments)
+        self.post_fraction = len(contents) / (len(contents) + len(comments))
+
+    # 读取 ingest 保存的处理后数据（filtered_contents / filtered_comments，JSONL 或旧版 JSON）
+    @classmethod
+    def from_processed_data(cls, output_dir, keywords):
+        records = {}
+        for kind in ['contents', 'comments']:
+            path = find_output(os.path.join(output_dir, f'filtered_{kind}'))
+            if path is None:
+                raise FileNotFoundError(f'{output_dir} 中没有 filtered_{kind} 数据，请先运行 ingest')
+            records[kind] = list(iter_jsonl(path))
+        return cls(records['contents'], records['comments'], keywords)
+
+    def _texts(self, rng, kind, field, count):
+        lengths, filler, period, rates = self.fields[(kind, field)]
+        lengths = lengths[rng.integers(0, len(lengths), count)]
+        starts = rng.integers(0, period, count)
+        hits = rng.random((count, len(rates))) < rates
+
+        texts = []
+        for length, start, row in zip(lengths.tolist(), starts.tolist(), hits):
+            words = [self.keywords[index] for index in np.flatnonzero(row)]
+            text = filler[start:start + max(length - sum(len(word) for word in words), 0)]
+            for word in words:
+                position = int(rng.integers(0, len(text) + 1))
+                text = text[:position] + word + text[position:]
+            texts.append(text)
+        return texts
+
+    def _records(self, rng, kind, count):
+        templates = self.templates[kind]
+        records = [dict(templates[index]) for index in rng.integers(0, len(templates), count)]
+        for field in TEXT_FIELDS[kind]:
+            for record, text in zip(records, self._texts(rng, kind, field, count)):
+                record[field] = text
+        return records
+
+    # 按块产出 count 条记录（含 duplicate_rate 比例的重复记录：同一ID、更新的 last_modify_ts）
+    # 评论的 note_id 指向 post_count 个合成帖子（帖子ID为 POST_ID_BASE + 序号）
+    def iter_chunks(self, kind, count, seed=0, duplicate_rate=0.0, chunk_size=10000, post_count=None, reply_rate=None):
+        rng = np.random.default_rng([seed, 0 if kind == 'contents' else 1])
+        duplicate_total = int(round(count * duplicate_rate))
+        unique_total = count - duplicate_total
+        reply_rate = self.reply_rate if reply_rate is None else reply_rate
+
+        if kind == 'comments':
+            post_count = post_count or max(1, int(round(count * self.post_fraction / (1 - self.post_fraction))))
+            weights = self.comments_per_post[rng.integers(0, len(self.comments_per_post), post_count)]
+            if weights.sum() == 0:
+                weights[:] = 1
+            post_cdf = np.cumsum(weights / weights.sum())
+
+        emitted_duplicates = 0
+        for start in range(0, unique_total, chunk_size):
+            end = min(start + chunk_size, unique_total)
+            records = self._records(rng, kind, end - start)
+            if kind == 'contents':
+                for offset, record in enumerate(records):
+                    note_id = str(POST_ID_BASE + start + offset)
+                    record['note_id'] = note_id
+                    if 'note_url' in record:
+                        record['note_url'] = f'https://tieba.baidu.com/p/{note_id}'
+            else:
+                post_indexes = np.searchsorted(post_cdf, rng.random(len(records)), side='right')
+                post_indexes = np.minimum(post_indexes, post_count - 1)
+                is_reply = rng.random(len(records)) < reply_rate
+                for offset, (record, post_index) in enumerate(zip(records, post_indexes.tolist())):
+                    record['comment_id'] = str(COMMENT_ID_BASE + start + offset)
+                    record['parent_comment_id'] = ''
+                    note_id = str(POST_ID_BASE + post_index)
+                    # 楼中楼回复：挂在本块中更早的一条评论下，与其属于同一个帖子
+                    if offset and is_reply[offset]:
+                        parent = records[int(rng.integers(0, offset))]
+                        record['parent_comment_id'] = parent['comment_id']
+                        note_id = parent['note_id']
+                    record['note_id'] = note_id
+                    if 'note_url' in record:
+                        record['note_url'] = f'https://tieba.baidu.com/p/{note_id}'
+
+            # 重复记录按比例分摊到各块，复制本块中的记录并更新修改时间
+            duplicates = int(round(end / unique_total * duplicate_total)) - emitted_duplicates
+            emitted_duplicates += duplicates
+            for index in rng.integers(0, len(records), duplicates).tolist():
+                duplicate = dict(records[index])
+                duplicate['last_modify_ts'] = int(duplicate.get('last_modify_ts') or 0) + int(rng.integers(1, 86400000))
+                if kind == 'contents' and 'total_replay_num' in duplicate:
+                    duplicate['total_replay_num'] = int(duplicate['total_replay_num'] or 0) + int(rng.integers(0, 5))
+                records.append(duplicate)
+            yield records
+
+# 把 count 条合成记录（帖子和评论按真实比例分配）写成爬虫格式的JSON文件
+# 返回各类记录数和写入的文件列表
+def write_corpus(model, out_dir, count, seed=0, duplicate_rate=0.0, records_per_file=100000):
+    os.makedirs(out_dir, exist_ok=True)
+    post_total = max(1, int(round(count * model.post_fraction)))
+    counts = {'contents': post_total, 'comments': max(count - post_total, 0)}
+    unique_posts = post_total - int(round(post_total * duplicate_rate))
+
+    files = []
+    for kind, kind_count in counts.items():
+        chunks = model.iter_chunks(kind, kind_count, seed=seed, duplicate_rate=duplicate_rate,
+                                   chunk_size=min(records_per_file, 10000), post_count=unique_posts)
+        f = None
+        written = 0
+        for records in chunks:
+            for record in records:
+                if f is None or written >= records_per_file:
+                    if f is not None:
+                        f.write('\n]')
+                        f.close()
+                    path = os.path.join(out_dir, f'search_{kind}_synthetic_{len(files) + 1:04d}.json')
+                    files.append(path)
+                    f = open(path, 'w', encoding='utf-8')
+                    f.write('[\n')
+                    written = 0
+                elif written:
+                    f.write(',\n')
+                f.write(json.dumps(record, ensure_ascii=False))
+                written += 1
+        if f is not None:
+            f.write('\n]')
+            f.close()
+    return {'contents': counts['contents'], 'comments': counts['comments'], 'files': files}
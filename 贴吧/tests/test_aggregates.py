@@ -0,0 +1,119 @@
+# aggregates.py 中草图的误差界：与精确计数对比，数据和哈希都是确定的
+# 运行：python -m unittest discover -s tests
+
+import math
+import os
+import sys
+import unittest
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import QuantileSketch, FrequentItems, CountMinSketch, HyperLogLog
+
+# 长尾分布的键流（少数键很频繁），按批产出
+def zipf_batches(size=50000, distinct=5000, batch_size=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    keys = (rng.zipf(1.3, size) % distinct).tolist()
+    return [keys[start:start + batch_size] for start in range(0, size, batch_size)]
+
+class QuantileSketchTest(unittest.TestCase):
+    def test_small_integers_are_exact(self):
+        values = np.random.default_rng(0).integers(0, 500, 10000)
+        sketch = QuantileSketch()
+        sketch.add(values[:4000])
+        sketch.add(values[4000:])
+        for q in [0.1, 0.25, 0.5, 0.75, 0.99]:
+            self.assertEqual(sketch.quantile(q), np.quantile(values, q))
+        count, mean, minimum, maximum = sketch.range_stats(100, 300)
+        inside = values[(values >= 100) & (values <= 300)]
+        self.assertEqual((count, minimum, maximum), (len(inside), inside.min(), inside.max()))
+        self.assertIsInstance(maximum, int)
+        self.assertAlmostEqual(mean, inside.mean())
+
+    def test_large_values_within_relative_accuracy(self):
+        values = np.random.default_rng(1).lognormal(10, 2, 20000)
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        sketch.add(values)
+        for q in [0.25, 0.5, 0.75]:
+            # 取相邻的两个排名之一，插值结果在两者的误差范围内
+            expected = np.quantile(values, q)
+            self.assertLessEqual(abs(sketch.quantile(q) - expected) / expected, 0.011)
+
+class FrequentItemsTest(unittest.TestCase):
+    def assert_bounds(self, sketch, exact):
+        total = sum(exact.values())
+        self.assertEqual(sketch.total, total)
+        self.assertLessEqual(sketch.error, total / (sketch.capacity + 1))
+        for key, count in sketch.most_common():
+            self.assertLessEqual(count, exact[key])
+            self.assertLessEqual(exact[key], count + sketch.error)
+        # 真实值大于 error 的项一定被保留
+        for key, count in exact.items():
+            if count > sketch.error:
+                self.assertIn(key, sketch)
+
+    def test_counts_within_error(self):
+        sketch = FrequentItems(capacity=100)
+        exact = Counter()
+        for batch in zipf_batches():
+            sketch.update(Counter(batch))
+            exact.update(batch)
+        self.assertGreater(sketch.error, 0)
+        self.assert_bounds(sketch, exact)
+
+    def test_merge_within_error(self):
+        left, right = FrequentItems(capacity=100), FrequentItems(capacity=100)
+        exact = Counter()
+        for i, batch in enumerate(zipf_batches(seed=1)):
+            (left if i % 2 else right).update(Counter(batch))
+            exact.update(batch)
+        self.assert_bounds(left.merge(right), exact)
+
+    def test_rejects_undo(self):
+        with self.assertRaises(ValueError):
+            FrequentItems().update({'a': -1})
+
+class CountMinSketchTest(unittest.TestCase):
+    def test_estimates_within_error_bound(self):
+        sketch = CountMinSketch(width=256, depth=5)
+        exact = Counter()
+        for batch in zipf_batches():
+            sketch.update(Counter(batch))
+            exact.update(batch)
+        keys = list(exact)
+        estimates = sketch.estimate(keys)
+        truth = np.array([exact[key] for key in keys])
+        max_error, confidence = sketch.error_bound()
+        self.assertTrue((estimates >= truth).all())
+        self.assertLessEqual(((estimates - truth) > max_error).mean(), 1 - confidence)
+
+    def test_undo_and_merge(self):
+        left, right = CountMinSketch(width=64, depth=3), CountMinSketch(width=64, depth=3)
+        left.update({'a': 3, 'b': 1})
+        right.update({'a': 2})
+        left.merge(right)
+        self.assertEqual(left.estimate(['a'])[0], 5)
+        left.update({'a': -5, 'b': -1})
+        self.assertEqual(left.total, 0)
+        self.assertFalse(left.table.any())
+
+class HyperLogLogTest(unittest.TestCase):
+    def test_count_within_standard_errors(self):
+        for n in [100, 10000, 200000]:
+            sketch = HyperLogLog()
+            sketch.add([f'user{i}' for i in range(n)])
+            sketch.add([f'user{i}' for i in range(0, n, 3)])  # 重复的用户不增加基数
+            self.assertLessEqual(abs(sketch.count() - n) / n, 3 * sketch.relative_error(), n)
+
+    def test_merge_equals_union(self):
+        left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        left.add([f'user{i}' for i in range(0, 30000)])
+        right.add([f'user{i}' for i in range(20000, 50000)])
+        union.add([f'user{i}' for i in range(0, 50000)])
+        self.assertEqual(left.merge(right).count(), union.count())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# columnar_cache.py：写入再读取后各列的值和类型不变（包括缺失值和分类列）
+# 运行：python -m unittest discover -s tests
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar_cache import load_frame, read_meta, save_frame
+
+SCHEMA = {'note_id': 'int64', 'replies': 'int32', 'score': 'float', 'publish_time': 'datetime',
+          'tieba_name': 'category'}
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+class ColumnarCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'frame.npz')
+
+    def round_trip(self, df, columns=None):
+        save_frame(df, self.path, SCHEMA, DATETIME_FORMAT)
+        return load_frame(self.path, columns)
+
+    def test_round_trip_with_nulls_and_categories(self):
+        df = pd.DataFrame({
+            'note_id': ['10329310118', '', None, '9007199254740993'],
+            'replies': [7, None, 0, 2147483647],
+            'score': [0.5, np.nan, -1.25, 3.0],
+            'publish_time': ['2025-12-23 23:24', None, '不是时间', '1970-01-01 00:00'],
+            'tieba_name': ['原神吧', None, '原神吧', '电脑吧'],
+            'title': ['标题', '含\\u0000和emoji😀的文本', '', 'ascii'],
+        })
+        loaded = self.round_trip(df)
+        self.assertEqual(list(loaded.columns), list(df.columns))
+        self.assertEqual(str(loaded['note_id'].dtype), 'Int64')
+        self.assertEqual(loaded['note_id'].isna().tolist(), [False, True, True, False])
+        self.assertEqual(loaded['note_id'].dropna().tolist(), [10329310118, 9007199254740993])
+        self.assertEqual(str(loaded['replies'].dtype), 'Int32')
+        self.assertEqual(loaded['replies'].fillna(-1).tolist(), [7, -1, 0, 2147483647])
+        np.testing.assert_array_equal(loaded['score'].to_numpy(), df['score'].to_numpy())
+        self.assertEqual(loaded['publish_time'].tolist()[0], pd.Timestamp('2025-12-23 23:24'))
+        self.assertEqual(loaded['publish_time'].isna().tolist(), [False, True, True, False])
+        self.assertEqual(loaded['publish_time'].tolist()[3], pd.Timestamp(0))
+        self.assertIsInstance(loaded['tieba_name'].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(loaded['tieba_name'].cat.categories), ['原神吧', '电脑吧'])
+        self.assertTrue(pd.isna(loaded['tieba_name'][1]))
+        self.assertEqual(loaded['tieba_name'].tolist()[::2], ['原神吧', '原神吧'])
+        self.assertEqual(loaded['title'].tolist(), df['title'].tolist())
+
+    def test_ints_without_nulls_stay_plain(self):
+        loaded = self.round_trip(pd.DataFrame({'note_id': [1, 2, 3], 'replies': [0, 5, 9]}))
+        self.assertEqual(loaded['note_id'].dtype, np.int64)
+        self.assertEqual(loaded['replies'].dtype, np.int32)
+        self.assertEqual(loaded['note_id'].tolist(), [1, 2, 3])
+
+    # 无法转为整数的ID列按字符串保存，值不丢失
+    def test_non_numeric_ids_fall_back_to_strings(self):
+        loaded = self.round_trip(pd.DataFrame({'note_id': ['123', 'abc'], 'replies': [1.5, 2]}))
+        self.assertEqual(read_meta(self.path)['columns'], {'note_id': 'string', 'replies': 'string'})
+        self.assertEqual(loaded['note_id'].tolist(), ['123', 'abc'])
+
+    def test_selected_columns_and_empty_frame(self):
+        df = pd.DataFrame({'note_id': [1, 2], 'tieba_name': ['a', 'b'], 'title': ['x', 'y']})
+        loaded = self.round_trip(df, ['title', 'missing', 'note_id'])
+        self.assertEqual(list(loaded.columns), ['title', 'note_id'])
+        empty = self.round_trip(df.iloc[:0])
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(list(empty.columns), list(df.columns))
+
+if __name__ == '__main__':
+    unittest.main()
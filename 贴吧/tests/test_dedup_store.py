@@ -0,0 +1,67 @@
+# dedup_store.py：同一ID只保留 last_modify_ts 最新的版本，重新打开 SQLite 文件后仍然成立
+# 运行：python -m unittest discover -s tests
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_store import DedupStore, MemoryDedupIndex
+
+def item(key, ts, text):
+    return key, ts, {'note_id': key, 'title': text, 'last_modify_ts': ts}
+
+class DedupStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'dedup.sqlite')
+
+    def test_newest_version_wins_across_reopenings(self):
+        with DedupStore(self.path) as store:
+            inserted, updated = store.add_batch('contents', [item('1', 200, 'b'), item('2', 100, 'x'), item('1', 100, 'a')])
+            self.assertEqual([record['title'] for record in inserted], ['b', 'x'])
+            self.assertEqual(updated, [])
+        with DedupStore(self.path) as store:
+            # 旧版本和相同时间的版本都被跳过
+            self.assertEqual(store.add_batch('contents', [item('1', 150, 'old'), item('1', 200, 'same')]), ([], []))
+            inserted, updated = store.add_batch('contents', [item('1', 300, 'c'), item('3', 100, 'y')])
+            self.assertEqual([record['title'] for record in inserted], ['y'])
+            self.assertEqual([(old['title'], new['title']) for old, new in updated], [('b', 'c')])
+        with DedupStore(self.path) as store:
+            # 更新不改变ID首次出现的顺序
+            self.assertEqual([record['title'] for record in store.iter_records('contents')], ['c', 'x', 'y'])
+            self.assertEqual(store.count('contents'), 3)
+            self.assertEqual(store.count('comments'), 0)
+
+    def test_uncommitted_batches_are_discarded(self):
+        with DedupStore(self.path) as store:
+            store.add_batch('contents', [item('1', 100, 'a')])
+        store = DedupStore(self.path, autocommit=False)
+        store.add_batch('contents', [item('1', 200, 'b'), item('2', 100, 'x')])
+        store.set_meta('generation', 1)
+        store.close()
+        with DedupStore(self.path) as store:
+            self.assertEqual([record['title'] for record in store.iter_records('contents')], ['a'])
+            self.assertIsNone(store.get_meta('generation'))
+        with self.assertRaises(RuntimeError):
+            with DedupStore(self.path, autocommit=False) as store:
+                store.add_batch('contents', [item('1', 200, 'b')])
+                raise RuntimeError('中断')
+        with DedupStore(self.path) as store:
+            self.assertEqual([record['title'] for record in store.iter_records('contents')], ['a'])
+
+    def test_memory_index_matches_store(self):
+        batches = [[item('1', 100, 'a'), item('2', 100, 'x')], [item('1', 50, 'old'), item('1', 300, 'c')],
+                   [item('3', 100, 'y'), item('2', 200, 'z')]]
+        memory = MemoryDedupIndex()
+        with DedupStore(self.path) as store:
+            for batch in batches:
+                self.assertEqual(memory.add_batch('contents', batch), store.add_batch('contents', batch))
+            self.assertEqual(list(memory.iter_records('contents')), list(store.iter_records('contents')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+# 增量分析：中途失败的运行不会丢失数据，下次运行的结果与一次处理全部文件相同
+# 运行：python -m unittest discover -s tests
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyze_game_data as pipeline
+from dedup_store import DedupStore
+
+def post(note_id, ts, title, replies=3):
+    return {'note_id': note_id, 'title': title, 'desc': title + '，大家怎么看', 'publish_time': '2025-12-23 23:24',
+            'user_nickname': f'user{note_id}', 'tieba_name': '游戏吧', 'total_replay_num': replies,
+            'ip_location': '广东', 'last_modify_ts': ts}
+
+def comment(comment_id, note_id, ts, content):
+    return {'comment_id': comment_id, 'parent_comment_id': '', 'content': content, 'publish_time': '2025-12-24 10:00',
+            'user_nickname': f'user{comment_id}', 'sub_comment_count': 0, 'note_id': note_id,
+            'tieba_name': '游戏吧', 'last_modify_ts': ts}
+
+# 第一批文件
+FIRST = {
+    'contents': [post('1', 100, '原神新版本太好玩了'), post('2', 100, '王者荣耀排位好难')],
+    'comments': [comment('11', '1', 100, '确实好玩，强烈推荐'), comment('12', '2', 100, '垃圾游戏，卸载了'),
+                 comment('13', '1', 100, '一般般吧')],
+}
+# 第二批文件：帖子 1、评论 13 被重新抓取，另有新帖子和新评论
+SECOND = {
+    'contents': [post('1', 200, '原神新版本真的太好玩了', replies=8), post('3', 200, '和平精英有人一起玩吗')],
+    'comments': [comment('13', '1', 200, '好玩，推荐'), comment('14', '3', 200, '一起玩')],
+}
+# 帖子 1 被重新抓取后提到的游戏变了（原神 -> 王者荣耀），它下面未变化的评论应随之重新归类
+RECRAWLED = {
+    'contents': [post('1', 300, '王者荣耀新赛季太好玩了', replies=8)],
+    'comments': [comment('12', '2', 300, '好玩，推荐')],
+}
+
+def state_fields(state):
+    fields = {}
+    for name, value in vars(state).items():
+        if name in ('generation', 'replies', 'length_reply', 'replies_by_length', 'cube'):
+            continue
+        fields[name] = +value if isinstance(value, Counter) else value
+    return fields
+
+class IncrementalTestCase(unittest.TestCase):
+    maxDiff = None
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmp, 'data')
+        os.makedirs(self.data_dir)
+        # 分词缓存写到临时目录，不影响 processed_data
+        patcher = mock.patch.multiple(pipeline, OUTPUT_DIR=self.tmp,
+                                      TOKEN_CACHE_PATH=os.path.join(self.tmp, 'token_cache.sqlite'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pipeline.get_tokenizer.cache_clear()
+        self.addCleanup(pipeline.get_tokenizer.cache_clear)
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write_files(self, name, batch):
+        for kind, records in batch.items():
+            path = os.path.join(self.data_dir, f'search_{kind}_{name}.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False)
+
+    def run_incremental(self, state_dir):
+        with mock.patch('builtins.print'):
+            return pipeline.run_incremental([self.data_dir], state_dir=os.path.join(self.tmp, state_dir), workers=1)[1]
+
+    # 一次处理全部文件得到的状态
+    def expected_state(self):
+        return self.run_incremental('clean')
+
+class InterruptedRunTest(IncrementalTestCase):
+    def test_failure_before_saving_state_rolls_back_dedup_index(self):
+        self.write_files('1', FIRST)
+        self.run_incremental('state')
+        self.write_files('2', SECOND)
+        with mock.patch.object(pipeline.AnalysisState, 'add_comments', side_effect=RuntimeError('中断')):
+            with self.assertRaises(RuntimeError):
+                self.run_incremental('state')
+        state = self.run_incremental('state')
+        self.assertEqual(state.post_count, 3)
+        self.assertEqual(state.comment_count, 4)
+        self.assertEqual(state_fields(state), state_fields(self.expected_state()))
+
+    def test_failure_after_saving_state_reprocesses_all_files(self):
+        self.write_files('1', FIRST)
+        self.run_incremental('state')
+        self.write_files('2', SECOND)
+        with mock.patch.object(DedupStore, 'commit', side_effect=RuntimeError('中断')):
+            with self.assertRaises(RuntimeError):
+                self.run_incremental('state')
+        state = self.run_incremental('state')
+        self.assertEqual(state.post_count, 3)
+        self.assertEqual(state.comment_count, 4)
+        self.assertEqual(state_fields(state), state_fields(self.expected_state()))
+
+class RecrawledPostTest(IncrementalTestCase):
+    def test_comments_follow_the_games_of_a_recrawled_post(self):
+        self.write_files('1', FIRST)
+        self.run_incremental('state')
+        self.write_files('2', RECRAWLED)
+        state = self.run_incremental('state')
+        self.assertEqual(state.post_games['1'], ('王者荣耀',))
+        self.assertEqual(sum(count for (game, level), count in state.comment_game_levels.items() if game == '原神'), 0)
+        self.assertEqual(state_fields(state), state_fields(self.expected_state()))
+
+    def test_retracting_a_post_keeps_its_comments_under_their_own_games(self):
+        self.write_files('1', FIRST)
+        state = self.run_incremental('state')
+        df = pipeline.pd.DataFrame(FIRST['contents'][:1])
+        state.add_posts(df, *pipeline.extract_features(df), sign=-1)
+        self.assertNotIn('1', state.post_games)
+        self.assertEqual(+state.comment_game_levels, Counter({('王者荣耀', '负面'): 1}))
+
+# 增量运行（撤销旧版本、加入新版本）的结果与对去重后的全部数据运行 analyze_data 相同
+class FullRunTest(IncrementalTestCase):
+    def full_results(self, *batches):
+        data = {}
+        for kind in ['contents', 'comments']:
+            records = [record for batch in batches for record in batch[kind]]
+            data[kind] = pipeline.remove_duplicates(pipeline.filter_game_related(records))
+        with mock.patch('builtins.print'):
+            return pipeline.analyze_data(data['contents'], data['comments'])[0]
+
+    def assert_matches_full_run(self, results, expected):
+        self.assertEqual(dict(results['game_counts']), dict(expected['game_counts']))
+        self.assertEqual(dict(results['tieba_counts']), dict(expected['tieba_counts']))
+        self.assertEqual(+results['sentiment_distribution'], +Counter(dict(expected['sentiment_distribution'])))
+        self.assertEqual(results['game_type_distribution'], expected['game_type_distribution'])
+        # 全量分析按 CACHE_SCHEMAS 把ID转为整数，增量分析保留原始的字符串ID
+        self.assertEqual({str(note_id): count for note_id, count in results['comments_per_post'].items()},
+                         {str(note_id): count for note_id, count in expected['comments_per_post'].items()})
+        sentiment, expected_sentiment = results['comment_sentiment'], expected['comment_sentiment']
+        self.assertEqual(sentiment['distribution'], expected_sentiment['distribution'])
+        for table in ['by_tieba', 'by_game']:
+            self.assertEqual(sentiment[table][pipeline.SENTIMENT_LEVELS].sort_index().to_dict(),
+                             expected_sentiment[table][pipeline.SENTIMENT_LEVELS].sort_index().to_dict())
+
+    def test_recrawled_records_match_full_run(self):
+        self.write_files('1', FIRST)
+        self.run_incremental('state')
+        self.write_files('2', SECOND)
+        self.run_incremental('state')
+        self.write_files('3', RECRAWLED)
+        state = self.run_incremental('state')
+        self.assertEqual(state.post_count, 3)
+        self.assertEqual(state.comment_count, 4)
+        self.assert_matches_full_run(state.to_results(), self.full_results(FIRST, SECOND, RECRAWLED))
+
+if __name__ == '__main__':
+    unittest.main()
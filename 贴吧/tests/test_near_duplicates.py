@@ -0,0 +1,60 @@
+# near_duplicates.py：复制粘贴的广告（少量改动）归为一簇，不同的文本不归为一簇
+# 运行：python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import MinHasher, NearDuplicateDetector, choose_bands, find_clusters
+
+AD = ('出售各类游戏账号，原神王者荣耀和平精英全区全服，价格实惠安全放心，'
+      '先验号后付款，支持中介担保，需要的老板加微信详聊，量大从优，长期有效')
+
+def random_texts(count, length=60, seed=0):
+    rng = np.random.default_rng(seed)
+    chars = rng.integers(0x4e00, 0x9fa5, (count, length))
+    return [''.join(map(chr, row)) for row in chars.tolist()]
+
+# 把广告中的一个字符换掉，模拟换联系方式、换标点重发
+def edited_ad(i):
+    position = 10 + 7 * i
+    return AD[:position] + '＃' + AD[position + 1:]
+
+class NearDuplicateTest(unittest.TestCase):
+    def test_bands_reach_recall_at_threshold(self):
+        for threshold in [0.5, 0.8, 0.9]:
+            bands, rows = choose_bands(64, threshold)
+            self.assertEqual(bands * rows, 64)
+            self.assertGreaterEqual(1 - (1 - threshold ** rows) ** bands, 0.99)
+
+    def test_copy_pasted_ads_form_one_cluster(self):
+        texts = random_texts(200)
+        ad_rows = [5, 50, 120, 199]
+        for i, row in enumerate(ad_rows):
+            texts[row] = AD if i == 0 else edited_ad(i)
+        detector = NearDuplicateDetector(threshold=0.8)
+        detector.add_batch(texts[:100])
+        detector.add_batch(texts[100:])
+        parents = detector.clusters()
+        # 广告归为一簇，代表为最早出现的一条；其他文本各自成簇
+        self.assertEqual(parents[ad_rows].tolist(), [ad_rows[0]] * len(ad_rows))
+        others = np.setdiff1d(np.arange(len(texts)), ad_rows)
+        self.assertEqual(parents[others].tolist(), others.tolist())
+
+    def test_whitespace_is_ignored(self):
+        detector = NearDuplicateDetector()
+        detector.add_batch([AD, ' '.join(AD[i:i + 10] for i in range(0, len(AD), 10)), random_texts(1)[0]])
+        self.assertEqual(detector.clusters().tolist(), [0, 0, 2])
+
+    def test_short_texts_are_skipped(self):
+        signatures, skipped = MinHasher().signatures(['1', '啥游戏？', '', AD])
+        self.assertEqual(skipped.tolist(), [True, True, True, False])
+        parents = find_clusters(signatures, 0.8, skipped=skipped)
+        self.assertEqual(parents.tolist(), [0, 1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
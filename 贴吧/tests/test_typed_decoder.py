@@ -0,0 +1,96 @@
+# typed_decoder.py：类型不符的值和格式错误的记录报告在正确的偏移处，其余记录照常解码
+# 运行：python -m unittest discover -s tests
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typed_decoder import TypedDecoder, iter_json_array
+
+SCHEMA = {'note_id': 'int64', 'replies': 'int32', 'publish_time': 'datetime', 'tieba_name': 'category'}
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+RECORDS = [
+    '{"note_id": "1", "replies": "7", "publish_time": "2025-12-23 23:24", "tieba_name": "原神吧", "title": "第一条"}',
+    '{"note_id": "x1", "replies": 5000000000, "tieba_name": "原神吧", "dropped": {"a": 1}}',
+    '{"note_id": 3, "publish_time": "昨天", "tieba_name": 5, "title": ""}',
+    '[1, 2]',
+    '{"note_id": 4, broken}',
+    '{"note_id": "5", "replies": null, "title": "最后一条"}',
+]
+
+class TypedDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, text, name='search_contents_1.json'):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_violations_and_malformed_records_at_offsets(self):
+        for prefix in ['', '\ufeff']:  # 带 BOM 的文件偏移同样从文件开头算起
+            text = prefix + '[\n  ' + ',\n  '.join(RECORDS) + '\n]\n'
+            path = self.write(text)
+            offsets = [text.index(record) for record in RECORDS]
+            stats = {}
+            frame, violations = TypedDecoder(SCHEMA, DATETIME_FORMAT, drop_fields=['dropped']).decode_file(path, stats)
+
+            self.assertEqual(stats, {'records': 4, 'skipped': 2, 'error': None})
+            self.assertEqual([violation.offset for violation in violations],
+                             sorted(violation.offset for violation in violations))
+            self.assertEqual({(violation.offset, violation.field, violation.value) for violation in violations}, {
+                (offsets[1], 'note_id', 'x1'),
+                (offsets[1], 'replies', 5000000000),
+                (offsets[2], 'publish_time', '昨天'),
+                (offsets[2], 'tieba_name', 5),
+                (offsets[3], None, None),
+                (offsets[4], None, None),
+            })
+            reasons = {(violation.offset, violation.field): violation.reason for violation in violations}
+            self.assertEqual(reasons[offsets[3], None], '不是JSON对象')
+            self.assertEqual(reasons[offsets[4], None], 'JSON格式错误')
+            self.assertEqual(reasons[offsets[1], 'replies'], '超出 int32 的范围')
+
+            # 类型不符的值记为缺失，记录本身保留
+            self.assertEqual(list(frame.columns), ['note_id', 'replies', 'publish_time', 'tieba_name', 'title'])
+            self.assertEqual(frame['note_id'].isna().tolist(), [False, True, False, False])
+            self.assertEqual(frame['note_id'].dropna().tolist(), [1, 3, 5])
+            self.assertEqual(frame['replies'].isna().tolist(), [False, True, True, True])
+            self.assertEqual(frame['publish_time'].tolist()[0], pd.Timestamp('2025-12-23 23:24'))
+            self.assertEqual(frame['publish_time'].isna().tolist(), [False, True, True, True])
+            self.assertEqual(list(frame['tieba_name'].cat.categories), ['原神吧'])
+            self.assertEqual(frame['tieba_name'].isna().tolist(), [False, False, True, True])
+            self.assertTrue(pd.isna(frame['title'][1]))
+            self.assertEqual(frame['title'][[0, 2, 3]].tolist(), ['第一条', '', '最后一条'])
+
+    # 记录跨越读取块的边界时偏移不变
+    def test_offsets_do_not_depend_on_chunk_size(self):
+        text = '[' + ', '.join(RECORDS[:3] + RECORDS[5:]) + ']'
+        path = self.write(text)
+        expected = [text.index(record) for record in RECORDS[:3] + RECORDS[5:]]
+        for chunk_size in [7, 64, 65536]:
+            stats = {'skipped': 0}
+            offsets = [offset for offset, value in iter_json_array(path, stats, chunk_size=chunk_size)]
+            self.assertEqual(offsets, expected)
+            self.assertEqual(stats['skipped'], 0)
+
+    def test_non_array_file_is_an_error(self):
+        stats = {}
+        with mock.patch('builtins.print'):
+            frame, violations = TypedDecoder(SCHEMA).decode_file(self.write('{"note_id": 1}'), stats)
+        self.assertEqual(stats['error'], '顶层不是JSON数组')
+        self.assertEqual(len(frame), 0)
+        self.assertEqual(violations, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# 关键词分词：逐条记录分词，结果按记录ID缓存在 SQLite 中
+# 未变化的记录（ID和文本哈希都相同）不会重复分词；未命中缓存的记录较多时在进程池中并行分词
+# 缓存与自定义词、停用词对应：两者的哈希保存在 meta 表中，变化时清空缓存
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+PARALLEL_THRESHOLD = 5000  # 待分词的记录数达到该值才启用进程池
+CHUNK_SIZE = 2000  # 每个分词任务的记录数
+
+_chinese_word = re.compile(r'[\u4e00-\u9fff]{2,}')
+_stopwords = frozenset()
+_initialized_words = None
+
+# 加载 jieba 词典并加入自定义词（每个进程只执行一次）
+def _init_jieba(user_words, stopwords):
+    global _stopwords, _initialized_words
+    import jieba
+
+    _stopwords = frozenset(stopwords)
+    if _initialized_words == tuple(user_words):
+        return
+    jieba.setLogLevel(60)
+    jieba.initialize()
+    for word in user_words:
+        jieba.add_word(word)
+    _initialized_words = tuple(user_words)
+
+# 分词并过滤停用词和非中文词汇
+def _segment(texts):
+    import jieba
+
+    return [[word for word in jieba.cut(text) if word not in _stopwords and _chinese_word.fullmatch(word)]
+            for text in texts]
+
+def _text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+def _dictionary_hash(user_words, stopwords):
+    return _text_hash(json.dumps([list(user_words), sorted(stopwords)], ensure_ascii=False))
+
+class Tokenizer:
+    def __init__(self, user_words=(), stopwords=(), cache_path=None, workers=None):
+        self.user_words = tuple(user_words)
+        self.stopwords = tuple(stopwords)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.conn = None
+        if cache_path:
+            self.conn = sqlite3.connect(cache_path)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS tokens (
+                    record_id TEXT PRIMARY KEY,
+                    text_hash TEXT NOT NULL,
+                    tokens TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            dictionary_hash = _dictionary_hash(self.user_words, self.stopwords)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'dictionary'").fetchone()
+            if row is None or row[0] != dictionary_hash:
+                self.conn.execute('DELETE FROM tokens')
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dictionary', ?)", (dictionary_hash,))
+            self.conn.commit()
+
+    def _lookup(self, keys):
+        cached = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT record_id, text_hash, tokens FROM tokens WHERE record_id IN ({placeholders})', chunk)
+            for record_id, text_hash, tokens in rows:
+                cached[record_id] = (text_hash, tokens)
+        return cached
+
+    def _segment_texts(self, texts):
+        if len(texts) < PARALLEL_THRESHOLD or self.workers <= 1:
+            _init_jieba(self.user_words, self.stopwords)
+            return _segment(texts)
+
+        chunks = [texts[start:start + CHUNK_SIZE] for start in range(0, len(texts), CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_jieba,
+                                 initargs=(self.user_words, self.stopwords)) as pool:
+            return [tokens for chunk_tokens in pool.map(_segment, chunks) for tokens in chunk_tokens]
+
+    # 返回与 texts 一一对应的词列表；keys 为记录ID（不传时不使用缓存）
+    def tokenize(self, texts, keys=None):
+        texts = ['' if text is None else str(text) for text in texts]
+        if keys is None or self.conn is None:
+            return self._segment_texts(texts)
+
+        keys = [str(key) for key in keys]
+        hashes = [_text_hash(text) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        results = [None] * len(texts)
+        missing = []
+        for position, (key, text_hash) in enumerate(zip(keys, hashes)):
+            entry = cached.get(key)
+            if entry is not None and entry[0] == text_hash:
+                results[position] = json.loads(entry[1])
+            else:
+                missing.append(position)
+
+        if missing:
+            segmented = self._segment_texts([texts[position] for position in missing])
+            rows = {}
+            for position, tokens in zip(missing, segmented):
+                results[position] = tokens
+                rows[keys[position]] = (keys[position], hashes[position], json.dumps(tokens, ensure_ascii=False))
+            self.conn.executemany('INSERT OR REPLACE INTO tokens (record_id, text_hash, tokens) VALUES (?, ?, ?)',
+                                  list(rows.values()))
+            self.conn.commit()
+
+        return results
+
+    # 词频统计
+    def count_keywords(self, texts, keys=None):
+        word_counts = Counter()
+        for tokens in self.tokenize(texts, keys):
+            word_counts.update(tokens)
+        return word_counts
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,211 @@
+# 爬虫输出（顶层为JSON数组的文件）的流式读取，以及按模式（schema）直接解码为类型化的列
+# iter_json_array 逐个产出数组元素和它在文件中的偏移，不把整个文件读入内存
+# TypedDecoder 解析时每个JSON对象只保留 (键, 值) 列表（object_pairs_hook），值直接写入对应列的缓冲区，
+# 不为每条记录生成字典；一个文件解码完成后整列转换为 numpy / pandas 数组：
+#   int64 / int32  整数或数字字符串（ID以字符串保存），空字符串和 null 为缺失 -> Int64 / Int32
+#   datetime       按 datetime_format 解析的字符串，整列一次转换 -> datetime64[s]
+#   category       字符串，同一字符串只保存一份，按首次出现的顺序编号 -> Categorical
+#   string         原样保存（模式中未列出的字段也按 string）
+# 类型不符的值记为缺失，并记录一条 SchemaViolation（文件、记录在文件中的字符偏移、字段、值、原因）
+
+import json
+import re
+from collections import namedtuple
+
+from lazy_module import LazyModule
+
+# 只读取记录（iter_json_array）时不需要加载 numpy / pandas
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+_whitespace = re.compile(r'[\s,]*')
+_record_boundary = re.compile(r'\}\s*,\s*\{')
+_json_decoder = json.JSONDecoder()
+
+_INT_RANGES = {'int64': (-2 ** 63, 2 ** 63 - 1), 'int32': (-2 ** 31, 2 ** 31 - 1)}
+
+class SchemaViolation(namedtuple('SchemaViolation', ['file', 'offset', 'field', 'value', 'reason'])):
+    def __str__(self):
+        if self.field is None:
+            return f'{self.file}:{self.offset} {self.reason}'
+        return f'{self.file}:{self.offset} {self.field}={self.value!r}：{self.reason}'
+
+# 逐个产出顶层JSON数组的 (元素在文件中的字符偏移, 解析结果)；decoder 为 json.JSONDecoder
+# file_stats 中记录跳过的异常记录数（skipped）和读取错误（error）；给出 malformed 列表时追加异常记录的偏移
+def iter_json_array(file_path, file_stats, decoder=_json_decoder, chunk_size=65536, max_record_size=1 << 20,
+                    malformed=None):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            buf = f.read(chunk_size)
+            consumed = 0  # buf[0] 在文件中的字符偏移
+            if buf.startswith('\ufeff'):
+                buf = buf[1:]
+                consumed = 1
+            pos = 0
+            eof = not buf
+
+            def fill(keep_from):
+                # 丢弃已消费部分并读入下一块
+                nonlocal buf, pos, eof, consumed
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buf = buf[keep_from:] + chunk
+                pos -= keep_from
+                consumed += keep_from
+
+            # 定位数组开头的 '['
+            while True:
+                pos = _whitespace.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    break
+                fill(pos)
+            if pos >= len(buf) or buf[pos] != '[':
+                file_stats['error'] = '顶层不是JSON数组'
+                print(f"Error reading {file_path}: {file_stats['error']}")
+                return
+            pos += 1
+
+            while True:
+                pos = _whitespace.match(buf, pos).end()
+                if pos >= len(buf):
+                    if eof:
+                        break
+                    fill(pos)
+                    continue
+                if buf[pos] == ']':
+                    break
+
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 记录可能被分块截断，先补充数据再重试
+                    if not eof and len(buf) - pos < max_record_size:
+                        fill(pos)
+                        continue
+                    # 确认是异常记录：跳到下一条记录的开头
+                    file_stats['skipped'] += 1
+                    if malformed is not None:
+                        malformed.append(consumed + pos)
+                    match = _record_boundary.search(buf, pos + 1)
+                    while match is None and not eof:
+                        fill(max(pos + 1, len(buf) - 64))
+                        match = _record_boundary.search(buf, pos)
+                    if match is None:
+                        break
+                    pos = match.end() - 1
+                    continue
+
+                yield consumed + pos, value
+                pos = end
+    except (OSError, UnicodeDecodeError) as e:
+        file_stats['error'] = str(e)
+        print(f"Error reading {file_path}: {e}")
+
+# 一列的缓冲区：只保存出现过的 (行号, 值)，缺少该字段的行在 finish 时补为缺失
+class _Column:
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.rows = []
+        self.values = []
+        self.categories = {} if kind == 'category' else None
+
+    def append(self, row, value):
+        self.rows.append(row)
+        self.values.append(value)
+
+class TypedDecoder:
+    # schema 为 {字段: 类型}；drop_fields 中的字段直接跳过
+    def __init__(self, schema, datetime_format=None, drop_fields=()):
+        self.schema = schema
+        self.datetime_format = datetime_format
+        self.drop_fields = set(drop_fields)
+        # 对象解析为 (键, 值) 列表，不构造字典
+        self._decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: pairs)
+
+    # 解码一个文件，返回 (DataFrame, 违反模式的列表)；file_stats 同 iter_json_array，另记录有效记录数（records）
+    def decode_file(self, file_path, file_stats=None):
+        if file_stats is None:
+            file_stats = {}
+        file_stats.update({'records': 0, 'skipped': 0, 'error': None})
+        columns = {}
+        offsets = []
+        violations = []
+        malformed = []
+
+        for offset, pairs in iter_json_array(file_path, file_stats, self._decoder, malformed=malformed):
+            if not isinstance(pairs, list) or (pairs and not isinstance(pairs[0], tuple)):
+                # 数组元素不是JSON对象（空对象解析为空列表）
+                file_stats['skipped'] += 1
+                violations.append(SchemaViolation(file_path, offset, None, None, '不是JSON对象'))
+                continue
+            row = len(offsets)
+            offsets.append(offset)
+            for key, value in pairs:
+                if key in self.drop_fields:
+                    continue
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = _Column(key, self.schema.get(key, 'string'))
+                self._append(column, row, value, file_path, offset, violations)
+
+        file_stats['records'] = len(offsets)
+        violations.extend(SchemaViolation(file_path, offset, None, None, 'JSON格式错误') for offset in malformed)
+        frame = pd.DataFrame({name: self._finish(column, len(offsets), file_path, offsets, violations)
+                              for name, column in columns.items()}, index=pd.RangeIndex(len(offsets)))
+        violations.sort(key=lambda violation: violation.offset)
+        return frame, violations
+
+    def _append(self, column, row, value, file_path, offset, violations):
+        kind = column.kind
+        if value is None or (value == '' and kind not in ('string', 'category')):
+            return
+        if kind in _INT_RANGES:
+            if isinstance(value, str):
+                try:
+                    value = int(value)
+                except ValueError:
+                    violations.append(SchemaViolation(file_path, offset, column.name, value, f'不是整数（{kind}）'))
+                    return
+            elif not isinstance(value, int) or isinstance(value, bool):
+                violations.append(SchemaViolation(file_path, offset, column.name, value, f'不是整数（{kind}）'))
+                return
+            low, high = _INT_RANGES[kind]
+            if not low <= value <= high:
+                violations.append(SchemaViolation(file_path, offset, column.name, value, f'超出 {kind} 的范围'))
+                return
+            column.append(row, value)
+        elif isinstance(value, str):
+            if kind == 'category':
+                value = column.categories.setdefault(value, len(column.categories))
+            column.append(row, value)
+        elif kind == 'string' and isinstance(value, (int, float)) and not isinstance(value, bool):
+            column.append(row, str(value))
+        else:
+            violations.append(SchemaViolation(file_path, offset, column.name, value, f'不是字符串（{kind}）'))
+
+    def _finish(self, column, size, file_path, offsets, violations):
+        rows = np.asarray(column.rows, dtype=np.int64)
+        kind = column.kind
+        if kind in _INT_RANGES:
+            values = np.zeros(size, dtype=kind)
+            mask = np.ones(size, dtype=bool)
+            values[rows] = column.values
+            mask[rows] = False
+            return pd.arrays.IntegerArray(values, mask)
+        if kind == 'category':
+            codes = np.full(size, -1, dtype=np.int32)
+            codes[rows] = column.values
+            return pd.Categorical.from_codes(codes, categories=list(column.categories))
+        if kind == 'datetime':
+            times = pd.to_datetime(pd.Series(column.values, dtype=object), format=self.datetime_format, errors='coerce')
+            for i in np.flatnonzero(times.isna().to_numpy()).tolist():
+                violations.append(SchemaViolation(file_path, offsets[rows[i]], column.name, column.values[i],
+                                                  f'不是 {self.datetime_format or "时间"} 格式的时间'))
+            values = np.full(size, np.datetime64('NaT'), dtype='datetime64[s]')
+            values[rows] = times.to_numpy(dtype='datetime64[s]')
+            return values
+        values = np.full(size, None, dtype=object)
+        values[rows] = column.values
+        return pd.Series(values, dtype=str)